@@ -1,7 +1,7 @@
-# stockmarket/celery.py
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import celeryd_init
 from django.conf import settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stockmarket.settings')
@@ -13,6 +13,39 @@ app = Celery('stockmarket')
 app.config_from_object(settings, namespace='CELERY')
 app.autodiscover_tasks()
 
+# Staged scraping pipeline: each stage has its own queue so workers can be
+# sized for the resource it is bound by. Everything else stays on `celery`.
+app.conf.task_routes = {
+    'stocks.tasks.fetch_stage': {'queue': 'browser'},
+    'stocks.tasks.parse_stage': {'queue': 'cpu'},
+    'stocks.tasks.persist_stage': {'queue': 'db'},
+}
+
+# Per-queue worker profiles, applied to a worker started with `-Q <queue>`
+# (or CELERY_WORKER_PROFILE=<queue>) unless overridden on the command line.
+#   browser: each process owns a ~300 MB Chrome; take one job at a time and
+#            recycle processes to contain driver/memory leaks.
+#   cpu:     parsing is pure Python, one process per core.
+#   db:      few processes (one writer for SQLite), large prefetch since
+#            the tasks are short.
+WORKER_PROFILES = {
+    'browser': {'worker_concurrency': 2, 'worker_prefetch_multiplier': 1, 'worker_max_tasks_per_child': 25,
+                'task_acks_late': True},
+    'cpu': {'worker_concurrency': os.cpu_count() or 2, 'worker_prefetch_multiplier': 4},
+    'db': {'worker_concurrency': 1 if 'sqlite' in settings.DATABASES['default']['ENGINE'] else 4,
+           'worker_prefetch_multiplier': 16},
+}
+
+
+@celeryd_init.connect
+def apply_worker_profile(sender=None, conf=None, options=None, **kwargs):
+    queues = (options or {}).get('queues') or []
+    if isinstance(queues, str):
+        queues = queues.split(',')
+    profile = os.environ.get('CELERY_WORKER_PROFILE') or (queues[0] if len(queues) == 1 else None)
+    if profile in WORKER_PROFILES:
+        conf.update(WORKER_PROFILES[profile])
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
@@ -133,6 +133,17 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 CHROMEDRIVER_PATH = os.path.join(BASE_DIR.parent, 'bin', 'chromedriver')
 
+# Cross-source price reconciliation: highest priority first, and the relative
+# difference under which two sources are considered to agree
+PRICE_SOURCE_PRIORITY = ['nepstock', 'sharesansar', 'merolagani', 'legacy']
+PRICE_RECONCILIATION_TOLERANCE = 0.005
+
+# Nightly per-company metrics snapshot served by the screener endpoint
+SCREENER_SNAPSHOT_PATH = os.path.join(BASE_DIR, 'var', 'screener_snapshot.npz')
+
+# Memory-mapped per-symbol price columns read by analytics (stocks.columnar)
+COLUMNAR_STORE_PATH = os.path.join(BASE_DIR, 'var', 'columnar')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -165,4 +176,82 @@ CELERY_TASK_SERIALIZER = 'json'
 # CELERY_TIMEZONE = 'Asia/Kathmandu'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = 'django-db'
-CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
\ No newline at end of file
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_TASK_TRACK_STARTED = True   # job status reports 'running' as soon as a worker picks a job up
+# Per-source circuit breakers (state shared by all workers through Redis)
+CIRCUIT_BREAKER_REDIS_URL = CELERY_BROKER_URL
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3   # consecutive failures before a source is skipped
+CIRCUIT_BREAKER_COOLDOWN = 600          # seconds before a trial request is let through
+SOURCE_FAILOVER_ORDER = {
+    'price_history': ['sharesansar', 'nepstock', 'merolagani'],
+    'floorsheet': ['sharesansar', 'merolagani', 'nepstock'],
+}
+
+# Checkpointed scrape runs: per-symbol retries with exponential backoff + jitter
+SCRAPE_RETRY_MAX_ATTEMPTS = 3
+SCRAPE_RETRY_BASE_DELAY = 30        # seconds before the first retry (doubles each attempt)
+SCRAPE_RETRY_MAX_DELAY = 300
+SCRAPE_RUN_RESUME_HOURS = 12        # unfinished runs younger than this are resumed
+SCRAPE_RUN_STALE_SECONDS = 600      # heartbeat age after which a running run is considered dead
+
+# Adaptive scraping: per-dataset overrides of stocks.priority.DEFAULT_PRIORITY
+# (budget = symbols per cycle; weights over turnover, trades, volatility, staleness)
+SCRAPE_PRIORITY = {
+    'price_history': {'budget': 60, 'interval_minutes': 60},
+    'floorsheet': {'budget': 40, 'interval_minutes': 30},
+}
+
+# Stage timings (stocks.metrics): rows older than this are pruned into
+# running totals; the Prometheus endpoint (/metrics/) is only served when
+# enabled.
+STAGE_METRICS_RETENTION_DAYS = 30
+STAGE_METRICS_PROMETHEUS = False
+
+# Single-flight scrape locks (stocks.single_flight), in the same Redis as the circuit breakers
+SINGLE_FLIGHT_TTL = 120           # seconds a lock outlives its last heartbeat (crashed worker)
+SINGLE_FLIGHT_WAIT = 600          # how long a duplicate request waits for the in-flight result
+SINGLE_FLIGHT_RESULT_TTL = 60     # how long a finished job's result stays readable by waiters
+
+# On-demand scrape jobs (stocks.jobs): how long a job id stays known to the status API
+SCRAPE_JOB_TTL = 6 * 3600
+
+# Live feed (/live/, Server-Sent Events) fan-out over Redis pub/sub
+LIVE_FEED_REDIS_URL = CELERY_BROKER_URL
+LIVE_FEED_KEEPALIVE = 15          # seconds between keepalive comments on idle streams
+
+# Intraday floorsheet tail (stocks.tail, `manage.py tail_floorsheet`)
+FLOORSHEET_TAIL_INTERVAL = 30         # seconds between the starts of two polling cycles
+FLOORSHEET_TAIL_RECYCLE_AFTER = 200   # polls before the browser is restarted
+
+# News -> company linking (stocks.entity_linking): symbols that are also everyday
+# acronyms in Nepali financial news and should not count as a mention
+NEWS_LINK_IGNORE_SYMBOLS = []
+
+# Near-duplicate news (stocks.news_dedup)
+NEWS_DUPLICATE_SIMILARITY = 0.6       # estimated Jaccard similarity (MinHash) for the same story
+NEWS_DUPLICATE_WINDOW_DAYS = 7        # only compare articles published this close together
+
+# Read-view cache (stocks.view_cache): pages versioned per company and dataset,
+# bumped by the ingest writers. 'views_local' takes over while Redis is down;
+# its short timeout bounds how long a process can miss bumps made elsewhere.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'views': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'TIMEOUT': 6 * 3600,
+        'OPTIONS': {'socket_connect_timeout': 0.5, 'socket_timeout': 0.5},
+    },
+    'views_local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+VIEW_CACHE_RETRY_AFTER = 30   # seconds on the in-process cache before Redis is tried again
+
+# Trading calendar (stocks.trading_calendar): a day with no prices is inferred to be a
+# holiday only when this many companies have prices on the trading days either side
+HOLIDAY_INFERENCE_MIN_COMPANIES = 10
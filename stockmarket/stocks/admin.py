@@ -1,6 +1,83 @@
 from django.contrib import admin
-from .models import CompanyProfile, CompanyNews, PriceHistory
+from django.db.models.functions import TruncDate
+from .models import CompanyProfile, CompanyNews, PriceHistory, MarketHoliday, ScrapeRun, ScrapeRunItem, StageMetric, FloorsheetWatermark, NewsMention
+from .forms import CompanyNewsForm
+from .metrics import summarize
 
 admin.site.register(CompanyProfile)
-admin.site.register(CompanyNews)
+
+class NewsMentionInline(admin.TabularInline):
+    model = NewsMention
+    extra = 0
+    raw_id_fields = ('company',)
+
+@admin.register(CompanyNews)
+class CompanyNewsAdmin(admin.ModelAdmin):
+    form = CompanyNewsForm
+    fields = ('company', 'news_title', 'news_url', 'news_date', 'news_image', 'news_body', 'canonical')
+    list_display = ('news_title', 'company', 'news_date', 'canonical')
+    raw_id_fields = ('canonical',)
+    search_fields = ('news_title',)
+    inlines = [NewsMentionInline]
+
 admin.site.register(PriceHistory)
+
+@admin.register(MarketHoliday)
+class MarketHolidayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'description', 'inferred', 'reviewed')
+    list_filter = ('inferred', 'reviewed')
+    date_hierarchy = 'date'
+    actions = ['mark_reviewed']
+
+    @admin.action(description="Mark selected holidays as reviewed")
+    def mark_reviewed(self, request, queryset):
+        queryset.update(reviewed=True)
+
+class ScrapeRunItemInline(admin.TabularInline):
+    model = ScrapeRunItem
+    extra = 0
+    fields = ('symbol', 'status', 'attempts', 'source', 'records', 'error_type', 'error', 'duration', 'next_retry_at')
+    readonly_fields = fields
+    can_delete = False
+
+@admin.register(ScrapeRun)
+class ScrapeRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task_name', 'source', 'status', 'resumed', 'started_at', 'finished_at')
+    list_filter = ('status', 'dataset', 'source')
+    inlines = [ScrapeRunItemInline]
+
+@admin.register(StageMetric)
+class StageMetricAdmin(admin.ModelAdmin):
+    """
+    Raw rows plus p50/p95 summaries (per stage and source, per day, and the
+    slowest symbols) over whatever the filters currently select.
+    """
+    list_display = ('recorded_at', 'stage', 'source', 'symbol', 'count', 'p50', 'p95', 'max_seconds', 'run')
+    list_filter = ('stage', 'source')
+    search_fields = ('symbol',)
+    date_hierarchy = 'recorded_at'
+    readonly_fields = [field.name for field in StageMetric._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is None:
+            return response
+        queryset = changelist.queryset
+        by_symbol = summarize(queryset, ('stage', 'source', 'symbol'))
+        response.context_data.update({
+            'by_stage': summarize(queryset),
+            'by_day': summarize(queryset.annotate(day=TruncDate('recorded_at')), ('day', 'stage', 'source')),
+            'slowest_symbols': sorted(by_symbol, key=lambda row: row['p95'] or 0, reverse=True)[:20],
+        })
+        return response
+
+
+@admin.register(FloorsheetWatermark)
+class FloorsheetWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('company', 'source', 'date', 'last_contract', 'contracts', 'polled_at', 'last_new_at')
+    list_filter = ('source', 'date')
+    search_fields = ('company__symbol',)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class StocksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stocks'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .view_cache import profile_changed
+
+        post_save.connect(profile_changed, sender='stocks.CompanyProfile', dispatch_uid='stocks_view_cache_profile_save')
+        post_delete.connect(profile_changed, sender='stocks.CompanyProfile', dispatch_uid='stocks_view_cache_profile_delete')
@@ -0,0 +1,116 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .forecasting import get_forecaster
+
+import logging
+logger = logging.getLogger('stocks')
+
+BacktestConfig = namedtuple('BacktestConfig', ['engine', 'order'])
+
+
+class DifferenceCache:
+    """
+    Memoizes the d-th difference of each full company series.
+
+    Every walk-forward origin is a prefix of the same series, and the
+    difference of a prefix is a prefix of the difference, so one np.diff
+    per (company, d) serves all origins and all configs sharing that d.
+    Only engines that fit on differences use them (the numpy engine);
+    statsmodels differences inside its own model, see forecast_from_diffs.
+    """
+    def __init__(self, series_map):
+        self.series_map = series_map
+        self._diffs = {}
+
+    def get(self, key, d):
+        cache_key = (key, d)
+        if cache_key not in self._diffs:
+            self._diffs[cache_key] = np.diff(self.series_map[key], n=d)
+        return self._diffs[cache_key]
+
+
+def walk_forward_origins(length, horizon, min_train, step):
+    """
+    Forecast origins (training lengths) for a series of `length` points.
+    """
+    return list(range(min_train, length - horizon + 1, step))
+
+
+def _run_job(config, series, diffs, origins, horizon):
+    """
+    Fit one config on every origin of one company. Runs in a worker process.
+    Returns an (n_origins, horizon) array of forecast errors and actuals.
+    """
+    forecaster = get_forecaster(config.engine, order=config.order)
+    train = {origin: series[:origin] for origin in origins}
+
+    d = config.order[1]
+    # The numpy engine solves all origins of a company in one batch.
+    predicted = forecaster.forecast_from_diffs(
+        train, {origin: diffs[:max(origin - d, 0)] for origin in origins}, steps=horizon
+    )
+
+    fitted = [origin for origin in origins if origin in predicted]
+    if not fitted:
+        return np.empty((0, horizon)), np.empty((0, horizon))
+    actual = np.array([series[origin:origin + horizon] for origin in fitted])
+    return np.array([predicted[origin] for origin in fitted]) - actual, actual
+
+
+def run_backtest(series_map, configs, horizon=5, min_train=60, step=5, workers=None):
+    """
+    Walk-forward backtest of each config over every company in `series_map`.
+
+    Jobs are (company, config) pairs; each covers all origins for that pair
+    and is dispatched to a process pool. Configs run one after another so
+    the reported wall-clock is per configuration.
+    """
+    cache = DifferenceCache(series_map)
+    plan = {
+        key: walk_forward_origins(len(series), horizon, min_train, step)
+        for key, series in series_map.items()
+    }
+    plan = {key: origins for key, origins in plan.items() if origins}
+
+    results = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        for config in configs:
+            start = time.perf_counter()
+            d = config.order[1]
+            job_args = [
+                (config, series_map[key], cache.get(key, d), origins, horizon)
+                for key, origins in plan.items()
+            ]
+            if executor:
+                outputs = list(executor.map(_run_job, *zip(*job_args))) if job_args else []
+            else:
+                outputs = [_run_job(*args) for args in job_args]
+            elapsed = time.perf_counter() - start
+
+            errors = np.vstack([errors for errors, _ in outputs]) if outputs else np.empty((0, horizon))
+            actual = np.vstack([actual for _, actual in outputs]) if outputs else np.empty((0, horizon))
+            results.append(summarize(config, errors, actual, elapsed))
+            logger.info(f"Backtest {config.engine}{config.order}: {len(errors)} forecasts in {elapsed:.2f}s")
+    finally:
+        if executor:
+            executor.shutdown()
+    return results
+
+
+def summarize(config, errors, actual, elapsed):
+    abs_errors = np.abs(errors)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_errors = np.where(actual != 0, abs_errors / np.abs(actual), np.nan) * 100
+    return {
+        'engine': config.engine,
+        'order': tuple(config.order),
+        'forecasts': len(errors),
+        'wall_clock': elapsed,
+        'mae': abs_errors.mean(axis=0) if len(errors) else np.full(errors.shape[1], np.nan),
+        'mape': np.nanmean(pct_errors, axis=0) if len(errors) else np.full(errors.shape[1], np.nan),
+    }
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Q
+
+from .models import BrokerDailyFlow
+from .rollups import company_dates_filter, load_floorsheet
+
+import logging
+logger = logging.getLogger('stocks')
+
+FLOW_FIELDS = ['buy_quantity', 'sell_quantity', 'buy_amount', 'sell_amount', 'buy_trades', 'sell_trades']
+BATCH_SIZE = 5000
+FLOW_COLUMNS = ('company_id', 'date', 'buyer', 'seller', 'quantity', 'amount')
+
+
+def compute_broker_flows(df):
+    """
+    Roll contracts up to one row per (company, date, broker).
+
+    Each contract is counted once on the buy side for its buyer and once on
+    the sell side for its seller; both sides are grouped in a single pass by
+    stacking them into one frame.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=['company_id', 'date', 'broker'] + FLOW_FIELDS)
+    buys = pd.DataFrame({
+        'company_id': df['company_id'], 'date': df['date'], 'broker': df['buyer'],
+        'buy_quantity': df['quantity'], 'sell_quantity': 0.0,
+        'buy_amount': df['amount'], 'sell_amount': 0.0,
+        'buy_trades': 1, 'sell_trades': 0,
+    })
+    sells = pd.DataFrame({
+        'company_id': df['company_id'], 'date': df['date'], 'broker': df['seller'],
+        'buy_quantity': 0.0, 'sell_quantity': df['quantity'],
+        'buy_amount': 0.0, 'sell_amount': df['amount'],
+        'buy_trades': 0, 'sell_trades': 1,
+    })
+    return (
+        pd.concat([buys, sells], ignore_index=True)
+        .groupby(['company_id', 'date', 'broker'], sort=False)[FLOW_FIELDS]
+        .sum()
+        .reset_index()
+    )
+
+
+def _store(flows, replace):
+    """
+    Write `flows`, first deleting stored rows matched by the `replace` filter.
+    """
+    objs = [
+        BrokerDailyFlow(company_id=int(row.company_id), date=row.date, broker=int(row.broker),
+                        **{field: getattr(row, field) for field in FLOW_FIELDS})
+        for row in flows.itertuples(index=False)
+    ]
+    with transaction.atomic():
+        BrokerDailyFlow.objects.filter(replace).delete()
+        BrokerDailyFlow.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    return len(objs)
+
+
+def refresh_broker_flows(company_ids=None):
+    """
+    Full rebuild of the rollup table (for the given companies, or all).
+    """
+    flows = compute_broker_flows(load_floorsheet(FLOW_COLUMNS, company_ids=company_ids))
+    replace = Q(company_id__in=company_ids) if company_ids is not None else Q()
+    count = _store(flows, replace)
+    logger.info(f"Broker flows: rebuilt {count} rows")
+    return count
+
+
+def update_broker_flows(company_dates):
+    """
+    Incremental update after a floorsheet ingest: recompute only the
+    (company, date) days in `company_dates` that received new contracts.
+    """
+    company_dates = {company_id: set(dates) for company_id, dates in company_dates.items() if dates}
+    if not company_dates:
+        return 0
+    flows = compute_broker_flows(load_floorsheet(FLOW_COLUMNS, company_dates=company_dates))
+    count = _store(flows, company_dates_filter(company_dates))
+    logger.info(f"Broker flows: updated {count} rows for {len(company_dates)} companies")
+    return count
+
+
+def load_flows(company_id=None, window=20, end=None):
+    """
+    Rollup rows covering the last `window` trading dates (as seen in the
+    rollup itself) up to `end`, as a DataFrame with net columns added.
+    """
+    qs = BrokerDailyFlow.objects.all()
+    if company_id is not None:
+        qs = qs.filter(company_id=company_id)
+    if end is not None:
+        qs = qs.filter(date__lte=end)
+    dates = list(qs.order_by('-date').values_list('date', flat=True).distinct()[:window])
+    if not dates:
+        return pd.DataFrame(columns=['company_id', 'date', 'broker'] + FLOW_FIELDS + ['net_quantity', 'net_amount'])
+
+    df = pd.DataFrame.from_records(
+        qs.filter(date__gte=min(dates)).values_list('company_id', 'date', 'broker', *FLOW_FIELDS),
+        columns=['company_id', 'date', 'broker'] + FLOW_FIELDS,
+    )
+    df['net_quantity'] = df['buy_quantity'] - df['sell_quantity']
+    df['net_amount'] = df['buy_amount'] - df['sell_amount']
+    return df
+
+
+def top_brokers(company_id=None, window=20, n=10, end=None):
+    """
+    Top accumulators (largest net buyers) and distributors (largest net
+    sellers) over the rolling window. Returns (accumulators, distributors)
+    as lists of dicts.
+    """
+    df = load_flows(company_id=company_id, window=window, end=end)
+    if df.empty:
+        return [], []
+    totals = df.groupby('broker')[['buy_quantity', 'sell_quantity', 'net_quantity', 'net_amount']].sum()
+    totals = totals.reset_index()
+    accumulators = totals[totals['net_quantity'] > 0].nlargest(n, 'net_quantity')
+    distributors = totals[totals['net_quantity'] < 0].nsmallest(n, 'net_quantity')
+    return accumulators.to_dict('records'), distributors.to_dict('records')
+
+
+def broker_concentration(company_id=None, window=20, top=5, end=None):
+    """
+    How concentrated buying and selling is among brokers over the window:
+    share of volume done by the `top` brokers and the Herfindahl-Hirschman
+    index (0-10000) on each side.
+    """
+    df = load_flows(company_id=company_id, window=window, end=end)
+    result = {}
+    for side in ('buy', 'sell'):
+        volume = df.groupby('broker')[f'{side}_quantity'].sum().to_numpy(dtype=float) if not df.empty else np.array([])
+        total = volume.sum()
+        if total <= 0:
+            result[side] = {'top_share': None, 'hhi': None, 'brokers': 0}
+            continue
+        shares = np.sort(volume[volume > 0])[::-1] / total
+        result[side] = {
+            'top_share': round(float(shares[:top].sum()) * 100, 2),
+            'hhi': round(float(np.square(shares * 100).sum()), 1),
+            'brokers': int(len(shares)),
+        }
+    return result
@@ -0,0 +1,122 @@
+import time
+
+import redis
+from django.conf import settings
+
+import logging
+logger = logging.getLogger('stocks')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+KEY_PREFIX = 'stocks:circuit'
+
+# Atomic so that concurrent failures from several workers can't both read
+# the old count and leave the breaker closed.
+_RECORD_FAILURE = """
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'half_open' or failures >= tonumber(ARGV[1]) then
+    state = 'open'
+    redis.call('HSET', KEYS[1], 'state', state, 'opened_at', ARGV[2])
+end
+redis.call('HSET', KEYS[1], 'last_error', ARGV[3], 'last_failure_at', ARGV[2])
+redis.call('DEL', KEYS[2])
+return state
+"""
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        url = getattr(settings, 'CIRCUIT_BREAKER_REDIS_URL', settings.CELERY_BROKER_URL)
+        _client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=2)
+    return _client
+
+
+class CircuitBreaker:
+    """
+    Per-source breaker whose state lives in Redis, so every worker sees the
+    same view of a source.
+
+    closed    -> calls go through; `failure_threshold` consecutive failures open it
+    open      -> calls are refused until `cooldown` seconds have passed
+    half_open -> one worker at a time gets a trial call; success closes the
+                 breaker, failure opens it for another cool-down
+
+    If Redis itself is unreachable the breaker lets calls through.
+    """
+
+    def __init__(self, source, failure_threshold=None, cooldown=None, client=None):
+        self.source = source
+        self.failure_threshold = failure_threshold or getattr(settings, 'CIRCUIT_BREAKER_FAILURE_THRESHOLD', 3)
+        self.cooldown = cooldown or getattr(settings, 'CIRCUIT_BREAKER_COOLDOWN', 600)
+        self.client = client
+        self.key = f"{KEY_PREFIX}:{source}"
+        self.probe_key = f"{self.key}:probe"
+
+    @property
+    def redis(self):
+        return self.client or get_redis()
+
+    def allow(self):
+        try:
+            data = self.redis.hgetall(self.key)
+            state = data.get('state', CLOSED)
+            if state == CLOSED:
+                return True
+            if state == OPEN and time.time() - float(data.get('opened_at', 0)) < self.cooldown:
+                return False
+            # Cool-down over: let a single trial call through.
+            if self.redis.set(self.probe_key, '1', nx=True, ex=self.cooldown):
+                self.redis.hset(self.key, 'state', HALF_OPEN)
+                logger.info(f"🟠 Circuit for {self.source} half-open, sending a trial request")
+                return True
+            return False
+        except redis.RedisError as e:
+            logger.warning(f"Circuit breaker store unavailable ({e}), allowing {self.source}")
+            return True
+
+    def record_success(self):
+        try:
+            previous = self.redis.hget(self.key, 'state')
+            pipe = self.redis.pipeline()
+            pipe.hset(self.key, mapping={'state': CLOSED, 'failures': 0})
+            pipe.delete(self.probe_key)
+            pipe.execute()
+            if previous and previous != CLOSED:
+                logger.info(f"🟢 Circuit for {self.source} closed")
+        except redis.RedisError as e:
+            logger.warning(f"Circuit breaker store unavailable ({e}), success for {self.source} not recorded")
+
+    def record_failure(self, error=''):
+        try:
+            state = self.redis.eval(
+                _RECORD_FAILURE, 2, self.key, self.probe_key,
+                self.failure_threshold, time.time(), str(error)[:500],
+            )
+            if state == OPEN:
+                logger.warning(f"🔴 Circuit for {self.source} open for {self.cooldown}s: {error}")
+            return state
+        except redis.RedisError as e:
+            logger.warning(f"Circuit breaker store unavailable ({e}), failure for {self.source} not recorded")
+
+    def reset(self):
+        self.redis.delete(self.key, self.probe_key)
+
+    def status(self):
+        data = self.redis.hgetall(self.key)
+        state = data.get('state', CLOSED)
+        opened_at = float(data['opened_at']) if data.get('opened_at') else None
+        retry_in = None
+        if state == OPEN and opened_at is not None:
+            retry_in = max(0, round(opened_at + self.cooldown - time.time()))
+        return {
+            'source': self.source,
+            'state': state,
+            'failures': int(data.get('failures', 0)),
+            'opened_at': opened_at,
+            'retry_in': retry_in,
+            'last_error': data.get('last_error') or None,
+            'last_failure_at': float(data['last_failure_at']) if data.get('last_failure_at') else None,
+        }
@@ -0,0 +1,263 @@
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import CompanyProfile, PriceHistory
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are not serialised across processes
+    fcntl = None
+
+import logging
+logger = logging.getLogger('stocks')
+
+# Per-symbol, date-partitioned column files that analytics memory-map instead
+# of pulling rows through the ORM:
+#
+#   <STORE_PATH>/<dataset>/<SYMBOL>/manifest.json
+#   <STORE_PATH>/<dataset>/<SYMBOL>/<partition>.v<version>/<column>.npy
+#
+# A refresh writes the partitions it touches under a new version and then
+# swaps manifest.json, so readers never see half-written data, and arrays
+# already mapped by a reader stay valid after the old files are deleted.
+STORE_PATH = Path(getattr(settings, 'COLUMNAR_STORE_PATH', settings.BASE_DIR / 'var' / 'columnar'))
+
+# dataset -> (model, {column: (model field, dtype)}, partition unit).
+# Rows are ordered by date within each partition. Floorsheet analytics load
+# int64 paisa through stocks.fixed_point instead (see there).
+DATASETS = {
+    'prices': (PriceHistory, {
+        'open': ('open_price', np.float64),
+        'high': ('high_price', np.float64),
+        'low': ('low_price', np.float64),
+        'close': ('close_price', np.float64),
+    }, 'Y'),
+}
+
+
+def _symbol_dir(dataset, symbol):
+    return STORE_PATH / dataset / re.sub(r'[^A-Za-z0-9_.-]', '_', symbol.upper())
+
+
+def _partition(dates, unit):
+    """
+    Partition names ('2024', or '2024-05' for monthly datasets) of datetime64[D] dates.
+    """
+    return np.datetime_as_string(dates.astype(f'datetime64[{unit}]'))
+
+
+def _read_manifest(directory):
+    try:
+        with open(directory / 'manifest.json') as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {'version': 0, 'partitions': {}}
+
+
+def _write_manifest(directory, manifest):
+    tmp_path = directory / 'manifest.json.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(manifest, fh, sort_keys=True)
+    os.replace(tmp_path, directory / 'manifest.json')
+
+
+class _Lock:
+    """
+    Exclusive lock on one symbol's directory while its manifest is rewritten.
+    """
+
+    def __init__(self, directory):
+        self.path = directory / '.lock'
+
+    def __enter__(self):
+        self.fh = open(self.path, 'w')
+        if fcntl:
+            fcntl.flock(self.fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.fh.close()
+
+
+def _fetch(dataset, company_id, start=None, end=None):
+    """
+    One company's rows as {column: array}, sorted, from the database.
+    """
+    model, columns, _ = DATASETS[dataset]
+    qs = model.objects.filter(company_id=company_id).order_by()
+    if start is not None:
+        qs = qs.filter(date__gte=start, date__lt=end)
+    fields = [field for field, _ in columns.values()]
+    rows = list(qs.values_list('date', *fields))
+    arrays = {'date': np.array([row[0] for row in rows], dtype='datetime64[D]')}
+    for i, (column, (_, dtype)) in enumerate(columns.items(), start=1):
+        arrays[column] = np.array([row[i] for row in rows], dtype=dtype)
+    order = np.argsort(arrays['date'], kind='stable')
+    return {column: values[order] for column, values in arrays.items()}
+
+
+def refresh(dataset, company, dates=None):
+    """
+    Rewrite the partitions of `company` that contain `dates` (all of them when
+    None) from the database. Returns the number of partitions written.
+    """
+    _, _, unit = DATASETS[dataset]
+    directory = _symbol_dir(dataset, company.symbol)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    if dates is None:
+        arrays = _fetch(dataset, company.id)
+        labels = _partition(arrays['date'], unit)
+        names = sorted(set(labels))
+    else:
+        names = sorted(set(_partition(np.array(sorted(dates), dtype='datetime64[D]'), unit)))
+
+    with _Lock(directory):
+        manifest = _read_manifest(directory)
+        version = manifest['version'] + 1
+        partitions = {} if dates is None else dict(manifest['partitions'])
+        for name in names:
+            start = np.datetime64(name, unit)
+            if dates is None:
+                mask = labels == name
+                part = {column: values[mask] for column, values in arrays.items()}
+            else:
+                part = _fetch(dataset, company.id, start.astype('datetime64[D]').item(), (start + 1).astype('datetime64[D]').item())
+            if not len(part['date']):
+                partitions.pop(name, None)
+                continue
+            target = directory / f"{name}.v{version}"
+            target.mkdir(exist_ok=True)  # may be left over from an interrupted refresh
+            for column, values in part.items():
+                np.save(target / f"{column}.npy", values, allow_pickle=False)
+            partitions[name] = target.name
+        _write_manifest(directory, {'version': version, 'partitions': partitions})
+
+        # Mapped files stay readable after unlink (POSIX); elsewhere a
+        # directory still in use is simply left for the next refresh.
+        live = set(partitions.values())
+        for path in directory.iterdir():
+            if path.is_dir() and path.name not in live:
+                shutil.rmtree(path, ignore_errors=True)
+    return len(names)
+
+
+def update_store(dataset, company, new_dates):
+    """
+    Incremental refresh after ingestion. A symbol whose store has never been
+    built is skipped; it is built in full on first read or by build_columnar_store.
+    """
+    if not new_dates or not (_symbol_dir(dataset, company.symbol) / 'manifest.json').exists():
+        return 0
+    return refresh(dataset, company, new_dates)
+
+
+def clear(dataset):
+    """
+    Remove every symbol's store for `dataset` (after a bulk delete).
+    """
+    shutil.rmtree(STORE_PATH / dataset, ignore_errors=True)
+
+
+def rebuild(dataset, company_ids=None):
+    """
+    Full rebuild of `dataset` for the given companies (or all). Returns the partitions written.
+    """
+    companies = CompanyProfile.objects.all()
+    if company_ids is not None:
+        companies = companies.filter(id__in=company_ids)
+    count = 0
+    for company in companies:
+        count += refresh(dataset, company)
+    logger.info(f"Columnar store: rebuilt {count} {dataset} partitions")
+    return count
+
+
+# Symbols whose maps are kept open per process; each partition column is one
+# mapping, and the kernel caps mappings per process (vm.max_map_count).
+CACHE_SYMBOLS = 64
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def partitions(dataset, symbol):
+    """
+    [(partition, {column: read-only memmap})] for a symbol, oldest first, or
+    [] when it has no store. Maps are opened once per process and reopened
+    only when a refresh has replaced the manifest (one os.stat per call).
+    """
+    directory = _symbol_dir(dataset, symbol)
+    try:
+        stat = (directory / 'manifest.json').stat()
+    except FileNotFoundError:
+        return []
+    # os.replace() gives every new manifest a new inode.
+    key = (stat.st_ino, stat.st_mtime_ns)
+    with _cache_lock:
+        cached = _cache.get(directory)
+        if cached and cached[0] == key:
+            _cache.move_to_end(directory)
+            return cached[1]
+        manifest = _read_manifest(directory)
+        _, columns, _ = DATASETS[dataset]
+        parts = [
+            (name, {
+                column: np.load(directory / folder / f"{column}.npy", mmap_mode='r', allow_pickle=False)
+                for column in ['date', *columns]
+            })
+            for name, folder in sorted(manifest['partitions'].items())
+        ]
+        _cache[directory] = (key, parts)
+        _cache.move_to_end(directory)
+        while len(_cache) > CACHE_SYMBOLS:
+            _cache.popitem(last=False)
+    return parts
+
+
+def read(dataset, symbol, columns=None, start=None, end=None):
+    """
+    {column: array} for a symbol between `start` and `end` (inclusive dates).
+    Within one partition the arrays are views on the mapped files, with no
+    copy; a range spanning partitions is concatenated once. Arrays are
+    read-only either way.
+    """
+    _, dataset_columns, _ = DATASETS[dataset]
+    columns = list(columns or ['date', *dataset_columns])
+    chunks = []
+    for _, part in partitions(dataset, symbol):
+        dates = part['date']
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start, 'D'), 'left')
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, 'D'), 'right')
+        if lo < hi:
+            chunks.append({column: part[column][lo:hi] for column in columns})
+    if len(chunks) == 1:
+        return chunks[0]
+    if not chunks:
+        return {
+            column: np.empty(0, dtype='datetime64[D]' if column == 'date' else dataset_columns[column][1])
+            for column in columns
+        }
+    merged = {column: np.concatenate([chunk[column] for chunk in chunks]) for column in columns}
+    for values in merged.values():
+        values.flags.writeable = False
+    return merged
+
+
+def load(dataset, company, **kwargs):
+    """
+    read() for a company, building its store from the database first if it
+    has none yet. A company without rows gets an empty store, so it is not
+    queried again on every load.
+    """
+    if not (_symbol_dir(dataset, company.symbol) / 'manifest.json').exists():
+        refresh(dataset, company)
+    return read(dataset, company.symbol, **kwargs)
@@ -0,0 +1,223 @@
+import hashlib
+import re
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+
+from .metrics import timed
+
+import logging
+logger = logging.getLogger('stocks')
+
+# "Nabil Bank Limited" is usually written "Nabil Bank" in news.
+NAME_SUFFIX = re.compile(r'[\s,.]+(limited|ltd\.?|pvt\.?)$', re.IGNORECASE)
+MIN_NAME_LENGTH = 6
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton: finds every occurrence of every pattern in one
+    pass over the text, however many patterns there are.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add(self, pattern, value):
+        node = 0
+        for char in pattern:
+            child = self.goto[node].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][char] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = child
+        self.output[node].append((len(pattern), value))
+
+    def build(self):
+        """
+        Compute failure links breadth-first; call once after the last add().
+        """
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+        return self
+
+    def iter(self, text):
+        """
+        (start, end, value) for every match, in order of end position.
+        """
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, value in self.output[node]:
+                yield i - length + 1, i + 1, value
+
+
+def _fold(text):
+    """
+    Lowercase without changing the length, so match offsets stay valid on the
+    original text.
+    """
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+
+def _is_word(text, start, end):
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+class CompanyLinker:
+    """
+    Finds company mentions in news text: symbols as whole upper-case words
+    ("NABIL") and names with or without their Limited/Ltd suffix, case
+    insensitive ("Nabil Bank"). Patterns that would point at more than one
+    company are dropped rather than guessed.
+    """
+
+    def __init__(self, companies):
+        ignore = set(getattr(settings, 'NEWS_LINK_IGNORE_SYMBOLS', []))
+        patterns = {}
+        for company_id, symbol, name in companies:
+            symbol = (symbol or '').strip().upper()
+            if len(symbol) >= 2 and symbol not in ignore:
+                patterns.setdefault((symbol.lower(), True), set()).add(company_id)
+            name = ' '.join((name or '').split()).lower()
+            for variant in {name, NAME_SUFFIX.sub('', name)}:
+                if len(variant) >= MIN_NAME_LENGTH:
+                    patterns.setdefault((variant, False), set()).add(company_id)
+
+        self.automaton = Automaton()
+        for (pattern, is_symbol), company_ids in patterns.items():
+            if len(company_ids) == 1:
+                self.automaton.add(pattern, (next(iter(company_ids)), is_symbol))
+        self.automaton.build()
+
+    def find(self, text):
+        """
+        Non-overlapping (start, end, company_id) matches, longest first where
+        patterns overlap ("Nepal Life Insurance" inside "Nepal Life Insurance Company").
+        """
+        matches = []
+        for start, end, (company_id, is_symbol) in self.automaton.iter(_fold(text)):
+            if not _is_word(text, start, end):
+                continue
+            if is_symbol and not text[start:end].isupper():
+                continue
+            matches.append((start, end, company_id))
+
+        chosen, covered = [], -1
+        for start, end, company_id in sorted(matches, key=lambda match: (match[0], match[0] - match[1])):
+            if start >= covered:
+                chosen.append((start, end, company_id))
+                covered = end
+        return chosen
+
+    def link(self, title, body):
+        """
+        {company_id: (mentions, in_title)} for an article.
+        """
+        text = f"{title or ''}\n{body or ''}"
+        title_end = len(title or '')
+        found = {}
+        for start, _, company_id in self.find(text):
+            mentions, in_title = found.get(company_id, (0, False))
+            found[company_id] = (mentions + 1, in_title or start < title_end)
+        return found
+
+
+_linker = None
+_linker_key = None
+
+
+def get_linker():
+    """
+    The process's CompanyLinker, rebuilt only when companies are added,
+    removed or renamed.
+    """
+    global _linker, _linker_key
+    from .models import CompanyProfile
+
+    companies = list(CompanyProfile.objects.order_by('id').values_list('id', 'symbol', 'name'))
+    key = hashlib.sha1(repr(companies).encode()).hexdigest()
+    if _linker is None or key != _linker_key:
+        _linker, _linker_key = CompanyLinker(companies), key
+    return _linker
+
+
+def primary_company(found):
+    """
+    The company an article is mainly about: mentioned in the title, then most mentions.
+    """
+    if not found:
+        return None
+    return max(found, key=lambda company_id: (found[company_id][1], found[company_id][0]))
+
+
+@timed('link')
+def link_articles(articles, linker=None):
+    """
+    Replace the NewsMention rows of `articles` with freshly found ones, and
+    fill in `company` with the primary company where it is not set yet.
+    Returns the number of mentions stored.
+    """
+    from .models import CompanyNews, NewsMention
+
+    linker = linker or get_linker()
+    mentions, updated = [], []
+    for article in articles:
+        found = linker.link(article.news_title, article.news_body)
+        mentions.extend(
+            NewsMention(news_id=article.id, company_id=company_id, mentions=count, in_title=in_title)
+            for company_id, (count, in_title) in found.items()
+        )
+        if article.company_id is None and found:
+            article.company_id = primary_company(found)
+            updated.append(article)
+
+    with transaction.atomic():
+        NewsMention.objects.filter(news_id__in=[article.id for article in articles]).delete()
+        NewsMention.objects.bulk_create(mentions)
+        CompanyNews.objects.bulk_update(updated, ['company'])
+    return len(mentions)
+
+
+def backfill_links(batch_size=500, start_id=0):
+    """
+    Link the whole news archive, `batch_size` articles per transaction, in id
+    order so an interrupted backfill can resume from the last id it logged.
+    Returns (articles, mentions).
+    """
+    from .models import CompanyNews
+
+    linker = get_linker()
+    articles_done = mentions_done = 0
+    last_id = start_id
+    while True:
+        batch = list(
+            CompanyNews.objects.filter(id__gt=last_id).order_by('id').select_related('body')
+            .only('id', 'company_id', 'news_title', 'body__data')[:batch_size]
+        )
+        if not batch:
+            break
+        mentions_done += link_articles(batch, linker)
+        articles_done += len(batch)
+        last_id = batch[-1].id
+        logger.info(f"News linking: {articles_done} articles, {mentions_done} mentions (up to id {last_id})")
+    return articles_done, mentions_done
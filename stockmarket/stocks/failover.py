@@ -0,0 +1,114 @@
+from django.conf import settings
+
+from .circuit_breaker import CircuitBreaker
+from .metrics import labels, span
+from .scrapers.merolagani_scraper import MerolaganiScraper, MerolaganiFloorsheetScraper
+from .scrapers.nepstock_scraper import scrape_company_price_history_nepstock, scrape_company_floorsheet_nepstock
+from .scrapers.sharesansar_scraper import SharesansarPriceScraper, SharesansarFloorsheetScraper
+from .utility import (
+    save_price_history_to_db, save_price_history_to_db_ml, save_price_history_to_db_ss,
+    store_floorsheet_to_db_ml, store_floorsheet_to_db_nepstock, store_floorsheet_to_db_ss,
+)
+
+import logging
+logger = logging.getLogger('stocks')
+
+SOURCES = ['sharesansar', 'merolagani', 'nepstock']
+
+
+def _merolagani_floorsheet(symbol):
+    scraper = MerolaganiFloorsheetScraper(headless=True)
+    try:
+        return scraper.run_scraper(symbol=symbol)
+    finally:
+        scraper.close()
+
+
+# dataset -> source -> (fetch(symbol), save(symbol, data))
+DATASETS = {
+    'price_history': {
+        'sharesansar': (
+            lambda symbol: SharesansarPriceScraper(symbol=symbol, headless=True).fetch_price_history(),
+            save_price_history_to_db_ss,
+        ),
+        'merolagani': (
+            lambda symbol: MerolaganiScraper(symbol=symbol, headless=True).fetch_price_history(max_records=80),
+            save_price_history_to_db_ml,
+        ),
+        'nepstock': (
+            lambda symbol: scrape_company_price_history_nepstock(symbol, max_pages=8, output_csv=False),
+            save_price_history_to_db,
+        ),
+    },
+    'floorsheet': {
+        'sharesansar': (
+            lambda symbol: SharesansarFloorsheetScraper(symbol=symbol, headless=True).fetch_floorsheet(),
+            store_floorsheet_to_db_ss,
+        ),
+        'merolagani': (_merolagani_floorsheet, store_floorsheet_to_db_ml),
+        'nepstock': (
+            lambda symbol: scrape_company_floorsheet_nepstock(symbol, headless=True),
+            store_floorsheet_to_db_nepstock,
+        ),
+    },
+}
+
+# The scrapers log and return [] on timeouts, so an empty price history is
+# how a blocked or slow source shows up. An empty floorsheet can simply mean
+# the symbol didn't trade, so it isn't counted against the source.
+EMPTY_IS_FAILURE = {'price_history'}
+
+
+def failover_order(dataset, preferred):
+    order = getattr(settings, 'SOURCE_FAILOVER_ORDER', {}).get(dataset, SOURCES)
+    return [preferred] + [source for source in order if source != preferred and source in DATASETS[dataset]]
+
+
+def breaker_status():
+    return [CircuitBreaker(source).status() for source in SOURCES]
+
+
+def fetch_with_failover(dataset, symbol, preferred):
+    """
+    Fetch `dataset` for `symbol` from `preferred`, moving on to the
+    alternates when a source's circuit is open or the fetch fails.
+    Returns (source, data), or (None, []) when no source could serve it.
+    """
+    for source in failover_order(dataset, preferred):
+        breaker = CircuitBreaker(source)
+        if not breaker.allow():
+            logger.info(f"⛔ Circuit for {source} is open, skipping {dataset} for {symbol}")
+            continue
+
+        fetch, _ = DATASETS[dataset][source]
+        try:
+            with labels(source=source, symbol=symbol), span('fetch'):
+                data = fetch(symbol) or []
+        except Exception as e:
+            breaker.record_failure(e)
+            logger.warning(f"{source} failed for {symbol} {dataset}: {e}")
+            continue
+        if not data and dataset in EMPTY_IS_FAILURE:
+            breaker.record_failure('empty result')
+            logger.warning(f"{source} returned no {dataset} for {symbol}")
+            continue
+
+        breaker.record_success()
+        if source != preferred:
+            logger.info(f"↪️ {dataset} for {symbol} served by {source} instead of {preferred}")
+        return source, data
+
+    logger.error(f"No source available for {dataset} of {symbol}")
+    return None, []
+
+
+def scrape_with_failover(dataset, symbol, preferred):
+    """
+    fetch_with_failover, then save the data with the serving source's saver.
+    """
+    source, data = fetch_with_failover(dataset, symbol, preferred)
+    if source is not None:
+        _, save = DATASETS[dataset][source]
+        with labels(source=source, symbol=symbol):
+            save(symbol, data)
+    return source, data
@@ -0,0 +1,102 @@
+import numpy as np
+from django.db import connection
+
+from .models import FloorSheet, PriceHistory
+
+# Prices and amounts as int64 paisa (1/100 rupee) for analytics. The scaling
+# is done by the database, so rows reach Python as plain integers and go
+# straight into NumPy: no Decimal per value, no float rounding on the way.
+# Quantities have two decimal places as well and are scaled the same way.
+#
+# stocks.columnar keeps float64 prices too, on purpose. It serves repeated
+# per-symbol reads (forecasting, charts) from memory-mapped files that lag
+# the database until their next refresh. This loader serves bulk reads across
+# companies straight from the database: indicators right after ingestion,
+# and floorsheet amounts, where sums have to be exact to the paisa.
+SCALE = 100
+CHUNK_SIZE = 100_000
+
+# dataset -> (model, scaled decimal fields, integer fields)
+DATASETS = {
+    'prices': (PriceHistory, ['open_price', 'high_price', 'low_price', 'close_price'], []),
+    'floorsheet': (FloorSheet, ['quantity', 'rate', 'amount'], ['buyer', 'seller']),
+}
+
+# A date column as days since 1970-01-01, per backend.
+_EPOCH_DAYS = {
+    'sqlite': "CAST(julianday({column}) - 2440587.5 AS INTEGER)",
+    'postgresql': "({column} - DATE '1970-01-01')",
+}
+_SCALED = "CAST(ROUND({column} * %d) AS BIGINT)" % SCALE
+
+
+def _column(model, field):
+    return f"{connection.ops.quote_name(model._meta.db_table)}.{connection.ops.quote_name(model._meta.get_field(field).column)}"
+
+
+def load(dataset, company_ids=None, start=None, end=None, fields=None, ordered=False):
+    """
+    {name: int64 array} for `dataset`: company_id, date (datetime64[D]), and
+    every decimal field (or just `fields`) in paisa. `start`/`end` bound the
+    dates (inclusive); `ordered` sorts by company then date.
+    """
+    model, decimals, integers = DATASETS[dataset]
+    decimals = [field for field in decimals if fields is None or field in fields]
+    integers = [field for field in integers if fields is None or field in fields]
+    try:
+        date = _EPOCH_DAYS[connection.vendor].format(column=_column(model, 'date'))
+    except KeyError:
+        raise NotImplementedError(
+            f"fixed_point.load does not support the {connection.vendor} database backend "
+            f"(supported: {', '.join(_EPOCH_DAYS)})."
+        )
+    select = (
+        [_column(model, 'company'), date]
+        + [_SCALED.format(column=_column(model, field)) for field in decimals]
+        + [_column(model, field) for field in integers]
+    )
+    names = ['company_id', 'date'] + decimals + integers
+
+    where, params = [], []
+    if company_ids is not None:
+        company_ids = list(company_ids)
+        if not company_ids:
+            return _empty(names)
+        where.append(f"{_column(model, 'company')} IN ({', '.join(['%s'] * len(company_ids))})")
+        params.extend(int(company_id) for company_id in company_ids)
+    if start is not None:
+        where.append(f"{_column(model, 'date')} >= %s")
+        params.append(connection.ops.adapt_datefield_value(start))
+    if end is not None:
+        where.append(f"{_column(model, 'date')} <= %s")
+        params.append(connection.ops.adapt_datefield_value(end))
+    sql = f"SELECT {', '.join(select)} FROM {connection.ops.quote_name(model._meta.db_table)}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if ordered:
+        sql += f" ORDER BY {_column(model, 'company')}, {_column(model, 'date')}"
+
+    # Fetch in chunks, each transposed so the final concatenation leaves
+    # every column contiguous.
+    blocks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(CHUNK_SIZE):
+            blocks.append(np.array(rows, dtype=np.int64).T)
+    if not blocks:
+        return _empty(names)
+    table = np.concatenate(blocks, axis=1)
+    columns = dict(zip(names, table))
+    columns['date'] = columns['date'].view('datetime64[D]')
+    return columns
+
+
+def _empty(names):
+    return {name: np.empty(0, dtype='datetime64[D]' if name == 'date' else np.int64) for name in names}
+
+
+def to_rupees(paisa):
+    """
+    float64 rupees (or units) from int64 paisa, for code that wants floats.
+    """
+    return paisa / SCALE
@@ -0,0 +1,190 @@
+import warnings
+
+import numpy as np
+from statsmodels.tsa.arima.model import ARIMA
+
+from . import columnar
+from .models import CompanyProfile
+
+import logging
+logger = logging.getLogger('stocks')
+
+DEFAULT_ORDER = (20, 1, 0)
+
+
+class BaseForecaster:
+    """
+    Common interface for the price forecasting engines.
+
+    Engines take plain float arrays of closing prices (oldest first) and
+    return the next `steps` predicted closes. `forecast_many` receives a
+    dict of {key: series} so engines that can fit everything in one go
+    (see NumpyARForecaster) may override it. `forecast_from_diffs` also gets
+    each series' d-th difference, precomputed by the caller (the backtest
+    caches them); engines that cannot use them fall back to forecast_many.
+    """
+    name = None
+
+    def __init__(self, order=DEFAULT_ORDER):
+        self.order = tuple(order)
+
+    def forecast(self, series, steps=5):
+        raise NotImplementedError
+
+    def forecast_many(self, series_map, steps=5):
+        results = {}
+        for key, series in series_map.items():
+            try:
+                results[key] = self.forecast(series, steps=steps)
+            except Exception as e:
+                logger.error(f"{self.name}: forecast failed for {key}: {e}")
+        return results
+
+    def forecast_from_diffs(self, series_map, diff_map, steps=5):
+        return self.forecast_many(series_map, steps=steps)
+
+
+class StatsmodelsARIMAForecaster(BaseForecaster):
+    """
+    Reference engine: statsmodels ARIMA fitted one series at a time.
+
+    It ignores precomputed differences: the state-space model differences
+    the levels itself, and fitting it on differences instead would change
+    the likelihood it maximises (simple_differencing).
+    """
+    name = 'statsmodels'
+
+    def forecast(self, series, steps=5):
+        series = np.asarray(series, dtype=float)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model_fit = ARIMA(series, order=self.order).fit()
+        return np.asarray(model_fit.forecast(steps=steps), dtype=float)
+
+
+class NumpyARForecaster(BaseForecaster):
+    """
+    AR(p) on d-th differences solved by ordinary least squares.
+
+    This is what ARIMA(p, d, 0) reduces to (statsmodels uses no constant
+    once d > 0), minus the exact state-space likelihood. All series are
+    right-aligned into one padded lag tensor and the normal equations are
+    solved as a single stacked `np.linalg.solve` call.
+    """
+    name = 'numpy'
+
+    def __init__(self, order=DEFAULT_ORDER, ridge=1e-8):
+        super().__init__(order=order)
+        p, d, q = self.order
+        if q != 0:
+            raise ValueError("NumpyARForecaster only supports MA order q=0.")
+        self.ridge = ridge
+
+    def forecast(self, series, steps=5):
+        return self.forecast_many({0: series}, steps=steps).get(0)
+
+    def forecast_many(self, series_map, steps=5):
+        d = self.order[1]
+        diff_map = {key: np.diff(np.asarray(series, dtype=float), n=d) for key, series in series_map.items()}
+        return self.forecast_from_diffs(series_map, diff_map, steps=steps)
+
+    def forecast_from_diffs(self, series_map, diff_map, steps=5):
+        """
+        Same as forecast_many, but reuses already differenced series
+        (diff_map[key] must equal np.diff(series_map[key], n=d)).
+        """
+        p, d, _ = self.order
+        keys = [key for key, series in series_map.items() if len(series) > d + 1]
+        if not keys:
+            return {}
+
+        diffs = [diff_map[key] for key in keys]
+        width = max(len(diff) for diff in diffs)
+
+        # Right-align every differenced series so the most recent values share
+        # the same column; the left padding is NaN and masked out below.
+        padded = np.full((len(keys), width), np.nan)
+        for i, diff in enumerate(diffs):
+            padded[i, width - len(diff):] = diff
+
+        coefs = self._fit(padded, p)
+        return {
+            key: self._integrate(np.asarray(series_map[key], dtype=float), diffs[i], coefs[i], steps)
+            for i, key in enumerate(keys)
+        }
+
+    def _fit(self, padded, p):
+        """
+        Batched least squares for the AR coefficients of every row of `padded`.
+        """
+        n, width = padded.shape
+        if p == 0 or width <= p:
+            return np.zeros((n, p))
+
+        # lags[:, t, k] is the value k+1 steps before target[:, t].
+        windows = np.lib.stride_tricks.sliding_window_view(padded, p + 1, axis=1)
+        target = windows[:, :, p]
+        lags = windows[:, :, p - 1::-1]
+
+        valid = ~(np.isnan(target) | np.isnan(lags).any(axis=2))
+        target = np.where(valid, target, 0.0)
+        lags = np.where(valid[:, :, None], lags, 0.0)
+
+        xtx = np.einsum('ntk,ntj->nkj', lags, lags)
+        xty = np.einsum('ntk,nt->nk', lags, target)
+
+        # A tiny ridge keeps short or constant series from producing a
+        # singular system without visibly biasing well-determined fits.
+        scale = np.trace(xtx, axis1=1, axis2=2) / p
+        xtx += (self.ridge * np.maximum(scale, 1.0))[:, None, None] * np.eye(p)
+        return np.linalg.solve(xtx, xty[:, :, None])[:, :, 0]
+
+    def _integrate(self, series, diff, coef, steps):
+        p, d, _ = self.order
+        history = list(diff[-p:]) if p else []
+        history = [0.0] * (p - len(history)) + history
+
+        predicted_diffs = np.empty(steps)
+        for step in range(steps):
+            value = float(np.dot(coef, history[::-1])) if p else 0.0
+            predicted_diffs[step] = value
+            history = history[1:] + [value] if p else history
+
+        # Undo the differencing one order at a time, seeding each level
+        # with the last observed value of that order.
+        result = predicted_diffs
+        for level in range(d - 1, -1, -1):
+            last = np.diff(series, n=level)[-1] if level else series[-1]
+            result = last + np.cumsum(result)
+        return result
+
+
+FORECASTERS = {
+    StatsmodelsARIMAForecaster.name: StatsmodelsARIMAForecaster,
+    NumpyARForecaster.name: NumpyARForecaster,
+}
+
+DEFAULT_FORECASTER = StatsmodelsARIMAForecaster.name
+
+
+def get_forecaster(name=None, order=DEFAULT_ORDER):
+    """
+    Return a forecaster instance by engine name (defaults to statsmodels).
+    """
+    name = name or DEFAULT_FORECASTER
+    try:
+        return FORECASTERS[name](order=order)
+    except KeyError:
+        raise ValueError(f"Unknown forecasting engine '{name}'. Choose from: {', '.join(FORECASTERS)}")
+
+
+def load_close_series(company_ids=None):
+    """
+    Closing prices for many companies from the columnar store.
+    Returns {company_id: read-only np.ndarray of closes ordered by date}.
+    """
+    companies = CompanyProfile.objects.all()
+    if company_ids is not None:
+        companies = companies.filter(id__in=company_ids)
+    series = {company.id: columnar.load('prices', company, columns=['close'])['close'] for company in companies}
+    return {company_id: closes for company_id, closes in series.items() if len(closes)}
@@ -8,10 +8,22 @@ class CompanyProfileForm(forms.ModelForm):
         fields = ['name', 'symbol', 'sector', 'address', 'website', 'listed_date', 'paidup_capital', 'listed_shares', 'market_capitalization', 'description']
 
 class CompanyNewsForm(forms.ModelForm):
+    # Not a model field: the body is stored compressed in NewsBody.
+    news_body = forms.CharField(widget=forms.Textarea)
+
     class Meta:
         model = CompanyNews
         fields = ['company', 'news_title', 'news_date', 'news_image', 'news_body']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial.setdefault('news_body', self.instance.news_body)
+
+    def save(self, commit=True):
+        self.instance.news_body = self.cleaned_data['news_body']
+        return super().save(commit)
+
 # Clear Price History Form
 class ConfirmDeletionForm(forms.Form):
     confirm = forms.BooleanField(required=True, label="Are you sure you want to delete all price history records?")
\ No newline at end of file
@@ -0,0 +1,168 @@
+import math
+from collections import namedtuple
+from datetime import date as date_cls, timedelta
+
+import numpy as np
+
+from .models import CompanyProfile, PriceHistory
+from .trading_calendar import get_holidays, nepal_today, trading_days
+
+import logging
+logger = logging.getLogger('stocks')
+
+# How each price-history source paginates. Every source lists newest first,
+# so reaching a gap N trading days back means reading N rows from the top.
+# rows_per_page/max_pages are what the scrapers can reach today (None means
+# unbounded); the second figures are rough wall-clock costs used to rank
+# sources, including Chrome startup and the scrapers' fixed sleeps.
+PRICE_SOURCES = {
+    'merolagani': {'rows_per_page': 150, 'max_pages': 1, 'startup_seconds': 8, 'page_seconds': 3},
+    'nepstock': {'rows_per_page': 10, 'max_pages': None, 'startup_seconds': 10, 'page_seconds': 4},
+    'sharesansar': {'rows_per_page': 20, 'max_pages': None, 'startup_seconds': 6, 'page_seconds': 2},
+}
+
+GapReport = namedtuple('GapReport', ['company_id', 'missing', 'depth'])
+BackfillJob = namedtuple('BackfillJob', ['company_id', 'symbol', 'source', 'pages', 'rows', 'since', 'missing_days'])
+
+
+def last_complete_trading_day(holidays=None):
+    """
+    The most recent trading day strictly before today (Kathmandu time), i.e.
+    the newest session whose data should already be published.
+    """
+    today = nepal_today()
+    recent = trading_days(today - timedelta(days=30), today - timedelta(days=1), holidays=holidays)
+    return recent[-1].astype(date_cls) if len(recent) else today - timedelta(days=1)
+
+
+def find_gaps(company_ids=None, end=None, holidays=None):
+    """
+    Missing trading days per company between its first stored PriceHistory
+    date and `end` (defaults to the last complete trading day).
+
+    Builds one (companies x trading days) presence matrix from a single
+    values_list query, so the whole market is diffed against the calendar in
+    a handful of NumPy operations. Returns {company_id: GapReport}, only for
+    companies that have gaps; `depth` is how many rows back from `end` the
+    oldest gap sits.
+    """
+    qs = PriceHistory.objects.all()
+    if company_ids is not None:
+        qs = qs.filter(company_id__in=company_ids)
+    rows = list(qs.values_list('company_id', 'date'))
+    if not rows:
+        return {}
+
+    company_col = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    date_col = np.array([row[1] for row in rows], dtype='datetime64[D]')
+
+    # Unreviewed inferred holidays may be failed scrapes, so they stay gaps.
+    if holidays is None:
+        holidays = get_holidays()
+    end = end or last_complete_trading_day(holidays=holidays)
+    calendar = trading_days(date_col.min(), end, holidays=holidays)
+    if not len(calendar):
+        return {}
+
+    companies, company_idx = np.unique(company_col, return_inverse=True)
+    pos = np.searchsorted(calendar, date_col)
+    on_calendar = (pos < len(calendar)) & (calendar[np.minimum(pos, len(calendar) - 1)] == date_col)
+    company_idx, pos = company_idx[on_calendar], pos[on_calendar]
+
+    observed = np.zeros((len(companies), len(calendar)), dtype=bool)
+    observed[company_idx, pos] = True
+
+    first_pos = np.full(len(companies), len(calendar))
+    np.minimum.at(first_pos, company_idx, pos)
+    expected = np.arange(len(calendar))[None, :] >= first_pos[:, None]
+    missing = expected & ~observed
+
+    reports = {}
+    for i in np.flatnonzero(missing.any(axis=1)):
+        missing_pos = np.flatnonzero(missing[i])
+        reports[int(companies[i])] = GapReport(
+            company_id=int(companies[i]),
+            missing=calendar[missing_pos],
+            depth=int(len(calendar) - missing_pos[0]),
+        )
+    return reports
+
+
+def gap_runs(missing, holidays=None):
+    """
+    Collapse a sorted array of missing trading days into (first, last, count)
+    runs of consecutive trading days. Pass the `holidays` find_gaps() used:
+    a missing day that is not on the calendar would break the runs.
+    """
+    if not len(missing):
+        return []
+    if holidays is None:
+        holidays = get_holidays()
+    calendar = trading_days(missing[0], missing[-1], holidays=holidays)
+    pos = np.searchsorted(calendar, missing)
+    breaks = np.flatnonzero(np.diff(pos) != 1) + 1
+    return [
+        (run[0].astype(date_cls), run[-1].astype(date_cls), len(run))
+        for run in np.split(missing, breaks)
+    ]
+
+
+def choose_source(depth, sources=PRICE_SOURCES):
+    """
+    Cheapest source (by estimated seconds) able to reach `depth` rows back.
+    Falls back to the deepest source when none can reach the whole gap.
+    Returns (source, pages).
+    """
+    candidates = []
+    for name, spec in sources.items():
+        pages = math.ceil(depth / spec['rows_per_page'])
+        reachable = spec['max_pages'] is None or pages <= spec['max_pages']
+        if reachable:
+            candidates.append((spec['startup_seconds'] + pages * spec['page_seconds'], name, pages))
+    if candidates:
+        _, name, pages = min(candidates)
+        return name, pages
+
+    name, spec = max(sources.items(), key=lambda item: item[1]['rows_per_page'] * (item[1]['max_pages'] or 0))
+    return name, spec['max_pages']
+
+
+def plan_backfill(company_ids=None, end=None, sources=PRICE_SOURCES, holidays=None):
+    """
+    One BackfillJob per company with gaps. All sources are newest-first, so a
+    single scrape deep enough for the oldest gap covers every newer gap too.
+    """
+    reports = find_gaps(company_ids=company_ids, end=end, holidays=holidays)
+    symbols = dict(CompanyProfile.objects.filter(id__in=reports).values_list('id', 'symbol'))
+
+    jobs = []
+    for company_id, report in sorted(reports.items()):
+        source, pages = choose_source(report.depth, sources)
+        rows = min(report.depth, pages * sources[source]['rows_per_page'])
+        if rows < report.depth:
+            logger.warning(
+                f"Backfill: {symbols.get(company_id)} gap is {report.depth} rows deep, "
+                f"{source} only reaches {rows}"
+            )
+        jobs.append(BackfillJob(
+            company_id=company_id,
+            symbol=symbols.get(company_id),
+            source=source,
+            pages=pages,
+            rows=rows,
+            since=report.missing[0].astype(date_cls),
+            missing_days=len(report.missing),
+        ))
+    return jobs
+
+
+def enqueue_backfill(jobs):
+    """
+    Queue one run_price_backfill task per planned job.
+    """
+    from .tasks import run_price_backfill
+
+    for job in jobs:
+        run_price_backfill.delay(job.source, job.symbol, job.pages, job.rows, job.since.isoformat())
+        logger.info(f"Backfill queued: {job.symbol} via {job.source} ({job.pages} pages, {job.missing_days} missing days)")
+    return len(jobs)
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from . import fixed_point
+from .models import PriceHistory, TechnicalIndicator
+
+import logging
+logger = logging.getLogger('stocks')
+
+INDICATOR_FIELDS = [
+    'sma_20', 'sma_50', 'ema_12', 'ema_26', 'rsi_14',
+    'macd', 'macd_signal', 'macd_hist', 'bb_upper', 'bb_middle', 'bb_lower',
+]
+
+# Rows of history loaded ahead of the first new row on incremental updates.
+# Covers the 50-day SMA outright; the exponential indicators (slowest alpha
+# is 1/14 for RSI) have decayed to well under 1e-6 of their seed by then.
+WARMUP_ROWS = 200
+
+BATCH_SIZE = 5000
+
+
+def load_closes(company_ids=None, since_by_company=None):
+    """
+    Closing prices as a DataFrame [company_id, date, close] sorted per company.
+    `since_by_company` limits each company to rows on/after the given date.
+    """
+    columns = fixed_point.load('prices', company_ids=company_ids, fields=['close_price'], ordered=True)
+    df = pd.DataFrame({
+        'company_id': columns['company_id'],
+        'date': pd.to_datetime(columns['date']),
+        'close': fixed_point.to_rupees(columns['close_price']),
+    })
+    if df.empty:
+        return df
+    if since_by_company:
+        since = pd.to_datetime(df['company_id'].map(since_by_company))
+        df = df[since.isna() | (df['date'] >= since)].reset_index(drop=True)
+    return df
+
+
+def compute_indicators(df):
+    """
+    SMA/EMA/RSI/MACD/Bollinger for every company in `df` at once.
+
+    Uses grouped rolling/ewm kernels so there is no Python loop over companies.
+    `df` must be sorted by company_id then date.
+    """
+    out = df[['company_id', 'date']].copy()
+    if df.empty:
+        for field in INDICATOR_FIELDS:
+            out[field] = []
+        return out
+
+    close = df['close']
+    grouped = close.groupby(df['company_id'])
+
+    def rolling(window, stat):
+        return getattr(grouped.rolling(window), stat)().reset_index(level=0, drop=True)
+
+    def ewm(series_grouped, **kwargs):
+        return series_grouped.ewm(adjust=False, **kwargs).mean().reset_index(level=0, drop=True)
+
+    out['sma_20'] = rolling(20, 'mean')
+    out['sma_50'] = rolling(50, 'mean')
+    out['ema_12'] = ewm(grouped, span=12)
+    out['ema_26'] = ewm(grouped, span=26)
+
+    # Wilder's RSI: exponential smoothing of gains/losses with alpha = 1/14.
+    delta = grouped.diff()
+    gains = delta.clip(lower=0).groupby(df['company_id'])
+    losses = (-delta).clip(lower=0).groupby(df['company_id'])
+    avg_gain = ewm(gains, alpha=1 / 14, min_periods=14)
+    avg_loss = ewm(losses, alpha=1 / 14, min_periods=14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+    out['rsi_14'] = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0), 100 - 100 / (1 + rs))
+    out.loc[avg_gain.isna(), 'rsi_14'] = np.nan
+
+    out['macd'] = out['ema_12'] - out['ema_26']
+    out['macd_signal'] = ewm(out['macd'].groupby(df['company_id']), span=9)
+    out['macd_hist'] = out['macd'] - out['macd_signal']
+
+    std_20 = rolling(20, 'std')
+    out['bb_middle'] = out['sma_20']
+    out['bb_upper'] = out['sma_20'] + 2 * std_20
+    out['bb_lower'] = out['sma_20'] - 2 * std_20
+    return out
+
+
+def _store(indicators, replace_from=None):
+    """
+    Replace stored indicator rows with `indicators`. With `replace_from`
+    ({company_id: date}) only rows on/after that date are rewritten.
+    """
+    if replace_from is not None:
+        since = pd.to_datetime(indicators['company_id'].map(replace_from))
+        indicators = indicators[indicators['date'] >= since]
+
+    values = indicators[INDICATOR_FIELDS].astype(float)
+    values = values.astype(object).where(np.isfinite(values), None)
+    objs = [
+        TechnicalIndicator(company_id=int(company_id), date=day, **dict(zip(INDICATOR_FIELDS, row)))
+        for company_id, day, row in zip(
+            indicators['company_id'], indicators['date'].dt.date, values.itertuples(index=False)
+        )
+    ]
+
+    with transaction.atomic():
+        if replace_from is None:
+            TechnicalIndicator.objects.filter(company_id__in=indicators['company_id'].unique().tolist()).delete()
+        else:
+            for company_id, since_date in replace_from.items():
+                TechnicalIndicator.objects.filter(company_id=company_id, date__gte=since_date).delete()
+        TechnicalIndicator.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    return len(objs)
+
+
+def refresh_indicators(company_ids=None):
+    """
+    Full recompute for the given companies (all companies by default).
+    """
+    df = load_closes(company_ids=company_ids)
+    if df.empty:
+        return 0
+    if company_ids is None:
+        TechnicalIndicator.objects.exclude(company_id__in=df['company_id'].unique().tolist()).delete()
+    count = _store(compute_indicators(df))
+    logger.info(f"Indicators: recomputed {count} rows for {df['company_id'].nunique()} companies")
+    return count
+
+
+def update_indicators(new_rows_since):
+    """
+    Incremental update after an ingest. `new_rows_since` maps company_id to
+    the oldest date that received new PriceHistory rows; only rows from that
+    date on are recomputed, seeded with WARMUP_ROWS of prior history.
+    """
+    if not new_rows_since:
+        return 0
+
+    warmup_start = {}
+    for company_id, since in new_rows_since.items():
+        earlier = (
+            PriceHistory.objects.filter(company_id=company_id, date__lt=since)
+            .order_by('-date').values_list('date', flat=True)[WARMUP_ROWS - 1:WARMUP_ROWS]
+        )
+        warmup_start[company_id] = earlier[0] if earlier else None
+
+    df = load_closes(
+        company_ids=list(new_rows_since),
+        since_by_company={cid: start for cid, start in warmup_start.items() if start is not None},
+    )
+    if df.empty:
+        return 0
+    count = _store(compute_indicators(df), replace_from=new_rows_since)
+    logger.info(f"Indicators: updated {count} rows for {len(new_rows_since)} companies")
+    return count
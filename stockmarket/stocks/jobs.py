@@ -0,0 +1,125 @@
+import contextlib
+import contextvars
+import json
+import time
+import uuid
+
+import redis
+from celery.result import AsyncResult
+from django.conf import settings
+
+from .circuit_breaker import get_redis
+
+import logging
+logger = logging.getLogger('stocks')
+
+KEY_PREFIX = 'stocks:job'
+JOB_TTL = getattr(settings, 'SCRAPE_JOB_TTL', 6 * 3600)
+
+# Celery states -> what the job status API reports
+STATUSES = {
+    'PENDING': 'queued',
+    'RECEIVED': 'queued',
+    'STARTED': 'running',
+    'PROGRESS': 'running',
+    'RETRY': 'retrying',
+    'SUCCESS': 'done',
+    'FAILURE': 'failed',
+    'REVOKED': 'failed',
+}
+
+# Replace a finished job only if it is still the one that was checked; a
+# concurrent request may have replaced it with a job of its own meanwhile.
+_REPLACE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return false
+"""
+
+_reporter = contextvars.ContextVar('scrape_progress_reporter', default=None)
+
+
+@contextlib.contextmanager
+def reporting(callback):
+    """
+    Send report_progress() calls made inside the block to `callback(progress)`.
+    """
+    token = _reporter.set(callback)
+    try:
+        yield
+    finally:
+        _reporter.reset(token)
+
+
+def report_progress(**progress):
+    callback = _reporter.get()
+    if callback is None:
+        return
+    try:
+        callback({key: value for key, value in progress.items() if value is not None})
+    except Exception as e:
+        logger.warning(f"Could not report scrape progress: {e}")
+
+
+def task_progress(task):
+    """
+    Progress callback that publishes to the task's result as a PROGRESS state,
+    which job_status() reads back.
+    """
+    def callback(progress):
+        if task.request.id:
+            task.update_state(state='PROGRESS', meta={**progress, 'updated_at': time.time()})
+    return callback
+
+
+def enqueue(task, kwargs, source, dataset, symbol=None):
+    """
+    Queue `task` for (source, dataset, symbol) unless a job for it is still
+    queued or running, in which case that job is returned instead.
+    Returns (job_id, coalesced).
+    """
+    key = f"{KEY_PREFIX}:{source}:{dataset}:{symbol or '*'}"
+    job_id = uuid.uuid4().hex
+    meta = json.dumps({'source': source, 'dataset': dataset, 'symbol': symbol, 'queued_at': time.time()})
+    try:
+        client = get_redis()
+        while not client.set(key, job_id, nx=True, ex=JOB_TTL):
+            existing = client.get(key)
+            if existing is None:
+                continue  # expired since the SET
+            if not AsyncResult(existing).ready():
+                return existing, True
+            if client.eval(_REPLACE, 1, key, existing, job_id, JOB_TTL):
+                break
+        client.set(f"{KEY_PREFIX}:meta:{job_id}", meta, ex=JOB_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Job registry unavailable ({e}), queueing {task.name} without coalescing")
+    task.apply_async(kwargs=kwargs, task_id=job_id)
+    return job_id, False
+
+
+def job_status(job_id):
+    """
+    queued/running/done/failed plus rows so far (from the scraper's progress
+    reports) or the task's result. None for unknown job ids.
+    """
+    try:
+        meta = get_redis().get(f"{KEY_PREFIX}:meta:{job_id}")
+    except redis.RedisError:
+        meta = None
+    result = AsyncResult(job_id)
+    if meta is None and result.state == 'PENDING':
+        return None
+
+    status = {'job_id': job_id, 'status': STATUSES.get(result.state, result.state.lower()), **json.loads(meta or '{}')}
+    info = result.info
+    if result.state == 'PROGRESS' and isinstance(info, dict):
+        status.update(info)
+    elif result.state == 'SUCCESS':
+        status['result'] = info
+        if isinstance(info, dict) and 'rows' in info:
+            status['rows'] = info['rows']
+    elif result.state in ('FAILURE', 'RETRY'):
+        status['error'] = str(info)
+    return status
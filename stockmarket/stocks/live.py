@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.db import transaction
+
+from .circuit_breaker import get_redis
+
+import logging
+logger = logging.getLogger('stocks')
+
+CHANNEL_PREFIX = 'stocks:live'
+KINDS = ('prices', 'floorsheet', 'news')
+QUEUE_SIZE = 1000
+
+# Swapped for a fake in tests/dev, e.g. fakeredis.aioredis.FakeRedis(server=...)
+# sharing a FakeServer with the circuit breaker client.
+_async_client = None
+
+
+def get_async_redis():
+    global _async_client
+    if _async_client is None:
+        url = getattr(settings, 'LIVE_FEED_REDIS_URL', settings.CELERY_BROKER_URL)
+        _async_client = aioredis.Redis.from_url(url, decode_responses=True)
+    return _async_client
+
+
+# ---------------------------------------------------------------------------
+# Publishing (ingestion side, sync)
+# ---------------------------------------------------------------------------
+
+def publish(kind, events):
+    """
+    Publish `events` (dicts with at least a 'symbol') on the `kind` channel
+    once the current transaction commits, so subscribers never see rows that
+    are rolled back.
+    """
+    if not events:
+        return
+
+    def send():
+        try:
+            get_redis().publish(f"{CHANNEL_PREFIX}:{kind}", json.dumps(events, default=str))
+        except redis.RedisError as e:
+            logger.warning(f"Live feed unavailable ({e}), {len(events)} {kind} events dropped")
+
+    transaction.on_commit(send)
+
+
+def price_event(row, symbol):
+    return {
+        'symbol': symbol, 'date': row.date,
+        'open': row.open_price, 'high': row.high_price, 'low': row.low_price, 'close': row.close_price,
+    }
+
+
+def floorsheet_event(row, symbol):
+    return {
+        'symbol': symbol, 'date': row.date, 'transaction_id': row.transaction_id,
+        'buyer': row.buyer, 'seller': row.seller, 'quantity': row.quantity, 'rate': row.rate, 'amount': row.amount,
+    }
+
+
+def news_event(news):
+    return {
+        'id': news.id, 'symbol': news.company.symbol if news.company_id else None,
+        'title': news.news_title, 'date': news.news_date, 'url': news.news_url,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Fan-out (web side, async)
+# ---------------------------------------------------------------------------
+
+class Subscription:
+    def __init__(self, kinds, symbols):
+        self.kinds = set(kinds)
+        self.symbols = set(symbols)
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def offer(self, kind, events):
+        if kind not in self.kinds:
+            return
+        if self.symbols:
+            events = [event for event in events if event.get('symbol') in self.symbols]
+        if not events:
+            return
+        try:
+            self.queue.put_nowait((kind, events))
+        except asyncio.QueueFull:
+            # A client that stopped reading loses events rather than holding memory.
+            logger.warning("Live feed client is too slow, dropping events")
+
+
+class Broadcaster:
+    """
+    One Redis subscription per process (per event loop), fanned out to every
+    connected client's queue. Started by the first subscriber and stopped
+    when the last one leaves.
+    """
+
+    def __init__(self, client=None):
+        self.client = client
+        self.subscriptions = set()
+        self.task = None
+
+    async def subscribe(self, kinds, symbols):
+        subscription = Subscription(kinds, symbols)
+        self.subscriptions.add(subscription)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._listen())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _listen(self):
+        pubsub = (self.client or get_async_redis()).pubsub()
+        try:
+            await pubsub.psubscribe(f"{CHANNEL_PREFIX}:*")
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                kind = message['channel'].rsplit(':', 1)[-1]
+                events = json.loads(message['data'])
+                for subscription in list(self.subscriptions):
+                    subscription.offer(kind, events)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Live feed subscription failed: {e}")
+            for subscription in list(self.subscriptions):
+                subscription.queue.put_nowait(('error', [{'error': 'Live feed unavailable.'}]))
+        finally:
+            await pubsub.aclose()
+
+
+_broadcasters = {}
+
+
+def get_broadcaster():
+    loop = asyncio.get_running_loop()
+    if loop not in _broadcasters:
+        _broadcasters.clear()  # a new loop means the old one is gone (tests, reloads)
+        _broadcasters[loop] = Broadcaster()
+    return _broadcasters[loop]
+
+
+def format_event(kind, data):
+    return f"event: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream(kinds, symbols, keepalive=None):
+    """
+    Server-Sent Events for the live feed: one `event:` per ingested batch,
+    and a comment line every `keepalive` seconds so proxies keep the
+    connection open.
+    """
+    keepalive = keepalive or getattr(settings, 'LIVE_FEED_KEEPALIVE', 15)
+    broadcaster = get_broadcaster()
+    subscription = await broadcaster.subscribe(kinds, symbols)
+    try:
+        yield f"retry: 5000\n: subscribed to {','.join(sorted(subscription.kinds))}\n\n"
+        while True:
+            try:
+                kind, events = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(kind, events)
+            if kind == 'error':
+                return
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+from stocks.priority import DEFAULT_PRIORITY, get_config, score_symbols
+
+TASKS = {
+    'price_history': 'stocks.tasks.run_{source}_pricehistory_scraper',
+    'floorsheet': 'stocks.tasks.run_{source}_floorsheet_scraper',
+}
+
+
+class Command(BaseCommand):
+    help = "Show symbol priorities, or install budgeted periodic scraping tasks for the DatabaseScheduler."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', choices=list(DEFAULT_PRIORITY), default='price_history')
+        parser.add_argument('--source', default='sharesansar', choices=['sharesansar', 'merolagani', 'nepstock'])
+        parser.add_argument('--install', action='store_true', help="Create/update the PeriodicTask for this dataset and source.")
+        parser.add_argument('--top', type=int, default=20, help="Rows to show.")
+
+    def handle(self, *args, **options):
+        dataset = options['dataset']
+        config = get_config(dataset)
+
+        if options['install']:
+            schedule, _ = IntervalSchedule.objects.get_or_create(
+                every=config['interval_minutes'], period=IntervalSchedule.MINUTES
+            )
+            task, created = PeriodicTask.objects.update_or_create(
+                name=f"Adaptive {dataset} scrape ({options['source']})",
+                defaults={
+                    'task': TASKS[dataset].format(source=options['source']),
+                    'interval': schedule,
+                    'kwargs': json.dumps({'budget': config['budget']}),
+                    'enabled': True,
+                },
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{'Created' if created else 'Updated'} '{task.name}': every {config['interval_minutes']} min, "
+                f"budget {config['budget']} symbols."
+            ))
+            return
+
+        scores = score_symbols(dataset)
+        self.stdout.write(f"{dataset}: budget {config['budget']}, weights {config['weights']}")
+        self.stdout.write(f"{'symbol':>10} {'turnover':>9} {'trades':>7} {'volat.':>7} {'stale':>6} {'score':>6}")
+        for i, row in enumerate(scores.head(options['top']).itertuples()):
+            marker = '*' if i < config['budget'] else ' '
+            self.stdout.write(
+                f"{row.symbol:>10} {row.turnover:>9.2f} {row.trades:>7.2f} {row.volatility:>7.2f} "
+                f"{row.staleness:>6.2f} {row.score:>6.3f} {marker}"
+            )
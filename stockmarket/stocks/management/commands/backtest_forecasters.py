@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.backtesting import BacktestConfig, run_backtest
+from stocks.forecasting import FORECASTERS, load_close_series
+
+
+def parse_order(value):
+    try:
+        p, d, q = (int(part) for part in value.split(','))
+    except ValueError:
+        raise CommandError(f"Invalid order '{value}', expected P,D,Q (e.g. 20,1,0).")
+    return (p, d, q)
+
+
+class Command(BaseCommand):
+    help = "Walk-forward backtest of forecasting engines/orders over stored PriceHistory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', default=list(FORECASTERS), choices=list(FORECASTERS))
+        parser.add_argument('--orders', nargs='+', default=['20,1,0'], help="ARIMA orders as P,D,Q.")
+        parser.add_argument('--horizon', type=int, default=5)
+        parser.add_argument('--step', type=int, default=5, help="Trading days between forecast origins.")
+        parser.add_argument('--min-train', type=int, default=60, help="Training points at the first origin.")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (1 runs inline).")
+        parser.add_argument('--limit', type=int, default=None, help="Only backtest the first N companies.")
+
+    def handle(self, *args, **options):
+        series_map = load_close_series()
+        if options['limit']:
+            series_map = dict(list(series_map.items())[:options['limit']])
+
+        configs = [
+            BacktestConfig(engine, parse_order(order))
+            for order in options['orders']
+            for engine in options['engines']
+        ]
+        horizon = options['horizon']
+        results = run_backtest(
+            series_map, configs,
+            horizon=horizon, min_train=options['min_train'],
+            step=options['step'], workers=options['workers'],
+        )
+
+        header = f"{'engine':>12} {'order':>12} {'fits':>6} {'seconds':>8}  " + "  ".join(
+            f"{'h' + str(h) + ' MAE/MAPE':>16}" for h in range(1, horizon + 1)
+        )
+        self.stdout.write(header)
+        for result in results:
+            cells = "  ".join(
+                f"{mae:8.3f}/{mape:6.2f}%" for mae, mape in zip(result['mae'], result['mape'])
+            )
+            self.stdout.write(
+                f"{result['engine']:>12} {str(result['order']):>12} {result['forecasts']:>6} "
+                f"{result['wall_clock']:>8.2f}  {cells}"
+            )
@@ -0,0 +1,124 @@
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from stocks import fixed_point
+from stocks.models import CompanyProfile, FloorSheet
+from stocks.rollups import load_floorsheet
+
+BENCH_DATE = date(2001, 1, 1)
+BENCH_PREFIX = 'FXBENCH'
+COLUMNS = ('company_id', 'date', 'quantity', 'rate', 'amount')
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert synthetic floorsheet rows, then compare the Decimal values_list loader with the int64 "
+        "paisa loader on speed and peak memory. The rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000)
+        parser.add_argument('--rows-per-day', type=int, default=10_000)
+        parser.add_argument(
+            '--decimal-rows', type=int, default=2_000_000,
+            help="Cap for the Decimal loader, which needs ~0.5 KB per row; its figures are scaled up to --rows.",
+        )
+        parser.add_argument('--batch', type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        company = CompanyProfile.objects.order_by('id').first()
+        if company is None:
+            self.stdout.write(self.style.WARNING("No companies to benchmark with."))
+            return
+        self._cleanup()
+        try:
+            start = time.perf_counter()
+            self._insert(company.id, options)
+            self.stdout.write(f"inserted {options['rows']:,} rows in {time.perf_counter() - start:.1f}s")
+
+            decimal_rows = min(options['rows'], options['decimal_rows'])
+            days = -(-decimal_rows // options['rows_per_day'])
+            subset = {'start': BENCH_DATE, 'end': BENCH_DATE + timedelta(days=days - 1)}
+            everything = {'start': BENCH_DATE, 'end': BENCH_DATE + timedelta(days=options['rows'] // options['rows_per_day'])}
+
+            decimal = self._measure(lambda: self._load_decimal(company.id, days))
+            paisa_subset = self._measure(lambda: fixed_point.load('floorsheet', [company.id], fields=COLUMNS, **subset))
+            paisa = self._measure(lambda: fixed_point.load('floorsheet', [company.id], fields=COLUMNS, **everything))
+            self._check(company.id, days, subset)
+
+            self._report('decimal', decimal, options['rows'])
+            self._report('paisa', paisa_subset, options['rows'])
+            self._report('paisa (all)', paisa, options['rows'])
+        finally:
+            self._cleanup()
+
+    def _insert(self, company_id, options):
+        rng = random.Random(options['rows'])
+        table = connection.ops.quote_name(FloorSheet._meta.db_table)
+        sql = (
+            f"INSERT INTO {table} (company_id, transaction_id, buyer, seller, quantity, rate, amount, date) "
+            f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+        )
+        for offset in range(0, options['rows'], options['batch']):
+            rows = []
+            for i in range(offset, min(offset + options['batch'], options['rows'])):
+                quantity, paisa = rng.randint(10, 5000), rng.randint(10_000, 200_000)
+                rows.append((
+                    company_id, f"{BENCH_PREFIX}{i:010d}", rng.randint(1, 90), rng.randint(1, 90),
+                    f"{quantity}.00", f"{paisa // 100}.{paisa % 100:02d}",
+                    f"{quantity * paisa // 100}.{quantity * paisa % 100:02d}",
+                    (BENCH_DATE + timedelta(days=i // options['rows_per_day'])).isoformat(),
+                ))
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+
+    def _load_decimal(self, company_id, days):
+        dates = [BENCH_DATE + timedelta(days=day) for day in range(days)]
+        return load_floorsheet(COLUMNS, company_dates={company_id: dates})
+
+    def _measure(self, load):
+        """
+        (rows, seconds, peak bytes): timed on one run, peak traced on a second
+        so tracing does not slow the timed one.
+        """
+        start = time.perf_counter()
+        result = load()
+        elapsed = time.perf_counter() - start
+        rows = len(result['date'])
+        del result
+        tracemalloc.start()
+        try:
+            load()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return rows, elapsed, peak
+
+    def _check(self, company_id, days, subset):
+        """
+        Both loaders must agree to the paisa (compared as sorted columns, as
+        neither orders the rows).
+        """
+        df = self._load_decimal(company_id, days)
+        columns = fixed_point.load('floorsheet', [company_id], fields=COLUMNS, **subset)
+        for column in ('quantity', 'rate', 'amount'):
+            expected = np.sort(np.round(df[column].to_numpy() * fixed_point.SCALE).astype(np.int64))
+            if not np.array_equal(expected, np.sort(columns[column])):
+                raise AssertionError(f"{column} differs between the Decimal and paisa loaders")
+
+    def _report(self, label, measurement, total):
+        rows, elapsed, peak = measurement
+        scaled = f"  -> {elapsed * total / rows:7.2f}s, {peak * total / rows / 2**20:8,.0f} MiB at {total:,}" if rows != total else ""
+        self.stdout.write(
+            f"{label:>12}: {rows:>11,} rows {elapsed:7.2f}s {rows / elapsed / 1e6:5.2f}M rows/s "
+            f"peak {peak / 2**20:8,.0f} MiB ({peak / rows:5.0f} B/row){scaled}"
+        )
+
+    def _cleanup(self):
+        FloorSheet.objects.filter(transaction_id__startswith=BENCH_PREFIX).delete()
@@ -0,0 +1,52 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from stocks.forecasting import FORECASTERS, DEFAULT_ORDER, get_forecaster, load_close_series
+
+
+class Command(BaseCommand):
+    help = "Compare fit latency and hold-out forecast error of the forecasting engines on stored PriceHistory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', default=list(FORECASTERS), choices=list(FORECASTERS))
+        parser.add_argument('--order', nargs=3, type=int, default=list(DEFAULT_ORDER), metavar=('P', 'D', 'Q'))
+        parser.add_argument('--holdout', type=int, default=5, help="Trailing points held out per company.")
+        parser.add_argument('--min-points', type=int, default=30, help="Skip companies with less training data.")
+        parser.add_argument('--limit', type=int, default=None, help="Only benchmark the first N companies.")
+
+    def handle(self, *args, **options):
+        holdout = options['holdout']
+        series_map = {
+            company_id: series
+            for company_id, series in load_close_series().items()
+            if len(series) - holdout >= options['min_points']
+        }
+        if options['limit']:
+            series_map = dict(list(series_map.items())[:options['limit']])
+        if not series_map:
+            self.stdout.write(self.style.WARNING("No company has enough price history to benchmark."))
+            return
+
+        train = {key: series[:-holdout] for key, series in series_map.items()}
+        actual = {key: series[-holdout:] for key, series in series_map.items()}
+        self.stdout.write(f"Benchmarking {len(train)} companies, order={tuple(options['order'])}, holdout={holdout}")
+
+        for name in options['engines']:
+            forecaster = get_forecaster(name, order=options['order'])
+            start = time.perf_counter()
+            predicted = forecaster.forecast_many(train, steps=holdout)
+            elapsed = time.perf_counter() - start
+
+            keys = [key for key in actual if key in predicted]
+            errors = np.array([predicted[key] - actual[key] for key in keys])
+            truth = np.array([actual[key] for key in keys])
+            mae = np.abs(errors).mean() if len(keys) else float('nan')
+            mape = (np.abs(errors) / np.abs(truth)).mean() * 100 if len(keys) else float('nan')
+
+            self.stdout.write(
+                f"{name:>12}: {elapsed * 1000:10.1f} ms total, "
+                f"{elapsed * 1000 / len(train):8.2f} ms/company, "
+                f"MAE={mae:.3f} MAPE={mape:.2f}% ({len(keys)}/{len(train)} fitted)"
+            )
@@ -0,0 +1,161 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from stocks.models import CompanyNews, CompanyProfile
+from stocks.news_bodies import store_bodies
+from stocks.news_search import FTS_TABLE, optimize_index, search_news, unindex
+
+BENCH_URL = 'https://bench.invalid/news/'
+
+# Words that news queries are actually made of; the rest of the vocabulary is
+# generated filler so the index sees a realistic number of distinct terms.
+FINANCE_WORDS = (
+    'dividend bonus right share issue ipo fpo agm sgm profit loss quarterly report net interest income '
+    'deposit loan capital merger acquisition board director approved book closure auction debenture '
+    'insurance premium hydropower bank finance microfinance nepse index turnover record rally decline '
+    'regulator sebon nrb policy rate liquidity inflation budget allotment listing cash stock split'
+).split()
+
+
+def synthetic_corpus(count, words, seed=0):
+    """
+    `count` (title, body, date) articles: Zipf-distributed words over a
+    vocabulary of finance terms, company symbols and filler words.
+    """
+    rng = np.random.default_rng(seed)
+    symbols = [symbol.lower() for symbol in CompanyProfile.objects.values_list('symbol', flat=True)] or ['nabil', 'adbl']
+    filler = [''.join(rng.choice(list('abcdefghijklmnoprstuvy'), rng.integers(3, 10))) for _ in range(30000)]
+    # Filler takes the stopword-like top ranks; finance terms and symbols are
+    # spread from common (rank 10, in most articles) to rare (rank ~5000).
+    vocabulary = filler
+    for word, rank in zip(rng.permutation(FINANCE_WORDS + symbols), np.geomspace(10, 5000, len(FINANCE_WORDS) + len(symbols))):
+        vocabulary.insert(int(rank), word)
+    vocabulary = np.array(vocabulary)
+    start = timezone.make_aware(datetime(2015, 1, 1))
+    for i in range(count):
+        length = max(20, int(rng.lognormal(np.log(words), 0.5)))
+        index = np.minimum(rng.zipf(1.3, length + 8) - 1, len(vocabulary) - 1)
+        text = vocabulary[index]
+        yield ' '.join(text[:8]).capitalize(), ' '.join(text[8:]), start + timedelta(minutes=int(rng.integers(0, 5_000_000)))
+
+
+def delete_corpus(batch_size=5000):
+    """
+    Delete the synthetic articles, removing their search entries first (the
+    index keeps entries of deleted articles until it is rebuilt).
+    """
+    ids = list(CompanyNews.objects.filter(news_url__startswith=BENCH_URL).values_list('id', flat=True))
+    for offset in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            unindex(ids[offset:offset + batch_size])
+            CompanyNews.objects.filter(id__in=ids[offset:offset + batch_size]).delete()
+    if ids:
+        optimize_index()
+
+
+def percentiles(samples):
+    values = np.asarray(samples) * 1000
+    return f"p50 {np.percentile(values, 50):8.2f} ms  p95 {np.percentile(values, 95):8.2f} ms"
+
+
+class Command(BaseCommand):
+    help = (
+        "Build a synthetic news corpus, then compare ranked full-text search with the icontains scan "
+        "it replaces. The corpus is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=500_000)
+        parser.add_argument('--words', type=int, default=150, help="Median words per article body.")
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--scan-queries', type=int, default=10, help="icontains queries to time (each is a full scan).")
+        parser.add_argument('--batch', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        try:
+            self._insert(options)
+            self._report_size()
+            self._query(options)
+        finally:
+            start = time.perf_counter()
+            self._cleanup()
+            self.stdout.write(f"cleanup: {time.perf_counter() - start:.1f}s")
+
+    def _insert(self, options):
+        batch, inserted = [], 0
+        start = time.perf_counter()
+        for i, (title, body, date) in enumerate(synthetic_corpus(options['articles'], options['words'])):
+            batch.append(CompanyNews(news_url=f"{BENCH_URL}{i}", news_title=title, news_body=body, news_date=date))
+            if len(batch) == options['batch']:
+                inserted += self._flush(batch)
+                batch = []
+        inserted += self._flush(batch)
+        optimize_index()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"insert: {inserted} articles in {elapsed:.1f}s ({inserted / elapsed:,.0f}/s, indexing included)")
+
+    def _flush(self, batch):
+        with transaction.atomic():
+            CompanyNews.objects.bulk_create(batch)
+            store_bodies(batch)
+        return len(batch)
+
+    def _report_size(self):
+        if connection.vendor != 'sqlite':
+            return
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT name LIKE %s, sum(pgsize) FROM dbstat WHERE name LIKE %s OR name LIKE %s GROUP BY 1",
+                    [f"{FTS_TABLE}%", 'stocks_companynews%', 'stocks_newsbody%'],
+                )
+                sizes = dict(cursor.fetchall())
+        except Exception as e:
+            self.stdout.write(f"size: unavailable ({e})")
+            return
+        self.stdout.write(f"size: table {sizes.get(0, 0) / 2**20:,.1f} MiB, full-text index {sizes.get(1, 0) / 2**20:,.1f} MiB")
+
+    def _query(self, options):
+        rng = np.random.default_rng(1)
+        symbols = [symbol.lower() for symbol in CompanyProfile.objects.values_list('symbol', flat=True)[:50]] or ['nabil']
+        queries = []
+        for _ in range(options['queries']):
+            kind = rng.integers(0, 3)
+            if kind == 0:
+                queries.append(str(rng.choice(FINANCE_WORDS)))
+            elif kind == 1:
+                queries.append(f"{rng.choice(symbols)} {rng.choice(FINANCE_WORDS)}")
+            else:
+                queries.append(' '.join(rng.choice(FINANCE_WORDS, 2)) + ' ' + str(rng.choice(FINANCE_WORDS))[:4])
+
+        for label, page in (('search page 1', 1), ('search page 5', 5)):
+            timings, matches = [], []
+            for query in queries:
+                start = time.perf_counter()
+                total, _ = search_news(query, page=page)
+                timings.append(time.perf_counter() - start)
+                matches.append(total)
+            self.stdout.write(f"{label:>14}: {percentiles(timings)}  ({int(np.median(matches))} median matches)")
+
+        # What is left without the index: titles and teasers (bodies are compressed).
+        timings = []
+        for query in queries[:options['scan_queries']]:
+            words = query.split()
+            start = time.perf_counter()
+            news = CompanyNews.objects.all()
+            for word in words:
+                news = news.filter(Q(news_title__icontains=word) | Q(news_teaser__icontains=word))
+            news.count()
+            list(news.order_by('-news_date').values_list('id', flat=True)[:20])
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(f"{'icontains scan':>14}: {percentiles(timings)}")
+
+    def _cleanup(self):
+        delete_corpus()
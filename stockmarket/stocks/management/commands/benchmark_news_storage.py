@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.test import RequestFactory
+
+from stocks.models import CompanyNews, NewsBody
+from stocks.news_bodies import store_bodies
+from stocks.news_search import optimize_index
+from stocks.views import company_news_detail, company_news_list
+
+from .benchmark_news_search import BENCH_URL, delete_corpus, percentiles, synthetic_corpus
+
+
+class Command(BaseCommand):
+    help = (
+        "Build a synthetic news corpus, then report how much space the compressed bodies take and how "
+        "long the news list and detail pages take to render. The corpus is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=20_000)
+        parser.add_argument('--words', type=int, default=150, help="Median words per article body.")
+        parser.add_argument('--requests', type=int, default=50, help="Requests to time per page.")
+        parser.add_argument('--batch', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        try:
+            raw = self._insert(options)
+            self._report_size(raw)
+            self._report_latency(options)
+        finally:
+            self._cleanup()
+
+    def _insert(self, options):
+        batch, raw = [], 0
+        for i, (title, body, date) in enumerate(synthetic_corpus(options['articles'], options['words'])):
+            batch.append(CompanyNews(news_url=f"{BENCH_URL}{i}", news_title=title, news_body=body, news_date=date))
+            raw += len(body.encode('utf-8'))
+            if len(batch) == options['batch']:
+                self._flush(batch)
+                batch = []
+        self._flush(batch)
+        optimize_index()
+        return raw
+
+    def _flush(self, batch):
+        with transaction.atomic():
+            CompanyNews.objects.bulk_create(batch)
+            store_bodies(batch)
+
+    def _report_size(self, raw):
+        stored = NewsBody.objects.filter(news__news_url__startswith=BENCH_URL).aggregate(size=Sum(Length('data')))['size']
+        self.stdout.write(f"bodies: {raw / 2**20:,.1f} MiB as text, {stored / 2**20:,.1f} MiB compressed ({raw / stored:.1f}x)")
+        if connection.vendor != 'sqlite':
+            return
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT name, sum(pgsize) FROM dbstat WHERE name IN ('stocks_companynews', 'stocks_newsbody') GROUP BY name"
+                )
+                sizes = dict(cursor.fetchall())
+        except Exception as e:
+            self.stdout.write(f"size: unavailable ({e})")
+            return
+        self.stdout.write(
+            f"size: stocks_companynews {sizes.get('stocks_companynews', 0) / 2**20:,.1f} MiB, "
+            f"stocks_newsbody {sizes.get('stocks_newsbody', 0) / 2**20:,.1f} MiB"
+        )
+
+    def _report_latency(self, options):
+        factory = RequestFactory()
+        pages = CompanyNews.objects.filter(canonical__isnull=True).count() // 25 + 1
+        ids = list(CompanyNews.objects.filter(news_url__startswith=BENCH_URL).values_list('id', flat=True)[:options['requests']])
+        cases = [
+            ('list page 1', lambda i: company_news_list(factory.get('/news/'))),
+            (f'list page {pages // 2}', lambda i: company_news_list(factory.get('/news/', {'page': pages // 2}))),
+            ('detail', lambda i: company_news_detail(factory.get(f'/news/{ids[i]}/'), ids[i])),
+        ]
+        for label, render in cases:
+            timings, sizes = [], []
+            for i in range(options['requests']):
+                start = time.perf_counter()
+                response = render(i % len(ids))
+                timings.append(time.perf_counter() - start)
+                sizes.append(len(response.content))
+            self.stdout.write(f"{label:>14}: {percentiles(timings)}  ({np.median(sizes) / 1024:,.1f} KiB)")
+
+    def _cleanup(self):
+        delete_corpus()
@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from stocks.models import CompanyProfile, FloorSheet
+from stocks.utility import parse_floorsheet_ml, persist_floorsheet
+
+BENCH_DATE = date(2000, 1, 3)
+BENCH_PREFIX = 'BENCH'
+
+
+def synthetic_floorsheet(tag, rows):
+    """
+    Raw Merolagani-style floorsheet rows (strings with thousands separators),
+    so the parse stage does its real work.
+    """
+    rng = random.Random(tag)
+    records = []
+    for i in range(rows):
+        quantity, rate = rng.randint(10, 5000), rng.uniform(100, 2000)
+        records.append({
+            "Transact. No.": f"{BENCH_PREFIX}{tag}{i:06d}",
+            "Symbol": tag,
+            "Buyer": str(rng.randint(1, 90)),
+            "Seller": str(rng.randint(1, 90)),
+            "Quantity": f"{quantity:,}",
+            "Rate": f"{rate:,.2f}",
+            "Amount": f"{quantity * rate:,.2f}",
+            "Date": BENCH_DATE.isoformat(),
+        })
+    return records
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare floorsheet throughput of monolithic fetch+parse+persist workers with the staged "
+        "browser/cpu/db pipeline. Browser time is simulated with a sleep; parsing and inserting are real, "
+        "the live feed and the rollups are left out."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=24)
+        parser.add_argument('--rows', type=int, default=1500, help="Contracts per symbol.")
+        parser.add_argument('--fetch-seconds', type=float, default=1.0, help="Simulated browser time per symbol.")
+        parser.add_argument('--browser', type=int, default=2, help="Chrome slots (monolithic workers / browser queue concurrency).")
+        parser.add_argument('--cpu', type=int, default=2, help="Parse workers in the staged pipeline.")
+        parser.add_argument('--db', type=int, default=1, help="Persist workers in the staged pipeline.")
+
+    def handle(self, *args, **options):
+        companies = list(CompanyProfile.objects.values_list('symbol', flat=True)[:options['symbols']])
+        if not companies:
+            self.stdout.write(self.style.WARNING("No companies to benchmark with."))
+            return
+        jobs = [(companies[i % len(companies)], f"{i:04d}") for i in range(options['symbols'])]
+        self.stdout.write(
+            f"{len(jobs)} symbols x {options['rows']} contracts, fetch {options['fetch_seconds']}s, "
+            f"{options['browser']} browser slots"
+        )
+
+        # Synthetic contracts must not reach live-feed subscribers or the
+        # rollups, broker flows and cached pages of the real companies.
+        try:
+            with mock.patch('stocks.utility.publish'), mock.patch('stocks.utility.after_floorsheet_ingest'):
+                for mode in ('monolithic', 'staged'):
+                    self._cleanup()
+                    elapsed, busy = getattr(self, f'_run_{mode}')(jobs, options)
+                    self.stdout.write(
+                        f"{mode:>11}: {elapsed:6.2f}s  {len(jobs) / elapsed:6.2f} symbols/s  "
+                        f"Chrome held {busy / len(jobs):5.2f}s per symbol"
+                    )
+        finally:
+            self._cleanup()
+
+    def _fetch(self, tag, options):
+        time.sleep(options['fetch_seconds'])
+        return synthetic_floorsheet(tag, options['rows'])
+
+    def _run_monolithic(self, jobs, options):
+        busy = [0.0]
+        lock = threading.Lock()
+
+        def work(symbol, tag):
+            start = time.perf_counter()
+            try:
+                persist_floorsheet(symbol, parse_floorsheet_ml(self._fetch(tag, options)))
+            finally:
+                connection.close()
+            with lock:
+                busy[0] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['browser']) as browser:
+            wait([browser.submit(work, symbol, tag) for symbol, tag in jobs])
+        return time.perf_counter() - start, busy[0]
+
+    def _run_staged(self, jobs, options):
+        busy = [0.0]
+        lock = threading.Lock()
+        futures = []
+        cpu = ThreadPoolExecutor(options['cpu'])
+        db = ThreadPoolExecutor(options['db'])
+
+        def persist(symbol, rows):
+            try:
+                persist_floorsheet(symbol, rows)
+            finally:
+                connection.close()
+
+        def parse(symbol, raw):
+            futures.append(db.submit(persist, symbol, parse_floorsheet_ml(raw)))
+
+        def fetch(symbol, tag):
+            start = time.perf_counter()
+            raw = self._fetch(tag, options)
+            with lock:
+                busy[0] += time.perf_counter() - start
+            futures.append(cpu.submit(parse, symbol, raw))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['browser']) as browser:
+            wait([browser.submit(fetch, symbol, tag) for symbol, tag in jobs])
+        cpu.shutdown(wait=True)
+        db.shutdown(wait=True)
+        for future in futures:
+            future.result()
+        return time.perf_counter() - start, busy[0]
+
+    def _cleanup(self):
+        FloorSheet.objects.filter(transaction_id__startswith=BENCH_PREFIX).delete()
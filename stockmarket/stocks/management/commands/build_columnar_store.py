@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from stocks.columnar import DATASETS, STORE_PATH, rebuild
+from stocks.models import CompanyProfile
+
+
+class Command(BaseCommand):
+    help = "Rebuild the memory-mapped columnar store of price history from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', choices=list(DATASETS), nargs='+', help="Only rebuild these datasets.")
+        parser.add_argument('--symbols', nargs='+', help="Only rebuild these symbols.")
+
+    def handle(self, *args, **options):
+        company_ids = None
+        if options['symbols']:
+            company_ids = list(CompanyProfile.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+        for dataset in options['dataset'] or DATASETS:
+            count = rebuild(dataset, company_ids=company_ids)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {count} {dataset} partitions under {STORE_PATH / dataset}."))
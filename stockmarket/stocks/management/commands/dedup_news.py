@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from stocks.news_dedup import backfill_duplicates
+
+
+class Command(BaseCommand):
+    help = "Sign stored news articles and group near-duplicates under their canonical article."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500)
+
+    def handle(self, *args, **options):
+        articles, duplicates = backfill_duplicates(batch_size=options['batch'])
+        self.stdout.write(self.style.SUCCESS(f"Signed {articles} articles, {duplicates} near-duplicates."))
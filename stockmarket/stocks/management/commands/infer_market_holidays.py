@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from stocks.trading_calendar import infer_holidays
+
+
+class Command(BaseCommand):
+    help = "Infer NEPSE holidays from Sunday-Thursday dates with no PriceHistory for any company."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report without writing to MarketHoliday.")
+        parser.add_argument(
+            '--min-companies', type=int, default=None,
+            help="Companies that must have prices either side of a day (default HOLIDAY_INFERENCE_MIN_COMPANIES).",
+        )
+
+    def handle(self, *args, **options):
+        added, removed = infer_holidays(dry_run=options['dry_run'], min_companies=options['min_companies'])
+        for day in added:
+            self.stdout.write(f"+ {day:%Y-%m-%d %a}")
+        for day in removed:
+            self.stdout.write(f"- {day:%Y-%m-%d %a} (now has price data)")
+        self.stdout.write(self.style.SUCCESS(f"{len(added)} holidays added, {len(removed)} stale holidays removed."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from stocks.entity_linking import backfill_links
+
+
+class Command(BaseCommand):
+    help = "Link stored news articles to the companies they mention."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help="Articles per transaction.")
+        parser.add_argument('--start-id', type=int, default=0, help="Resume after this article id.")
+
+    def handle(self, *args, **options):
+        articles, mentions = backfill_links(batch_size=options['batch'], start_id=options['start_id'])
+        self.stdout.write(self.style.SUCCESS(f"Linked {articles} articles, {mentions} company mentions."))
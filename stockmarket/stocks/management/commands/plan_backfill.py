@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from stocks.gaps import enqueue_backfill, find_gaps, gap_runs, plan_backfill
+from stocks.trading_calendar import get_holidays
+
+
+class Command(BaseCommand):
+    help = "Detect missing trading days in PriceHistory and plan the minimal scrapes to fill them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', help="Only plan for these symbols.")
+        parser.add_argument('--show-gaps', action='store_true', help="List each run of missing days.")
+        parser.add_argument('--enqueue', action='store_true', help="Queue the planned jobs on Celery.")
+
+    def handle(self, *args, **options):
+        company_ids = None
+        if options['symbols']:
+            from stocks.models import CompanyProfile
+            company_ids = list(CompanyProfile.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+
+        # One calendar for the plan and the listed runs.
+        holidays = get_holidays()
+        jobs = plan_backfill(company_ids=company_ids, holidays=holidays)
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS("No gaps found."))
+            return
+
+        reports = find_gaps(company_ids=[job.company_id for job in jobs], holidays=holidays) if options['show_gaps'] else {}
+        for job in jobs:
+            self.stdout.write(
+                f"{job.symbol:>10}: {job.missing_days:4d} missing since {job.since} -> "
+                f"{job.source} x{job.pages} pages ({job.rows} rows)"
+            )
+            if job.company_id in reports:
+                for first, last, count in gap_runs(reports[job.company_id].missing, holidays=holidays):
+                    self.stdout.write(f"{'':>12}{first} .. {last} ({count} days)")
+
+        if options['enqueue']:
+            queued = enqueue_backfill(jobs)
+            self.stdout.write(self.style.SUCCESS(f"Queued {queued} backfill jobs."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from stocks.models import CompanyProfile, PriceObservation
+from stocks.reconciliation import disagreement_report, reconcile
+from stocks.utility import after_reconcile
+
+
+class Command(BaseCommand):
+    help = "Re-resolve PriceHistory from the per-source observations and report source disagreement rates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', help="Only these symbols.")
+        parser.add_argument('--tolerance', type=float, help="Relative tolerance (default: settings.PRICE_RECONCILIATION_TOLERANCE).")
+        parser.add_argument('--report-only', action='store_true', help="Only print the disagreement report.")
+
+    def handle(self, *args, **options):
+        company_ids = None
+        if options['symbols']:
+            company_ids = list(CompanyProfile.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+
+        if not options['report_only']:
+            company_dates = None
+            if company_ids is not None:
+                company_dates = {company_id: [] for company_id in company_ids}
+                for company_id, day in PriceObservation.objects.filter(company_id__in=company_ids).values_list('company_id', 'date').distinct():
+                    company_dates[company_id].append(day)
+            result = reconcile(company_dates, tolerance=options['tolerance'])
+            after_reconcile(result.changed)
+            changed = sum(len(dates) for dates in result.changed.values())
+            self.stdout.write(self.style.SUCCESS(
+                f"Compared {result.compared} multi-source days, {result.disputed} disputed, {changed} PriceHistory rows written."
+            ))
+
+        self.stdout.write(f"{'source':<12} {'observations':>12} {'compared':>9} {'disagree':>9} {'rate':>7}")
+        for row in disagreement_report(company_ids=company_ids):
+            rate = f"{row['rate']:.2f}%" if row['rate'] is not None else '-'
+            self.stdout.write(
+                f"{row['source']:<12} {row['observations']:>12} {row['compared']:>9} {row['disagreements']:>9} {rate:>7}"
+            )
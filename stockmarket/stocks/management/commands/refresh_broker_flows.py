@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from stocks.brokers import refresh_broker_flows
+from stocks.models import CompanyProfile
+
+
+class Command(BaseCommand):
+    help = "Rebuild the BrokerDailyFlow rollup from FloorSheet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', help="Only rebuild these symbols.")
+
+    def handle(self, *args, **options):
+        company_ids = None
+        if options['symbols']:
+            company_ids = list(CompanyProfile.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+        count = refresh_broker_flows(company_ids=company_ids)
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} broker flow rows."))
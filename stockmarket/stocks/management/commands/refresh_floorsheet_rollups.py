@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from stocks.models import CompanyProfile
+from stocks.rollups import compare_with_price_history, refresh_daily_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild FloorSheetDaily and optionally check its implied OHLC against PriceHistory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', help="Only rebuild these symbols.")
+        parser.add_argument('--check', action='store_true', help="Report days whose OHLC disagrees with PriceHistory.")
+        parser.add_argument('--tolerance', type=float, default=0.01, help="Relative tolerance for --check.")
+
+    def handle(self, *args, **options):
+        company_ids = None
+        if options['symbols']:
+            company_ids = list(CompanyProfile.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+        count = refresh_daily_rollups(company_ids=company_ids)
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} floorsheet daily rows."))
+
+        if options['check']:
+            mismatches = compare_with_price_history(company_ids=company_ids, tolerance=options['tolerance'])
+            symbols = dict(CompanyProfile.objects.values_list('id', 'symbol'))
+            for row in mismatches.itertuples(index=False):
+                self.stdout.write(
+                    f"{symbols.get(row.company_id):>10} {row.date}: "
+                    f"O {row.fs_open:.2f}/{row.open:.2f} H {row.fs_high:.2f}/{row.high:.2f} "
+                    f"L {row.fs_low:.2f}/{row.low:.2f} C {row.fs_close:.2f}/{row.close:.2f} (floorsheet/stored)"
+                )
+            self.stdout.write(f"{len(mismatches)} days outside tolerance.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from stocks.indicators import refresh_indicators
+from stocks.models import CompanyProfile
+
+
+class Command(BaseCommand):
+    help = "Recompute the TechnicalIndicator table from PriceHistory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', help="Only recompute these symbols.")
+
+    def handle(self, *args, **options):
+        company_ids = None
+        if options['symbols']:
+            company_ids = list(CompanyProfile.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+        count = refresh_indicators(company_ids=company_ids)
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} indicator rows."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from stocks.screener import SNAPSHOT_PATH, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the screener's per-company metrics snapshot."
+
+    def handle(self, *args, **options):
+        snapshot = refresh_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot of {len(snapshot['company_id'])} companies written to {SNAPSHOT_PATH}"
+        ))
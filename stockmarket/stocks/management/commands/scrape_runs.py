@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.models import ScrapeRun
+from stocks.scrape_runs import run_summary
+
+
+class Command(BaseCommand):
+    help = "Show throughput and failure breakdown of recent scrape runs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('run_id', nargs='?', type=int, help="Show one run in detail.")
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options['run_id']:
+            try:
+                run = ScrapeRun.objects.get(id=options['run_id'])
+            except ScrapeRun.DoesNotExist:
+                raise CommandError(f"Scrape run {options['run_id']} not found.")
+            for key, value in run_summary(run).items():
+                self.stdout.write(f"{key:>20}: {value}")
+            return
+
+        self.stdout.write(f"{'run':>5} {'task':<45} {'status':<10} {'symbols':>7} {'ok':>5} {'fail':>5} {'sym/min':>8}  failures")
+        for run in ScrapeRun.objects.all()[:options['limit']]:
+            summary = run_summary(run)
+            self.stdout.write(
+                f"{run.id:>5} {run.task_name[-45:]:<45} {run.status:<10} {summary['symbols']:>7} "
+                f"{summary['by_status'].get('succeeded', 0):>5} {summary['by_status'].get('failed', 0):>5} "
+                f"{summary['symbols_per_minute'] or 0:>8}  {summary['failures_by_type']}"
+            )
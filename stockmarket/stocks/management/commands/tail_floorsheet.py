@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.priority import select_symbols
+from stocks.single_flight import InFlight
+from stocks.tail import INTERVAL, TAIL_SOURCES, run_tail
+from stocks.trading_calendar import is_market_open
+
+
+class Command(BaseCommand):
+    help = "Poll the intraday floorsheet of the most active symbols until the session closes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=sorted(TAIL_SOURCES), default='sharesansar')
+        parser.add_argument('--symbols', nargs='+', help="Symbols to tail (default: the --top highest-priority ones).")
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--interval', type=int, default=INTERVAL, help="Seconds between the starts of two cycles.")
+        parser.add_argument('--once', action='store_true', help="Run a single cycle and exit.")
+        parser.add_argument('--ignore-hours', action='store_true', help="Poll even when the market is closed.")
+
+    def handle(self, *args, **options):
+        if not options['ignore_hours'] and not is_market_open():
+            self.stdout.write("Market is closed, nothing to tail.")
+            return
+        symbols = options['symbols'] or select_symbols('floorsheet', options['top'])
+        try:
+            cycles = run_tail(
+                options['source'], symbols, interval=options['interval'],
+                cycles=1 if options['once'] else None, ignore_hours=options['ignore_hours'],
+            )
+        except InFlight:
+            raise CommandError(f"A {options['source']} floorsheet tail is already running.")
+        self.stdout.write(self.style.SUCCESS(f"Tailed {len(symbols)} symbols for {cycles} cycles."))
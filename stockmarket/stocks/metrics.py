@@ -0,0 +1,227 @@
+import contextlib
+import contextvars
+import functools
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+import logging
+logger = logging.getLogger('stocks')
+
+# Upper bounds (seconds) of the histogram buckets stored with every metric
+# row; the last bucket is +Inf. Shared by all rows so histograms from
+# different runs can be summed before taking percentiles.
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120, 300]
+
+_labels = contextvars.ContextVar('stage_metric_labels', default={})
+_recorder = contextvars.ContextVar('stage_metric_recorder', default=None)
+
+
+class Recorder:
+    """
+    Collects span durations per (stage, source, symbol) in memory until flushed.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def add(self, stage, source, symbol, seconds):
+        self.samples[(stage, source or '', symbol or '')].append(seconds)
+
+    def aggregate(self):
+        rows = []
+        for (stage, source, symbol), samples in self.samples.items():
+            values = np.asarray(samples)
+            rows.append({
+                'stage': stage, 'source': source, 'symbol': symbol,
+                'count': len(values),
+                'total_seconds': float(values.sum()),
+                'max_seconds': float(values.max()),
+                'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95)),
+                'buckets': np.bincount(np.searchsorted(BUCKETS, values), minlength=len(BUCKETS) + 1).tolist(),
+            })
+        return rows
+
+
+@contextlib.contextmanager
+def labels(**values):
+    """
+    Default labels (source, symbol) for spans opened inside the block.
+    """
+    token = _labels.set({**_labels.get(), **{key: value for key, value in values.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+@contextlib.contextmanager
+def span(stage, **values):
+    """
+    Time the block as `stage`. A no-op apart from two clock reads when no
+    recording() is active.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder = _recorder.get()
+        if recorder is not None:
+            merged = {**_labels.get(), **{key: value for key, value in values.items() if value is not None}}
+            recorder.add(stage, merged.get('source'), merged.get('symbol'), time.perf_counter() - start)
+
+
+def timed(stage, **values):
+    """
+    Decorator form of span().
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, **values):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def recording(run_id=None):
+    """
+    Collect spans opened inside the block and store them as StageMetric rows
+    for `run_id` when it exits (even on error, so failed work is measured too).
+    Nested recording() blocks defer to the outermost one.
+    """
+    if _recorder.get() is not None:
+        yield _recorder.get()
+        return
+    recorder = Recorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+        try:
+            store(recorder, run_id)
+        except Exception as e:
+            logger.error(f"Failed to store stage metrics: {e}")
+
+
+def store(recorder, run_id=None):
+    from .models import StageMetric
+
+    rows = recorder.aggregate()
+    StageMetric.objects.bulk_create([StageMetric(run_id=run_id, **row) for row in rows])
+    return len(rows)
+
+
+def prune(days=None):
+    """
+    Delete rows older than `days`, folding them into StageMetricTotal first so
+    the exported counters keep every run ever recorded.
+    """
+    from .models import StageMetric, StageMetricTotal
+
+    if days is None:
+        days = getattr(settings, 'STAGE_METRICS_RETENTION_DAYS', 30)
+    with transaction.atomic():
+        old = StageMetric.objects.filter(recorded_at__lt=timezone.now() - timedelta(days=days))
+        for (stage, source), group in _merge(old).items():
+            total, _ = StageMetricTotal.objects.select_for_update().get_or_create(stage=stage, source=source)
+            total.count += group['count']
+            total.total_seconds += group['total']
+            total.buckets = (np.asarray(total.buckets or np.zeros(len(BUCKETS) + 1)) + group['buckets']).astype(int).tolist()
+            total.save()
+        deleted, _ = old.delete()
+    return deleted
+
+
+# ---------------------------------------------------------------------------
+# Reading the metrics back
+# ---------------------------------------------------------------------------
+
+def histogram_quantile(buckets, q):
+    """
+    Quantile from summed bucket counts, interpolating linearly inside the
+    bucket (same approach as Prometheus' histogram_quantile).
+    """
+    counts = np.asarray(buckets, dtype=float)
+    total = counts.sum()
+    if total == 0:
+        return None
+    cumulative = np.cumsum(counts)
+    i = int(np.searchsorted(cumulative, q * total))
+    lower = BUCKETS[i - 1] if i > 0 else 0.0
+    if i >= len(BUCKETS):
+        return lower
+    below = cumulative[i - 1] if i > 0 else 0.0
+    return lower + (BUCKETS[i] - lower) * (q * total - below) / counts[i]
+
+
+def _merge(queryset, group_by=('stage', 'source')):
+    """
+    {group key: count, total, max and summed buckets} over `queryset`.
+    """
+    groups = {}
+    for row in queryset.values(*group_by, 'count', 'total_seconds', 'max_seconds', 'buckets').order_by():
+        key = tuple(row[field] for field in group_by)
+        group = groups.setdefault(key, {'count': 0, 'total': 0.0, 'max': 0.0, 'buckets': np.zeros(len(BUCKETS) + 1)})
+        group['count'] += row['count']
+        group['total'] += row['total_seconds']
+        group['max'] = max(group['max'], row['max_seconds'])
+        group['buckets'] += np.asarray(row['buckets'], dtype=float)
+    return groups
+
+
+def summarize(queryset, group_by=('stage', 'source')):
+    """
+    p50/p95 per group over all rows in `queryset`, from merged histograms.
+    """
+    summary = []
+    for key, group in sorted(_merge(queryset, group_by).items(), key=lambda item: [str(part) for part in item[0]]):
+        summary.append({
+            **dict(zip(group_by, key)),
+            'count': group['count'],
+            'total_seconds': round(group['total'], 3),
+            'mean': round(group['total'] / group['count'], 4) if group['count'] else None,
+            'p50': histogram_quantile(group['buckets'], 0.5),
+            'p95': histogram_quantile(group['buckets'], 0.95),
+            'max': round(group['max'], 4),
+            'buckets': group['buckets'],
+        })
+    return summary
+
+
+def prometheus_text():
+    """
+    Prometheus text exposition of the stage histograms, labelled by stage and
+    source (symbols are left out to keep cardinality bounded). Counters are
+    cumulative since the first recorded run: stored rows plus the totals that
+    prune() folded away, so rate() and increase() work on them.
+    """
+    from .models import StageMetric, StageMetricTotal
+
+    groups = _merge(StageMetric.objects.all())
+    for total in StageMetricTotal.objects.all():
+        group = groups.setdefault((total.stage, total.source), {'count': 0, 'total': 0.0, 'buckets': np.zeros(len(BUCKETS) + 1)})
+        group['count'] += total.count
+        group['total'] += total.total_seconds
+        group['buckets'] += np.asarray(total.buckets, dtype=float)
+
+    lines = [
+        '# HELP stocks_stage_seconds Time spent per scraping/ingest stage.',
+        '# TYPE stocks_stage_seconds histogram',
+    ]
+    for (stage, source), group in sorted(groups.items()):
+        label = f'stage="{stage}",source="{source}"'
+        cumulative = np.cumsum(group['buckets'])
+        for bound, count in zip(BUCKETS + ['+Inf'], cumulative):
+            lines.append(f'stocks_stage_seconds_bucket{{{label},le="{bound}"}} {int(count)}')
+        lines.append(f'stocks_stage_seconds_sum{{{label}}} {round(group["total"], 3)}')
+        lines.append(f'stocks_stage_seconds_count{{{label}}} {group["count"]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0005_companynews_news_url_alter_companynews_company_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketHoliday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('inferred', models.BooleanField(default=False, help_text='Detected from gaps in PriceHistory rather than entered manually.')),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0006_marketholiday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TechnicalIndicator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sma_20', models.FloatField(null=True)),
+                ('sma_50', models.FloatField(null=True)),
+                ('ema_12', models.FloatField(null=True)),
+                ('ema_26', models.FloatField(null=True)),
+                ('rsi_14', models.FloatField(null=True)),
+                ('macd', models.FloatField(null=True)),
+                ('macd_signal', models.FloatField(null=True)),
+                ('macd_hist', models.FloatField(null=True)),
+                ('bb_upper', models.FloatField(null=True)),
+                ('bb_middle', models.FloatField(null=True)),
+                ('bb_lower', models.FloatField(null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stocks.companyprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'date'), name='unique_indicator_company_date')],
+            },
+        ),
+    ]
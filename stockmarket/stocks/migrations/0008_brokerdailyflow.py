@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 16:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0007_technicalindicator'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrokerDailyFlow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('broker', models.PositiveIntegerField()),
+                ('buy_quantity', models.FloatField(default=0)),
+                ('sell_quantity', models.FloatField(default=0)),
+                ('buy_amount', models.FloatField(default=0)),
+                ('sell_amount', models.FloatField(default=0)),
+                ('buy_trades', models.PositiveIntegerField(default=0)),
+                ('sell_trades', models.PositiveIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stocks.companyprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'broker'], name='stocks_brok_date_e52dc8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('company', 'date', 'broker'), name='unique_broker_flow')],
+            },
+        ),
+    ]
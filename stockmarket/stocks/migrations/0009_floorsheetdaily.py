@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 16:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0008_brokerdailyflow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FloorSheetDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('vwap', models.FloatField()),
+                ('total_quantity', models.FloatField()),
+                ('turnover', models.FloatField()),
+                ('trade_count', models.PositiveIntegerField()),
+                ('min_rate', models.FloatField()),
+                ('max_rate', models.FloatField()),
+                ('first_rate', models.FloatField()),
+                ('last_rate', models.FloatField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stocks.companyprofile')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('company', 'date'), name='unique_floorsheet_daily')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 16:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0009_floorsheetdaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('source', models.CharField(choices=[('nepstock', 'NepalStock'), ('sharesansar', 'Sharesansar'), ('merolagani', 'Merolagani')], max_length=20)),
+                ('open_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('high_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('low_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('close_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('agrees_with_consensus', models.BooleanField(null=True)),
+                ('scraped_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stocks.companyprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'date', 'source'), name='unique_price_observation')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 16:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0011_scraperun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('stage', models.CharField(max_length=50)),
+                ('source', models.CharField(blank=True, max_length=20)),
+                ('symbol', models.CharField(blank=True, max_length=50)),
+                ('count', models.PositiveIntegerField()),
+                ('total_seconds', models.FloatField()),
+                ('max_seconds', models.FloatField()),
+                ('p50', models.FloatField()),
+                ('p95', models.FloatField()),
+                ('buckets', models.JSONField(default=list)),
+                ('run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='metrics', to='stocks.scraperun')),
+            ],
+            options={
+                'ordering': ['-recorded_at'],
+                'indexes': [models.Index(fields=['stage', 'source'], name='stocks_stag_stage_af67ef_idx')],
+            },
+        ),
+    ]
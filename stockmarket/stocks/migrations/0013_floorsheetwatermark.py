@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 16:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0012_stagemetric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FloorsheetWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20)),
+                ('date', models.DateField()),
+                ('last_contract', models.CharField(blank=True, max_length=25)),
+                ('contracts', models.PositiveIntegerField(default=0)),
+                ('polled_at', models.DateTimeField(blank=True, null=True)),
+                ('last_new_at', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='floorsheet_watermarks', to='stocks.companyprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'source'), name='unique_floorsheet_watermark')],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2 on 2026-10-19 17:31
+
+from django.db import migrations
+
+from ._vendor import news_search_index
+
+
+# Full-text index over CompanyNews: FTS5 on SQLite, a tsvector column on
+# PostgreSQL (SQL in _vendor). Other backends fall back to icontains.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0013_floorsheetwatermark'),
+    ]
+
+    operations = news_search_index()
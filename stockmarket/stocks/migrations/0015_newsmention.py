@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 17:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from ._vendor import keep_news_search_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0014_news_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsMention',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mentions', models.PositiveIntegerField(default=1)),
+                ('in_title', models.BooleanField(default=False)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='news_mentions', to='stocks.companyprofile')),
+                ('news', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='stocks.companynews')),
+            ],
+        ),
+        # Adding the companies field makes SQLite rebuild stocks_companynews,
+        # which drops the search index triggers from 0014.
+        *keep_news_search_triggers(
+            migrations.AddField(
+                model_name='companynews',
+                name='companies',
+                field=models.ManyToManyField(blank=True, related_name='mentioned_in', through='stocks.NewsMention', to='stocks.companyprofile'),
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='newsmention',
+            constraint=models.UniqueConstraint(fields=('news', 'company'), name='unique_news_mention'),
+        ),
+    ]
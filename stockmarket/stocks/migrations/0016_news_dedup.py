@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 17:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0015_newsmention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companynews',
+            name='canonical',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='stocks.companynews'),
+        ),
+        migrations.AddField(
+            model_name='companynews',
+            name='minhash',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='NewsSignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('news', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='stocks.companynews')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='news_band_bucket_idx')],
+            },
+        ),
+    ]
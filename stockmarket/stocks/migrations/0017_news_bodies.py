@@ -0,0 +1,152 @@
+# Generated by Django 5.2 on 2026-10-19 17:32
+
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from ._vendor import VendorRunSQL, news_search_index
+
+# Article bodies move out of CompanyNews into NewsBody, zlib-compressed, and
+# list pages get a plain-text teaser instead. The full-text index of 0014 reads
+# news_body, so it is dropped here (and recreated when migrating back) and
+# replaced by one over NewsBody, fed from Python by stocks.news_search since
+# the database cannot read the bodies.
+FTS_TABLE = 'stocks_companynews_fts'
+
+SQLITE_CREATE = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        news_title, news_body,
+        content='',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+SQLITE_DROP = [
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_CREATE = [
+    "ALTER TABLE stocks_newsbody ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS stocks_newsbody_search_idx ON stocks_newsbody USING GIN (search_vector)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS stocks_newsbody_search_idx",
+    "ALTER TABLE stocks_newsbody DROP COLUMN IF EXISTS search_vector",
+]
+
+INSERT = {
+    'sqlite': f"INSERT INTO {FTS_TABLE}(rowid, news_title, news_body) VALUES (%s, %s, %s)",
+    'postgresql': (
+        "UPDATE stocks_newsbody SET search_vector = "
+        "setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B') "
+        "WHERE news_id = %s"
+    ),
+}
+
+TEASER_LENGTH = 200
+
+
+def teaser(text):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= TEASER_LENGTH else text[:TEASER_LENGTH - 1].rsplit(' ', 1)[0] + '…'
+
+
+def move_bodies(apps, schema_editor, batch_size=1000):
+    CompanyNews = apps.get_model('stocks', 'CompanyNews')
+    NewsBody = apps.get_model('stocks', 'NewsBody')
+    last_id = 0
+    while True:
+        batch = list(CompanyNews.objects.filter(id__gt=last_id).order_by('id').only('id', 'news_body')[:batch_size])
+        if not batch:
+            break
+        NewsBody.objects.bulk_create(
+            NewsBody(news_id=news.id, data=zlib.compress(news.news_body.encode('utf-8'), 6), length=len(news.news_body))
+            for news in batch
+        )
+        for news in batch:
+            news.news_teaser = teaser(news.news_body)
+        CompanyNews.objects.bulk_update(batch, ['news_teaser'])
+        last_id = batch[-1].id
+
+
+def restore_bodies(apps, schema_editor):
+    CompanyNews = apps.get_model('stocks', 'CompanyNews')
+    NewsBody = apps.get_model('stocks', 'NewsBody')
+    for body in NewsBody.objects.iterator(chunk_size=1000):
+        CompanyNews.objects.filter(id=body.news_id).update(news_body=zlib.decompress(bytes(body.data)).decode('utf-8'))
+
+
+def fill_index(apps, schema_editor, batch_size=1000):
+    vendor = schema_editor.connection.vendor
+    if vendor not in INSERT:
+        return
+    NewsBody = apps.get_model('stocks', 'NewsBody')
+    last_id = 0
+    while True:
+        batch = list(
+            NewsBody.objects.filter(news_id__gt=last_id).order_by('news_id')
+            .values_list('news_id', 'news__news_title', 'data')[:batch_size]
+        )
+        if not batch:
+            break
+        rows = [(news_id, title, zlib.decompress(bytes(data)).decode('utf-8')) for news_id, title, data in batch]
+        if vendor == 'postgresql':
+            rows = [(title, body, news_id) for news_id, title, body in rows]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(INSERT[vendor], rows)
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0016_news_dedup'),
+    ]
+
+    operations = [
+        *news_search_index(drop=True),
+        migrations.CreateModel(
+            name='NewsBody',
+            fields=[
+                ('news', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='body', serialize=False, to='stocks.companynews')),
+                ('data', models.BinaryField()),
+                ('length', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='companynews',
+            name='news_teaser',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(move_bodies, restore_bodies),
+        # A default lets the column be re-added (then refilled) when migrating back.
+        migrations.AlterField(
+            model_name='companynews',
+            name='news_body',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='companynews',
+            name='news_body',
+        ),
+        migrations.AlterField(
+            model_name='companynews',
+            name='canonical',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='stocks.companynews'),
+        ),
+        migrations.AddIndex(
+            model_name='companynews',
+            index=models.Index(condition=models.Q(('canonical__isnull', True)), fields=['-news_date', '-id'], name='news_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='companynews',
+            index=models.Index(condition=models.Q(('canonical__isnull', False)), fields=['canonical'], name='news_canonical_idx'),
+        ),
+        VendorRunSQL('sqlite', SQLITE_CREATE, SQLITE_DROP),
+        VendorRunSQL('postgresql', POSTGRES_CREATE, POSTGRES_DROP),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
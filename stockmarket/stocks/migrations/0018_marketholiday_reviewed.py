@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0017_news_bodies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketholiday',
+            name='reviewed',
+            field=models.BooleanField(default=False, help_text='Inferred holidays are trusted by the gap planner only once reviewed: a failed market-wide scrape leaves the same gap.'),
+        ),
+    ]
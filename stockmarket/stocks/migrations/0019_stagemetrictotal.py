@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-19 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0018_marketholiday_reviewed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageMetricTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=50)),
+                ('source', models.CharField(blank=True, max_length=20)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('buckets', models.JSONField(default=list)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stage', 'source'), name='unique_stage_metric_total')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0019_stagemetrictotal'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='priceobservation',
+            name='source',
+            field=models.CharField(choices=[('nepstock', 'NepalStock'), ('sharesansar', 'Sharesansar'), ('merolagani', 'Merolagani'), ('legacy', 'Stored before reconciliation')], max_length=20),
+        ),
+    ]
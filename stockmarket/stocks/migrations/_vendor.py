@@ -0,0 +1,122 @@
+from django.db import migrations
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """
+    RunSQL that only runs (forwards and backwards) on one database vendor,
+    for SQL that has no portable equivalent. A no-op elsewhere.
+    """
+
+    def __init__(self, vendor, sql, reverse_sql=None, **kwargs):
+        self.vendor = vendor
+        super().__init__(sql, reverse_sql, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, args, {'vendor': self.vendor, **kwargs}
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return f"Raw SQL operation ({self.vendor} only)"
+
+
+# The full-text index over CompanyNews created by 0014_news_search. Later
+# migrations that rebuild the news table or replace the index use these
+# statements rather than copies of them.
+NEWS_FTS_TABLE = 'stocks_companynews_fts'
+
+# SQLite: an external-content FTS5 table, so article text is stored once, kept
+# in step with every insert/update/delete by triggers.
+NEWS_FTS_SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {NEWS_FTS_TABLE}_ai AFTER INSERT ON stocks_companynews BEGIN
+        INSERT INTO {NEWS_FTS_TABLE}(rowid, news_title, news_body) VALUES (new.id, new.news_title, new.news_body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {NEWS_FTS_TABLE}_ad AFTER DELETE ON stocks_companynews BEGIN
+        INSERT INTO {NEWS_FTS_TABLE}({NEWS_FTS_TABLE}, rowid, news_title, news_body) VALUES ('delete', old.id, old.news_title, old.news_body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {NEWS_FTS_TABLE}_au AFTER UPDATE OF news_title, news_body ON stocks_companynews BEGIN
+        INSERT INTO {NEWS_FTS_TABLE}({NEWS_FTS_TABLE}, rowid, news_title, news_body) VALUES ('delete', old.id, old.news_title, old.news_body);
+        INSERT INTO {NEWS_FTS_TABLE}(rowid, news_title, news_body) VALUES (new.id, new.news_title, new.news_body);
+    END
+    """,
+]
+
+NEWS_FTS_SQLITE_DROP_TRIGGERS = [
+    f"DROP TRIGGER IF EXISTS {NEWS_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {NEWS_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {NEWS_FTS_TABLE}_au",
+]
+
+NEWS_FTS_SQLITE_CREATE = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {NEWS_FTS_TABLE} USING fts5(
+        news_title, news_body,
+        content='stocks_companynews', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    *NEWS_FTS_SQLITE_TRIGGERS,
+    f"INSERT INTO {NEWS_FTS_TABLE}({NEWS_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+NEWS_FTS_SQLITE_DROP = [
+    *NEWS_FTS_SQLITE_DROP_TRIGGERS,
+    f"DROP TABLE IF EXISTS {NEWS_FTS_TABLE}",
+]
+
+# PostgreSQL: a generated tsvector column (title weighted above body) with a
+# GIN index; the database maintains it on every write.
+NEWS_FTS_POSTGRES_CREATE = [
+    """
+    ALTER TABLE stocks_companynews ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(news_title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(news_body, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS stocks_companynews_search_idx ON stocks_companynews USING GIN (search_vector)",
+]
+
+NEWS_FTS_POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS stocks_companynews_search_idx",
+    "ALTER TABLE stocks_companynews DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def news_search_index(drop=False):
+    """
+    Operations that create the news search index (dropping it when migrating
+    back), or with drop=True drop it (recreating it when migrating back).
+    """
+    sqlite = [NEWS_FTS_SQLITE_CREATE, NEWS_FTS_SQLITE_DROP]
+    postgres = [NEWS_FTS_POSTGRES_CREATE, NEWS_FTS_POSTGRES_DROP]
+    if drop:
+        sqlite.reverse()
+        postgres.reverse()
+    return [VendorRunSQL('sqlite', *sqlite), VendorRunSQL('postgresql', *postgres)]
+
+
+def keep_news_search_triggers(*operations):
+    """
+    Wrap operations that make SQLite rebuild stocks_companynews (adding a
+    foreign key or many-to-many field does), which drops the index triggers
+    without a word. They are dropped first and recreated afterwards, in both
+    directions.
+    """
+    return [
+        VendorRunSQL('sqlite', NEWS_FTS_SQLITE_DROP_TRIGGERS, NEWS_FTS_SQLITE_TRIGGERS),
+        *operations,
+        VendorRunSQL('sqlite', NEWS_FTS_SQLITE_TRIGGERS, NEWS_FTS_SQLITE_DROP_TRIGGERS),
+    ]
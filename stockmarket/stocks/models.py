@@ -1,5 +1,9 @@
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
+from .news_bodies import decompress, teaser, write_bodies
+from .news_search import index, unindex
+
 class CompanyProfile(models.Model):
     name = models.CharField(max_length=255)
     symbol = models.CharField(max_length=50)
@@ -22,12 +26,97 @@ class CompanyNews(models.Model):
     news_title = models.CharField(max_length=255)
     news_date = models.DateTimeField()
     news_image = models.URLField(null=True, blank=True)
-    news_body = models.TextField()
+    # The body itself is stored compressed in NewsBody; see the news_body property.
+    news_teaser = models.CharField(max_length=255, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Every company the article mentions (stocks.entity_linking); `company` is the main one.
+    companies = models.ManyToManyField(CompanyProfile, through='NewsMention', related_name='mentioned_in', blank=True)
+    # Near-duplicate detection (stocks.news_dedup): MinHash signature of the text,
+    # and the first-stored copy of the same story when this is a re-publication.
+    minhash = models.BinaryField(null=True, blank=True)
+    canonical = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates', db_index=False)
+
+    class Meta:
+        indexes = [
+            # The news list: canonical articles, newest first. Only duplicates
+            # are indexed by canonical, or SQLite would pick that index for
+            # "canonical IS NULL" and sort the whole table.
+            models.Index(fields=['-news_date', '-id'], condition=models.Q(canonical__isnull=True), name='news_list_idx'),
+            models.Index(fields=['canonical'], condition=models.Q(canonical__isnull=False), name='news_canonical_idx'),
+        ]
 
     def __str__(self):
         return self.news_title
 
+    @property
+    def news_body(self):
+        """
+        Article text, loaded from NewsBody on first access (use
+        select_related('body') when reading many).
+        """
+        if not hasattr(self, '_news_body'):
+            try:
+                self._news_body = self.body.text if self.pk else ''
+            except ObjectDoesNotExist:
+                self._news_body = ''
+        return self._news_body
+
+    @news_body.setter
+    def news_body(self, value):
+        self._news_body = value or ''
+        self._body_changed = True
+        self.news_teaser = teaser(self._news_body)
+
+    def save(self, *args, **kwargs):
+        # The search index is fed from here (stocks.news_search): the stored
+        # entry is removed before the title or body can change.
+        adding = self._state.adding
+        body_changed = getattr(self, '_body_changed', False)
+        indexed = [] if adding else unindex([self.pk])
+        super().save(*args, **kwargs)
+        if adding or body_changed:
+            write_bodies([self])
+            self._body_changed = False
+        if adding or body_changed or indexed:
+            index([self])
+
+class NewsBody(models.Model):
+    news = models.OneToOneField(CompanyNews, on_delete=models.CASCADE, primary_key=True, related_name='body')
+    data = models.BinaryField()
+    length = models.PositiveIntegerField(default=0)
+
+    @property
+    def text(self):
+        return decompress(self.data)
+
+class NewsSignatureBand(models.Model):
+    """
+    One LSH band of an article's MinHash, indexed so near-duplicates are found
+    by exact lookups instead of comparing against every stored signature.
+    """
+    news = models.ForeignKey(CompanyNews, on_delete=models.CASCADE, related_name='signature_bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='news_band_bucket_idx')
+        ]
+
+class NewsMention(models.Model):
+    news = models.ForeignKey(CompanyNews, on_delete=models.CASCADE, related_name='mentions')
+    company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE, related_name='news_mentions')
+    mentions = models.PositiveIntegerField(default=1)
+    in_title = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['news', 'company'], name='unique_news_mention')
+        ]
+
+    def __str__(self):
+        return f"{self.company.symbol} in {self.news_id}"
+
 class PriceHistory(models.Model):
     company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE)
     date = models.DateField()
@@ -44,6 +133,35 @@ class PriceHistory(models.Model):
     def __str__(self):
         return f"{self.company.symbol} - {self.date}"
 
+class PriceObservation(models.Model):
+    """
+    Raw price row as reported by one source. PriceHistory holds the
+    reconciled consensus across sources (see stocks.reconciliation).
+    """
+    SOURCE_CHOICES = [
+        ('nepstock', 'NepalStock'),
+        ('sharesansar', 'Sharesansar'),
+        ('merolagani', 'Merolagani'),
+        ('legacy', 'Stored before reconciliation'),
+    ]
+    company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE)
+    date = models.DateField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    open_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    high_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    low_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    close_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    agrees_with_consensus = models.BooleanField(null=True)
+    scraped_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'date', 'source'], name='unique_price_observation')
+        ]
+
+    def __str__(self):
+        return f"{self.company.symbol} - {self.date} ({self.source})"
+
 class FloorSheet(models.Model):
     company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE)
     transaction_id = models.CharField(max_length=25, unique=True)
@@ -61,3 +179,227 @@ class FloorSheet(models.Model):
 
     def __str__(self):
         return f"Txn {self.transaction_no} - {self.date}"
+
+class MarketHoliday(models.Model):
+    date = models.DateField(unique=True)
+    description = models.CharField(max_length=255, blank=True)
+    inferred = models.BooleanField(default=False, help_text="Detected from gaps in PriceHistory rather than entered manually.")
+    reviewed = models.BooleanField(
+        default=False,
+        help_text="Inferred holidays are trusted by the gap planner only once reviewed: a failed market-wide scrape leaves the same gap.",
+    )
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.date} - {self.description or 'Market holiday'}"
+
+class TechnicalIndicator(models.Model):
+    """
+    Derived from PriceHistory closes by stocks.indicators; never edited by hand.
+    """
+    company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE)
+    date = models.DateField()
+    sma_20 = models.FloatField(null=True)
+    sma_50 = models.FloatField(null=True)
+    ema_12 = models.FloatField(null=True)
+    ema_26 = models.FloatField(null=True)
+    rsi_14 = models.FloatField(null=True)
+    macd = models.FloatField(null=True)
+    macd_signal = models.FloatField(null=True)
+    macd_hist = models.FloatField(null=True)
+    bb_upper = models.FloatField(null=True)
+    bb_middle = models.FloatField(null=True)
+    bb_lower = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'date'], name='unique_indicator_company_date')
+        ]
+
+    def __str__(self):
+        return f"{self.company.symbol} indicators - {self.date}"
+
+class BrokerDailyFlow(models.Model):
+    """
+    Per (company, date, broker) buy/sell totals rolled up from FloorSheet by stocks.brokers.
+    """
+    company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE)
+    date = models.DateField()
+    broker = models.PositiveIntegerField()
+    buy_quantity = models.FloatField(default=0)
+    sell_quantity = models.FloatField(default=0)
+    buy_amount = models.FloatField(default=0)
+    sell_amount = models.FloatField(default=0)
+    buy_trades = models.PositiveIntegerField(default=0)
+    sell_trades = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'date', 'broker'], name='unique_broker_flow')
+        ]
+        indexes = [
+            models.Index(fields=['date', 'broker']),
+        ]
+
+    @property
+    def net_quantity(self):
+        return self.buy_quantity - self.sell_quantity
+
+    @property
+    def net_amount(self):
+        return self.buy_amount - self.sell_amount
+
+    def __str__(self):
+        return f"{self.company.symbol} - broker {self.broker} - {self.date}"
+
+class FloorSheetDaily(models.Model):
+    """
+    One row per (company, date) summarizing that day's FloorSheet contracts.
+    Maintained by stocks.rollups.
+    """
+    company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE)
+    date = models.DateField()
+    vwap = models.FloatField()
+    total_quantity = models.FloatField()
+    turnover = models.FloatField()
+    trade_count = models.PositiveIntegerField()
+    min_rate = models.FloatField()
+    max_rate = models.FloatField()
+    first_rate = models.FloatField()
+    last_rate = models.FloatField()
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'date'], name='unique_floorsheet_daily')
+        ]
+
+    def __str__(self):
+        return f"{self.company.symbol} floorsheet summary - {self.date}"
+
+class ScrapeRun(models.Model):
+    """
+    One execution of a per-symbol scraping task. Interrupted runs are resumed
+    by the next invocation of the same task (see stocks.scrape_runs).
+    """
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Completed with failures'),
+    ]
+    task_name = models.CharField(max_length=200)
+    dataset = models.CharField(max_length=50)
+    source = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    resumed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['task_name', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name} #{self.id} ({self.status})"
+
+class ScrapeRunItem(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    run = models.ForeignKey(ScrapeRun, on_delete=models.CASCADE, related_name='items')
+    symbol = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    source = models.CharField(max_length=20, blank=True)
+    records = models.PositiveIntegerField(default=0)
+    error_type = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    next_retry_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'symbol'], name='unique_scrape_run_item')
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} ({self.status}) in run #{self.run_id}"
+
+class StageMetric(models.Model):
+    """
+    Timings of one stage (driver start, page load, sleep, parse, persist, ...)
+    for one source and symbol within a run, written by stocks.metrics.
+    `buckets` holds histogram counts over stocks.metrics.BUCKETS.
+    """
+    run = models.ForeignKey(ScrapeRun, on_delete=models.SET_NULL, null=True, blank=True, related_name='metrics')
+    recorded_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    stage = models.CharField(max_length=50)
+    source = models.CharField(max_length=20, blank=True)
+    symbol = models.CharField(max_length=50, blank=True)
+    count = models.PositiveIntegerField()
+    total_seconds = models.FloatField()
+    max_seconds = models.FloatField()
+    p50 = models.FloatField()
+    p95 = models.FloatField()
+    buckets = models.JSONField(default=list)
+
+    class Meta:
+        ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['stage', 'source']),
+        ]
+
+    def __str__(self):
+        return f"{self.stage} {self.source} {self.symbol} ({self.count}x, p50 {self.p50:.3f}s)"
+
+
+class StageMetricTotal(models.Model):
+    """
+    Running totals per stage and source of the StageMetric rows removed by
+    stocks.metrics.prune, so the Prometheus counters never go down.
+    """
+    stage = models.CharField(max_length=50)
+    source = models.CharField(max_length=20, blank=True)
+    count = models.PositiveBigIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    buckets = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stage', 'source'], name='unique_stage_metric_total'),
+        ]
+
+    def __str__(self):
+        return f"{self.stage} {self.source} ({self.count}x)"
+
+class FloorsheetWatermark(models.Model):
+    """
+    Highest contract number seen per company and source during a session,
+    used by the intraday tail (stocks.tail) to fetch only newer contracts.
+    """
+    company = models.ForeignKey(CompanyProfile, on_delete=models.CASCADE, related_name='floorsheet_watermarks')
+    source = models.CharField(max_length=20)
+    date = models.DateField()
+    last_contract = models.CharField(max_length=25, blank=True)
+    contracts = models.PositiveIntegerField(default=0)
+    polled_at = models.DateTimeField(null=True, blank=True)
+    last_new_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'source'], name='unique_floorsheet_watermark'),
+        ]
+
+    def __str__(self):
+        return f"{self.company.symbol} {self.source} {self.date}: {self.last_contract or '-'}"
@@ -0,0 +1,51 @@
+import zlib
+
+import logging
+logger = logging.getLogger('stocks')
+
+# Article bodies live zlib-compressed in NewsBody, away from the CompanyNews
+# rows that list pages scan; only the detail page (and search snippets,
+# linking and dedup) ever decompress them.
+LEVEL = 6
+TEASER_LENGTH = 200
+
+
+def compress(text):
+    return zlib.compress((text or '').encode('utf-8'), LEVEL)
+
+
+def decompress(data):
+    return zlib.decompress(bytes(data)).decode('utf-8') if data else ''
+
+
+def teaser(text):
+    """
+    The first TEASER_LENGTH characters of the body, whitespace collapsed, for list pages.
+    """
+    text = ' '.join((text or '').split())
+    return text if len(text) <= TEASER_LENGTH else text[:TEASER_LENGTH - 1].rsplit(' ', 1)[0] + '…'
+
+
+def write_bodies(articles):
+    """
+    Write the bodies of saved `articles` (inserting or replacing), one query
+    per call, leaving the search index alone (see store_bodies).
+    """
+    from .models import NewsBody
+
+    NewsBody.objects.bulk_create(
+        [NewsBody(news_id=article.id, data=compress(article.news_body), length=len(article.news_body)) for article in articles],
+        update_conflicts=True, unique_fields=['news'], update_fields=['data', 'length'],
+    )
+
+
+def store_bodies(articles):
+    """
+    Write the bodies of saved `articles` and (re)index them for search.
+    bulk_create() skips Model.save(), so bulk inserts call this.
+    """
+    from .news_search import index, unindex
+
+    unindex([article.id for article in articles])
+    write_bodies(articles)
+    index(articles)
@@ -0,0 +1,159 @@
+import hashlib
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .metrics import timed
+
+import logging
+logger = logging.getLogger('stocks')
+
+# Estimated Jaccard similarity (of word 2-shingles) at or above which two
+# articles count as the same story.
+SIMILARITY = getattr(settings, 'NEWS_DUPLICATE_SIMILARITY', 0.6)
+WINDOW = timedelta(days=getattr(settings, 'NEWS_DUPLICATE_WINDOW_DAYS', 7))
+SHINGLE = 2
+MIN_TOKENS = 20
+
+# 64 hash functions in 32 bands of 2 rows: a pair with similarity s shares a
+# band with probability 1 - (1 - s^2)^32, i.e. 95% at s=0.3 and >99.99% at
+# s=0.5, so duplicates are never missed; unrelated articles (s around 0.03)
+# rarely collide, and candidates are confirmed on the full signature.
+PERMUTATIONS = 64
+BANDS = 32
+ROWS = PERMUTATIONS // BANDS
+
+_SEEDS = np.random.default_rng(20240601).integers(0, 2**63, PERMUTATIONS, dtype=np.uint64)[:, None]
+
+
+def _tokens(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def _mix(values):
+    """
+    splitmix64 finaliser: a cheap, well-spread 64-bit hash (wraps on overflow).
+    """
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def signature(title, body):
+    """
+    MinHash of the article's word 2-shingles (title included) as PERMUTATIONS
+    uint32 values, or None when the text is too short to compare reliably.
+    """
+    tokens = _tokens(title) + _tokens(body)
+    if len(tokens) < MIN_TOKENS:
+        return None
+    shingles = {' '.join(tokens[i:i + SHINGLE]) for i in range(len(tokens) - SHINGLE + 1)}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'little') for shingle in shingles],
+        dtype=np.uint64,
+    )
+    # One hash function per seed; keep the minimum over all shingles.
+    return (_mix(hashes[None, :] ^ _SEEDS) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def similarity(a, b):
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return float(np.mean(a == b))
+
+
+def bands(minhash):
+    """
+    (band, bucket) pairs; bucket is a signed 64-bit hash of the band's rows.
+    """
+    rows = minhash.reshape(BANDS, ROWS)
+    return [
+        (band, int.from_bytes(hashlib.blake2b(rows[band].tobytes(), digest_size=8).digest(), 'big', signed=True))
+        for band in range(BANDS)
+    ]
+
+
+def find_canonical(article, minhash):
+    """
+    The canonical article of the most similar story stored within WINDOW of
+    this one's date, or None. Candidates come from the band index; only they
+    are compared signature to signature.
+    """
+    from .models import CompanyNews, NewsSignatureBand
+
+    news_date = article.news_date
+    if not isinstance(news_date, datetime):
+        # Savers assign the scraped date string; read back what was stored.
+        news_date = CompanyNews.objects.values_list('news_date', flat=True).get(id=article.id)
+    lookup = Q()
+    for band, bucket in bands(minhash):
+        lookup |= Q(band=band, bucket=bucket)
+    candidates = (
+        NewsSignatureBand.objects.filter(lookup)
+        .filter(news__news_date__range=(news_date - WINDOW, news_date + WINDOW))
+        .exclude(news_id=article.id)
+        .values_list('news_id', 'news__minhash', 'news__canonical_id')
+        .distinct()
+    )
+    best = None
+    for news_id, other, canonical_id in candidates:
+        score = similarity(minhash, np.frombuffer(other, dtype=np.uint32))
+        if score >= SIMILARITY and (best is None or (score, -news_id) > best[:2]):
+            best = (score, -news_id, canonical_id or news_id)
+    return best[2] if best else None
+
+
+@timed('dedup')
+def mark_duplicate(article):
+    """
+    Sign `article`, attach it to the cluster of a near-identical recent
+    article if there is one, and index its bands. Returns the canonical id
+    it was attached to, or None when it is an original.
+    """
+    from .models import CompanyNews, NewsSignatureBand
+
+    minhash = signature(article.news_title, article.news_body)
+    if minhash is None:
+        return None
+    canonical_id = find_canonical(article, minhash)
+    with transaction.atomic():
+        CompanyNews.objects.filter(id=article.id).update(minhash=minhash.tobytes(), canonical_id=canonical_id)
+        NewsSignatureBand.objects.filter(news_id=article.id).delete()
+        NewsSignatureBand.objects.bulk_create(
+            NewsSignatureBand(news_id=article.id, band=band, bucket=bucket) for band, bucket in bands(minhash)
+        )
+    article.canonical_id = canonical_id
+    if canonical_id:
+        logger.info(f"News {article.id} is a near-duplicate of {canonical_id}: {article.news_url}")
+    return canonical_id
+
+
+def backfill_duplicates(batch_size=500):
+    """
+    Sign and cluster every article that has no signature yet, oldest first
+    so the earliest copy of a story becomes its canonical article. Articles
+    too short to sign keep a NULL signature. Returns (articles, duplicates).
+    """
+    from .models import CompanyNews
+
+    processed = duplicates = 0
+    after = Q()
+    while True:
+        batch = list(
+            CompanyNews.objects.filter(after, minhash__isnull=True).order_by('news_date', 'id').select_related('body')
+            .only('id', 'news_url', 'news_date', 'news_title', 'body__data')[:batch_size]
+        )
+        if not batch:
+            break
+        for article in batch:
+            duplicates += mark_duplicate(article) is not None
+        processed += len(batch)
+        last = batch[-1]
+        after = Q(news_date__gt=last.news_date) | Q(news_date=last.news_date, id__gt=last.id)
+        logger.info(f"News dedup: {processed} articles, {duplicates} duplicates")
+    return processed, duplicates
@@ -0,0 +1,264 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+import logging
+logger = logging.getLogger('stocks')
+
+FTS_TABLE = 'stocks_companynews_fts'
+MAX_PER_PAGE = 50
+
+# Snippets come back wrapped in these and are escaped before the markers are
+# turned into <mark>, since article bodies are scraped HTML-ish text.
+_START, _STOP = '\x02', '\x03'
+
+# The index is written from Python, never by the database: bodies are stored
+# compressed (NewsBody), which neither SQLite nor PostgreSQL can read. Every
+# write that goes through Django keeps it current: CompanyNews.save() and
+# stocks.news_bodies.store_bodies() (which bulk_create() callers use) call
+# unindex() before the stored title or body changes and index() after.
+# Anything else that changes a title or body (QuerySet.update(), raw SQL,
+# another client) must call rebuild_index() afterwards.
+#
+# SQLite: a contentless FTS5 table keyed by article id. Removing an entry
+# takes the exact text it was indexed with, which is why unindex() reads it
+# back before it changes. Deleted articles keep their entries until
+# rebuild_index(); searches join stocks_companynews and so never return them
+# (ids are AUTOINCREMENT and never reused).
+#
+# PostgreSQL: a tsvector column (title weighted above body) on NewsBody with a
+# GIN index, overwritten by index(); deleting the body deletes it too.
+#
+# The schema is created by migration 0017_news_bodies.
+
+_SQLITE_INSERT = f"INSERT INTO {FTS_TABLE}(rowid, news_title, news_body) VALUES (%s, %s, %s)"
+_SQLITE_DELETE = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, news_title, news_body) VALUES ('delete', %s, %s, %s)"
+
+_POSTGRES_VECTOR = (
+    "UPDATE stocks_newsbody SET search_vector = "
+    "setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B') "
+    "WHERE news_id = %s"
+)
+
+
+def index(articles):
+    """
+    Add saved articles, with their bodies stored, to the index. Articles
+    already in it must be unindex()ed first (SQLite).
+    """
+    rows = [(article.id, article.news_title, article.news_body) for article in articles]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(_SQLITE_INSERT, rows)
+        elif connection.vendor == 'postgresql':
+            cursor.executemany(_POSTGRES_VECTOR, [(title, body, news_id) for news_id, title, body in rows])
+
+
+def unindex(ids):
+    """
+    Remove these articles' entries, using the title and body currently
+    stored. Returns the ids that had a body, i.e. were indexed.
+    """
+    from .models import CompanyNews
+
+    ids = list(ids)
+    if not ids or connection.vendor not in ('sqlite', 'postgresql'):
+        return []
+    if connection.vendor == 'postgresql':
+        return list(CompanyNews.objects.filter(id__in=ids, body__isnull=False).values_list('id', flat=True))
+    articles = CompanyNews.objects.filter(id__in=ids, body__isnull=False).select_related('body').only('id', 'news_title', 'body__data')
+    rows = [(article.id, article.news_title, article.news_body) for article in articles]
+    with connection.cursor() as cursor:
+        cursor.executemany(_SQLITE_DELETE, rows)
+    return [news_id for news_id, _, _ in rows]
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Re-index every article from scratch, e.g. after writes made outside
+    Django. On SQLite this also drops the entries of deleted articles.
+    """
+    from .models import CompanyNews
+
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+    last_id = 0
+    while True:
+        batch = list(
+            CompanyNews.objects.filter(id__gt=last_id, body__isnull=False).order_by('id')
+            .select_related('body').only('id', 'news_title', 'body__data')[:batch_size]
+        )
+        if not batch:
+            break
+        index(batch)
+        last_id = batch[-1].id
+
+
+def optimize_index():
+    """
+    Merge the FTS5 index segments (SQLite only). Re-indexing or unindexing
+    many articles leaves tombstones that every later query has to skip
+    until the segments merge.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+def fts5_query(query):
+    """
+    User input as an FTS5 MATCH expression: every word must appear, the last
+    one as a prefix (so "nabil divid" finds dividends). Words are quoted, so
+    FTS5 operators and punctuation in the input are never interpreted.
+    """
+    words = terms(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def _highlight(snippet):
+    return escape(snippet or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def _snippet(text, words, length=240):
+    """
+    About `length` characters of `text` around the first matched word, with
+    every word that starts with a query term marked.
+    """
+    lowered = text.lower()
+    found = [at for at in (lowered.find(word.lower()) for word in words) if at >= 0]
+    at = min(found) if found else 0
+    start = max(0, at - length // 3)
+    if start:
+        start = text.find(' ', start) + 1
+    snippet = text[start:start + length]
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(word) for word in words) + r')\w*', re.IGNORECASE)
+    snippet = pattern.sub(lambda match: f"{_START}{match.group(0)}{_STOP}", snippet)
+    return ('…' if start else '') + snippet + ('…' if start + length < len(text) else '')
+
+
+def _page(query, ranks):
+    """
+    Result rows for a page of ranked article ids, best first. Bodies are
+    compressed, so snippets are cut here, and only for the page's articles.
+    """
+    from .models import CompanyNews
+
+    articles = CompanyNews.objects.filter(id__in=ranks).select_related('body').only(
+        'id', 'news_title', 'news_date', 'news_url', 'company_id', 'body__data'
+    )
+    rows = [
+        (article.id, article.news_title, article.news_date, article.news_url, article.company_id,
+         ranks[article.id], _snippet(article.news_body, terms(query)))
+        for article in articles
+    ]
+    return sorted(rows, key=lambda row: (-row[5], -row[2].timestamp()))
+
+
+# Articles about a company are those that mention it (NewsMention), as on the
+# company's news page, not only those whose primary company it is.
+_MENTIONS = "EXISTS (SELECT 1 FROM stocks_newsmention m WHERE m.news_id = {news_id} AND m.company_id = %s)"
+
+
+def _search_sqlite(query, company_id, limit, offset):
+    match = fts5_query(query)
+    if match is None:
+        return 0, []
+    # The join leaves out entries of deleted articles (see above) and, like
+    # the news list, near-duplicates (re-publications).
+    source = f"{FTS_TABLE} JOIN stocks_companynews n ON n.id = {FTS_TABLE}.rowid"
+    params = [match]
+    where = f"{FTS_TABLE} MATCH %s AND n.canonical_id IS NULL"
+    if company_id:
+        where += " AND " + _MENTIONS.format(news_id='n.id')
+        params.append(company_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {source} WHERE {where}", params)
+        total = cursor.fetchone()[0]
+        # Rank first; bm25 weights a hit in the title 10x a hit in the body.
+        cursor.execute(
+            f"SELECT n.id, bm25({FTS_TABLE}, 10.0, 1.0) AS score FROM {source} "
+            f"WHERE {where} ORDER BY score LIMIT %s OFFSET %s",
+            params + [limit, offset],
+        )
+        scores = dict(cursor.fetchall())
+    # bm25() is lower-is-better; flip it so every backend reports higher = better.
+    return total, _page(query, {news_id: -score for news_id, score in scores.items()})
+
+
+def _search_postgres(query, company_id, limit, offset):
+    if not terms(query):
+        return 0, []
+    company_filter = 'AND ' + _MENTIONS.format(news_id='n.id') if company_id else ''
+    params = [query] + ([company_id] if company_id else [])
+    source = (
+        "stocks_newsbody b JOIN stocks_companynews n ON n.id = b.news_id, websearch_to_tsquery('english', %s) q "
+        f"WHERE b.search_vector @@ q AND n.canonical_id IS NULL {company_filter}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {source}", params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT n.id, ts_rank_cd(b.search_vector, q) AS rank FROM {source} "
+            "ORDER BY rank DESC, n.news_date DESC LIMIT %s OFFSET %s",
+            params + [limit, offset],
+        )
+        ranks = dict(cursor.fetchall())
+    return total, _page(query, ranks)
+
+
+def _search_fallback(query, company_id, limit, offset):
+    from django.db.models import Q
+    from .models import CompanyNews
+
+    words = terms(query)
+    if not words:
+        return 0, []
+    # Without a full-text index only titles and teasers are searched; a
+    # scan of every compressed body is not an option.
+    news = CompanyNews.objects.filter(canonical__isnull=True)
+    for word in words:
+        news = news.filter(Q(news_title__icontains=word) | Q(news_teaser__icontains=word))
+    if company_id:
+        news = news.filter(mentions__company_id=company_id)
+    rows = [
+        (article.id, article.news_title, article.news_date, article.news_url, article.company_id, None,
+         _snippet(article.news_teaser, words))
+        for article in news.order_by('-news_date').only(
+            'id', 'news_title', 'news_date', 'news_url', 'company_id', 'news_teaser'
+        )[offset:offset + limit]
+    ]
+    return news.count(), rows
+
+
+def search_news(query, page=1, per_page=20, company_id=None):
+    """
+    Ranked full-text search over news titles and bodies. Returns
+    (total_matches, results) for the requested page; each result carries an
+    HTML-safe snippet with the matched words in <mark>.
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    offset = (max(page, 1) - 1) * per_page
+    backend = {'sqlite': _search_sqlite, 'postgresql': _search_postgres}.get(connection.vendor, _search_fallback)
+    total, rows = backend(query, company_id, per_page, offset)
+    results = [
+        {
+            'id': news_id, 'title': title, 'date': date, 'url': url, 'company_id': company,
+            'rank': float(f"{rank:.4g}") if rank is not None else None,
+            'snippet': _highlight(snippet),
+        }
+        for news_id, title, date, url, company, rank, snippet in rows
+    ]
+    return total, results
@@ -0,0 +1,76 @@
+from .failover import fetch_with_failover
+from .metrics import labels
+from .utility import (
+    parse_floorsheet_ml, parse_floorsheet_nepstock, parse_floorsheet_ss,
+    parse_price_history, parse_price_history_ml, parse_price_history_ss,
+    persist_floorsheet, persist_price_history,
+)
+
+import logging
+logger = logging.getLogger('stocks')
+
+# Each stage is bound by a different resource and runs on its own queue:
+# `browser` holds a Chrome instance, `cpu` parses, `db` writes.
+STAGE_QUEUES = {'fetch': 'browser', 'parse': 'cpu', 'persist': 'db'}
+
+PARSERS = {
+    'price_history': {
+        'sharesansar': parse_price_history_ss,
+        'merolagani': parse_price_history_ml,
+        'nepstock': parse_price_history,
+    },
+    'floorsheet': {
+        'sharesansar': parse_floorsheet_ss,
+        'merolagani': parse_floorsheet_ml,
+        'nepstock': parse_floorsheet_nepstock,
+    },
+}
+
+
+class NoSourceAvailable(Exception):
+    pass
+
+
+def fetch(payload):
+    """
+    Browser stage: scrape raw rows for payload['symbol'], with failover.
+    """
+    source, raw = fetch_with_failover(payload['dataset'], payload['symbol'], payload['preferred'])
+    if source is None:
+        raise NoSourceAvailable(f"No source available for {payload['dataset']} of {payload['symbol']}")
+    return {**payload, 'source': source, 'raw': raw}
+
+
+def parse(payload):
+    """
+    CPU stage: raw scraped strings -> typed rows ready for the writers.
+    """
+    with labels(source=payload['source'], symbol=payload['symbol']):
+        rows = PARSERS[payload['dataset']][payload['source']](payload.pop('raw'))
+    return {**payload, 'rows': rows}
+
+
+def persist(payload):
+    """
+    DB stage: write parsed rows. Returns the number of rows handed to the writer.
+    """
+    rows = payload['rows']
+    with labels(source=payload['source'], symbol=payload['symbol']):
+        if payload['dataset'] == 'price_history':
+            persist_price_history(payload['symbol'], payload['source'], rows)
+            return len(rows)
+        return persist_floorsheet(payload['symbol'], rows)
+
+
+def build_chain(dataset, preferred, symbol, item_id=None, run_id=None):
+    """
+    fetch -> parse -> persist for one symbol, each step on its stage's queue.
+    """
+    from .tasks import fetch_stage, parse_stage, persist_stage
+
+    payload = {'dataset': dataset, 'preferred': preferred, 'symbol': symbol, 'item_id': item_id, 'run_id': run_id}
+    return (
+        fetch_stage.s(payload).set(queue=STAGE_QUEUES['fetch'])
+        | parse_stage.s().set(queue=STAGE_QUEUES['parse'])
+        | persist_stage.s().set(queue=STAGE_QUEUES['persist'])
+    )
@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .gaps import last_complete_trading_day
+from .models import CompanyProfile, FloorSheetDaily, PriceHistory, ScrapeRunItem
+from .trading_calendar import get_holidays, trading_days
+
+import logging
+logger = logging.getLogger('stocks')
+
+DEFAULT_PRIORITY = {
+    'price_history': {
+        'budget': 60,
+        'interval_minutes': 60,
+        'activity_days': 20,
+        'staleness_days': 5,
+        'staleness_hours': 24,
+        'weights': {'turnover': 0.35, 'trades': 0.15, 'volatility': 0.1, 'staleness': 0.4},
+    },
+    'floorsheet': {
+        'budget': 40,
+        'interval_minutes': 30,
+        'activity_days': 10,
+        'staleness_days': 3,
+        'staleness_hours': 6,
+        'weights': {'turnover': 0.4, 'trades': 0.3, 'volatility': 0.0, 'staleness': 0.3},
+    },
+}
+
+
+def get_config(dataset):
+    """
+    Per-dataset tuning: DEFAULT_PRIORITY overlaid with settings.SCRAPE_PRIORITY.
+    """
+    config = dict(DEFAULT_PRIORITY[dataset])
+    overrides = getattr(settings, 'SCRAPE_PRIORITY', {}).get(dataset, {})
+    config.update({key: value for key, value in overrides.items() if key != 'weights'})
+    config['weights'] = {**DEFAULT_PRIORITY[dataset]['weights'], **overrides.get('weights', {})}
+    return config
+
+
+def _activity(company_ids, days):
+    """
+    Mean daily turnover and trade count over the last `days` sessions in
+    FloorSheetDaily, plus the standard deviation of daily returns from
+    PriceHistory over the same period.
+    """
+    dates = list(FloorSheetDaily.objects.order_by('-date').values_list('date', flat=True).distinct()[:days])
+    since = min(dates) if dates else timezone.localdate() - timedelta(days=days * 7 // 5)
+    daily = pd.DataFrame.from_records(
+        FloorSheetDaily.objects.filter(date__gte=since).values_list('company_id', 'turnover', 'trade_count'),
+        columns=['company_id', 'turnover', 'trades'],
+    )
+    activity = daily.groupby('company_id')[['turnover', 'trades']].mean()
+
+    prices = pd.DataFrame.from_records(
+        PriceHistory.objects.filter(date__gte=since).order_by('company_id', 'date').values_list('company_id', 'close_price'),
+        columns=['company_id', 'close'],
+    )
+    prices['close'] = prices['close'].astype(float)
+    returns = prices.groupby('company_id')['close'].pct_change()
+    activity['volatility'] = returns.groupby(prices['company_id']).std()
+    return activity.reindex(company_ids)
+
+
+def _staleness(dataset, company_ids, config):
+    """
+    0 (fresh) .. 1 (stale): the larger of how many trading days the stored data
+    lags behind the last complete session and how long ago the symbol was last
+    scraped successfully, each relative to its cap.
+    """
+    model = PriceHistory if dataset == 'price_history' else FloorSheetDaily
+    latest = dict(model.objects.filter(company_id__in=company_ids).values('company_id').annotate(last=Max('date')).values_list('company_id', 'last'))
+
+    holidays = get_holidays()
+    end = last_complete_trading_day(holidays=holidays)
+    calendar = trading_days(end - timedelta(days=config['staleness_days'] * 3 + 14), end, holidays=holidays)
+    last = np.array([latest.get(cid) or calendar[0] for cid in company_ids], dtype='datetime64[D]')
+    lag = len(calendar) - np.searchsorted(calendar, last, side='right')
+    lag = np.where([cid in latest for cid in company_ids], lag, config['staleness_days'])
+    data_staleness = np.clip(lag / config['staleness_days'], 0, 1)
+
+    symbols = dict(CompanyProfile.objects.filter(id__in=company_ids).values_list('id', 'symbol'))
+    scraped = dict(
+        ScrapeRunItem.objects.filter(run__dataset=dataset, status='succeeded')
+        .values('symbol').annotate(last=Max('finished_at')).values_list('symbol', 'last')
+    )
+    now = timezone.now()
+    hours = np.array([
+        (now - scraped[symbols[cid]]).total_seconds() / 3600 if symbols.get(cid) in scraped else np.inf
+        for cid in company_ids
+    ])
+    scrape_staleness = np.clip(hours / config['staleness_hours'], 0, 1)
+    return np.maximum(data_staleness, scrape_staleness)
+
+
+def score_symbols(dataset):
+    """
+    DataFrame indexed by company_id with each component (0..1) and the
+    weighted score, highest first. Activity components are percentile ranks
+    across the market so a few very large caps don't flatten everyone else.
+    """
+    config = get_config(dataset)
+    companies = pd.DataFrame.from_records(
+        CompanyProfile.objects.values_list('id', 'symbol'), columns=['company_id', 'symbol']
+    ).set_index('company_id')
+    if companies.empty:
+        return companies
+
+    company_ids = companies.index.tolist()
+    activity = _activity(company_ids, config['activity_days'])
+    for column in ('turnover', 'trades', 'volatility'):
+        companies[column] = activity[column].rank(pct=True).fillna(0.0)
+    companies['staleness'] = _staleness(dataset, company_ids, config)
+
+    weights = config['weights']
+    companies['score'] = sum(companies[column] * weights.get(column, 0) for column in ('turnover', 'trades', 'volatility', 'staleness'))
+    return companies.sort_values(['score', 'symbol'], ascending=[False, True])
+
+
+def select_symbols(dataset, budget=None):
+    """
+    The `budget` highest-scoring symbols for this cycle (the dataset's
+    configured budget by default).
+    """
+    budget = budget or get_config(dataset)['budget']
+    scores = score_symbols(dataset)
+    chosen = scores.head(budget)
+    logger.info(
+        f"Priority: {len(chosen)}/{len(scores)} symbols selected for {dataset}, "
+        f"score cutoff {chosen['score'].min() if len(chosen) else 0:.3f}"
+    )
+    return chosen['symbol'].tolist()
@@ -0,0 +1,234 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from .models import PriceHistory, PriceObservation
+from .rollups import company_dates_filter
+
+import logging
+logger = logging.getLogger('stocks')
+
+LEGS = ['open_price', 'high_price', 'low_price', 'close_price']
+# PriceHistory rows stored before a day was first staged (older scrapes,
+# manual entries) take part as this source.
+LEGACY_SOURCE = 'legacy'
+DEFAULT_PRIORITY = ['nepstock', 'sharesansar', 'merolagani', LEGACY_SOURCE]
+DEFAULT_TOLERANCE = 0.005
+BATCH_SIZE = 5000
+
+ReconcileResult = namedtuple('ReconcileResult', ['changed', 'compared', 'disputed'])
+
+
+def source_priority():
+    return list(getattr(settings, 'PRICE_SOURCE_PRIORITY', DEFAULT_PRIORITY))
+
+
+def default_tolerance():
+    return getattr(settings, 'PRICE_RECONCILIATION_TOLERANCE', DEFAULT_TOLERANCE)
+
+
+def stage_legacy(company, dates):
+    """
+    Stage the stored PriceHistory rows of days that have no observations yet
+    as the legacy source, so the first scrape of an old day is weighed
+    against what was there instead of replacing it unseen. Returns how many
+    rows were staged.
+    """
+    staged = PriceObservation.objects.filter(company=company, date__in=dates).values('date')
+    legacy = PriceHistory.objects.filter(company=company, date__in=dates).exclude(date__in=staged)
+    objs = [
+        PriceObservation(company=company, source=LEGACY_SOURCE, date=row['date'], **{leg: row[leg] for leg in LEGS})
+        for row in legacy.values('date', *LEGS)
+    ]
+    PriceObservation.objects.bulk_create(objs, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(objs)
+
+
+def record_observations(company, source, observations):
+    """
+    Upsert one source's raw rows ({'date', open_price, ...}) into the staging
+    table. A re-scrape of the same day overwrites that source's earlier values.
+    Returns the dates written.
+    """
+    by_date = {obs['date']: obs for obs in observations}  # last one wins within a batch
+    stage_legacy(company, list(by_date))
+    objs = [PriceObservation(company=company, source=source, **obs) for obs in by_date.values()]
+    PriceObservation.objects.bulk_create(
+        objs,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['company', 'date', 'source'],
+        update_fields=LEGS + ['scraped_at'],
+    )
+    return list(by_date)
+
+
+def _agreement(values, present, tolerance):
+    """
+    values: (keys, sources, legs) with NaN where a source has no row or no
+    value for a leg. Returns a (keys, sources, sources) matrix: True where
+    both sources have a row, report at least one leg in common, and every
+    leg reported by both is within `tolerance` (relative). A leg missing on
+    either side is skipped.
+    """
+    a, b = values[:, :, None, :], values[:, None, :, :]
+    both = ~np.isnan(a) & ~np.isnan(b)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel = np.abs(a - b) / np.maximum(np.abs(a), np.abs(b))
+    rel = np.where(a == b, 0.0, rel)  # 0 / 0
+    legs_agree = np.where(both, rel <= tolerance, True).all(axis=-1) & both.any(axis=-1)
+    return legs_agree & present[:, :, None] & present[:, None, :]
+
+
+def reconcile(company_dates=None, tolerance=None, priority=None):
+    """
+    Resolve PriceHistory from the staged observations for the given
+    {company_id: dates} (everything staged by default).
+
+    All (company, date) keys are compared at once on a (keys x sources x legs)
+    array. The consensus source is the one agreeing with the most other
+    sources, ties (including "nobody agrees") going to the highest priority.
+    Each observation is flagged with whether it agrees with the consensus,
+    and PriceHistory rows are created or corrected where the consensus
+    differs from what is stored.
+    """
+    tolerance = default_tolerance() if tolerance is None else tolerance
+    priority = priority or source_priority()
+
+    qs = PriceObservation.objects.all()
+    if company_dates is not None:
+        company_dates = {company_id: dates for company_id, dates in company_dates.items() if dates}
+        if not company_dates:
+            return ReconcileResult({}, 0, 0)
+        qs = qs.filter(company_dates_filter(company_dates))
+    df = pd.DataFrame.from_records(
+        qs.values_list('id', 'company_id', 'date', 'source', 'agrees_with_consensus', *LEGS).order_by(),
+        columns=['id', 'company_id', 'date', 'source', 'agrees'] + LEGS,
+    )
+    if df.empty:
+        return ReconcileResult({}, 0, 0)
+
+    sources = priority + sorted(set(df['source']) - set(priority))
+    rank = df['source'].map({source: i for i, source in enumerate(sources)}).to_numpy()
+    key_idx = df.groupby(['company_id', 'date'], sort=True).ngroup().to_numpy()
+    n_keys, n_sources = key_idx.max() + 1, len(sources)
+
+    values = np.full((n_keys, n_sources, len(LEGS)), np.nan)
+    values[key_idx, rank] = df[LEGS].astype(float).to_numpy()
+    present = np.zeros((n_keys, n_sources), dtype=bool)
+    present[key_idx, rank] = True
+
+    agree = _agreement(values, present, tolerance)
+    support = agree.sum(axis=2) - agree.diagonal(axis1=1, axis2=2)  # don't count a source agreeing with itself
+    score = np.where(present, support * n_sources + (n_sources - 1 - np.arange(n_sources)), -1)
+    chosen = score.argmax(axis=1)
+    rows = np.arange(n_keys)
+    consensus = values[rows, chosen]
+    agrees = agree[rows, :, chosen] | (np.arange(n_sources) == chosen[:, None])
+
+    compared = present.sum(axis=1) > 1
+    disputed = compared & (present & ~agrees).any(axis=1)
+
+    # Flag each observation; only rows whose flag changed are written back.
+    flags = agrees[key_idx, rank] | ~compared[key_idx]
+    changed_flags = df['agrees'].to_numpy(dtype=object) != flags
+    flag_objs = [
+        PriceObservation(id=int(obs_id), agrees_with_consensus=bool(flag))
+        for obs_id, flag in zip(df['id'].to_numpy()[changed_flags], flags[changed_flags])
+    ]
+
+    keys = df[['company_id', 'date']].drop_duplicates().sort_values(['company_id', 'date'], ignore_index=True)
+    resolved = pd.concat([keys, pd.DataFrame(consensus.round(2), columns=LEGS)], axis=1)
+    incomplete = resolved[LEGS].isna().any(axis=1)
+    if incomplete.any():
+        logger.warning(f"Reconciliation: {int(incomplete.sum())} days have no complete OHLC from any source, skipped")
+    resolved = resolved[~incomplete]
+
+    stored = pd.DataFrame.from_records(
+        PriceHistory.objects.filter(
+            company_dates_filter({cid: group['date'].tolist() for cid, group in resolved.groupby('company_id')})
+        ).values_list('company_id', 'date', *LEGS),
+        columns=['company_id', 'date'] + [f'stored_{leg}' for leg in LEGS],
+    ) if not resolved.empty else pd.DataFrame(columns=['company_id', 'date'] + [f'stored_{leg}' for leg in LEGS])
+    merged = resolved.merge(stored, on=['company_id', 'date'], how='left')
+    differs = np.zeros(len(merged), dtype=bool)
+    for leg in LEGS:
+        differs |= ~np.isclose(merged[leg].to_numpy(dtype=float), merged[f'stored_{leg}'].to_numpy(dtype=float), atol=0.005)
+    updates = merged[differs]
+
+    price_objs = [
+        PriceHistory(company_id=int(row.company_id), date=row.date,
+                     **{leg: float(getattr(row, leg)) for leg in LEGS})
+        for row in updates.itertuples(index=False)
+    ]
+    with transaction.atomic():
+        PriceObservation.objects.bulk_update(flag_objs, ['agrees_with_consensus'], batch_size=BATCH_SIZE)
+        PriceHistory.objects.bulk_create(
+            price_objs,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['date', 'company'],
+            update_fields=LEGS,
+        )
+
+    changed = {}
+    for company_id, day in zip(updates['company_id'], updates['date']):
+        changed.setdefault(int(company_id), []).append(day)
+    if disputed.any():
+        logger.warning(f"Reconciliation: {int(disputed.sum())} of {int(compared.sum())} multi-source days disagree beyond {tolerance:.2%}")
+    logger.info(f"Reconciliation: {len(price_objs)} PriceHistory rows written from {n_keys} days")
+    return ReconcileResult(changed, int(compared.sum()), int(disputed.sum()))
+
+
+def ingest_price_observations(company, source, observations):
+    """
+    Stage a saver's rows and reconcile the affected days. Returns the dates
+    whose resolved PriceHistory row was created or changed.
+    """
+    if not observations:
+        return []
+    dates = record_observations(company, source, observations)
+    result = reconcile({company.id: dates})
+    return result.changed.get(company.id, [])
+
+
+def disagreement_report(company_ids=None, since=None):
+    """
+    Per-source disagreement rate: of the source's observations on days that
+    more than one source reported, the share that disagreed with consensus.
+    """
+    qs = PriceObservation.objects.all()
+    if company_ids is not None:
+        qs = qs.filter(company_id__in=company_ids)
+    if since is not None:
+        qs = qs.filter(date__gte=since)
+    df = pd.DataFrame.from_records(
+        qs.values_list('company_id', 'date', 'source', 'agrees_with_consensus').order_by(),
+        columns=['company_id', 'date', 'source', 'agrees'],
+    )
+    priority = source_priority()
+    if df.empty:
+        return []
+
+    df['compared'] = df.groupby(['company_id', 'date'])['source'].transform('size') > 1
+    df['disagrees'] = df['compared'] & (df['agrees'] == False)  # noqa: E712 - None means not yet reconciled
+    totals = df.groupby('source').agg(
+        observations=('source', 'size'),
+        compared=('compared', 'sum'),
+        disagreements=('disagrees', 'sum'),
+    )
+    report = []
+    for source in sorted(totals.index, key=lambda s: (priority.index(s) if s in priority else len(priority), s)):
+        row = totals.loc[source]
+        compared = int(row['compared'])
+        report.append({
+            'source': source,
+            'observations': int(row['observations']),
+            'compared': compared,
+            'disagreements': int(row['disagreements']),
+            'rate': round(int(row['disagreements']) / compared * 100, 2) if compared else None,
+        })
+    return report
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Q
+
+from .models import FloorSheet, FloorSheetDaily, PriceHistory
+
+import logging
+logger = logging.getLogger('stocks')
+
+DAILY_FIELDS = [
+    'vwap', 'total_quantity', 'turnover', 'trade_count',
+    'min_rate', 'max_rate', 'first_rate', 'last_rate',
+]
+BATCH_SIZE = 5000
+
+
+def company_dates_filter(company_dates):
+    """
+    Q matching rows whose (company_id, date) is in {company_id: dates}.
+    """
+    condition = Q()
+    for company_id, dates in company_dates.items():
+        condition |= Q(company_id=company_id, date__in=list(dates))
+    return condition
+
+
+def load_floorsheet(columns, company_ids=None, company_dates=None):
+    """
+    FloorSheet columns pulled in bulk with values_list into a DataFrame.
+    `company_dates` ({company_id: iterable of dates}) restricts to those days.
+    Decimal columns (quantity, rate, amount) come back as floats.
+    """
+    qs = FloorSheet.objects.all()
+    if company_ids is not None:
+        qs = qs.filter(company_id__in=company_ids)
+    if company_dates:
+        qs = qs.filter(company_dates_filter(company_dates))
+    df = pd.DataFrame.from_records(qs.values_list(*columns).order_by(), columns=list(columns))
+    for column in ('quantity', 'rate', 'amount'):
+        if column in df:
+            df[column] = df[column].astype(float)
+    return df
+
+
+def compute_daily_rollups(df):
+    """
+    VWAP, volume, turnover, trade count, rate range and first/last rate per
+    (company, date). First/last follow transaction order: numeric contract
+    numbers for a company whose numbers all parse, falling back to string
+    order for that company otherwise.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=['company_id', 'date'] + DAILY_FIELDS)
+
+    df = df.assign(txn_order=pd.to_numeric(df['transaction_id'], errors='coerce'))
+    numeric = df['txn_order'].notna().groupby(df['company_id']).transform('all')
+    df = pd.concat([
+        df[numeric].sort_values(['company_id', 'date', 'txn_order'], kind='stable'),
+        df[~numeric].sort_values(['company_id', 'date', 'transaction_id'], kind='stable'),
+    ])
+
+    daily = df.groupby(['company_id', 'date'], sort=False).agg(
+        total_quantity=('quantity', 'sum'),
+        turnover=('amount', 'sum'),
+        trade_count=('rate', 'size'),
+        min_rate=('rate', 'min'),
+        max_rate=('rate', 'max'),
+        first_rate=('rate', 'first'),
+        last_rate=('rate', 'last'),
+    )
+    # VWAP from rate * quantity rather than the amount column, so rounding
+    # in the scraped amounts doesn't leak into the average price.
+    weighted = (df['rate'] * df['quantity']).groupby([df['company_id'], df['date']], sort=False).sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily['vwap'] = weighted / daily['total_quantity']
+    return daily.reset_index()[['company_id', 'date'] + DAILY_FIELDS]
+
+
+def _store(rollups, replace):
+    objs = [
+        FloorSheetDaily(company_id=int(row.company_id), date=row.date,
+                        **{field: getattr(row, field) for field in DAILY_FIELDS})
+        for row in rollups.itertuples(index=False)
+    ]
+    with transaction.atomic():
+        FloorSheetDaily.objects.filter(replace).delete()
+        FloorSheetDaily.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    return len(objs)
+
+
+ROLLUP_COLUMNS = ('company_id', 'date', 'transaction_id', 'quantity', 'rate', 'amount')
+
+
+def refresh_daily_rollups(company_ids=None):
+    """
+    Full rebuild of FloorSheetDaily (for the given companies, or all).
+    """
+    rollups = compute_daily_rollups(load_floorsheet(ROLLUP_COLUMNS, company_ids=company_ids))
+    replace = Q(company_id__in=company_ids) if company_ids is not None else Q()
+    count = _store(rollups, replace)
+    logger.info(f"Floorsheet rollups: rebuilt {count} daily rows")
+    return count
+
+
+def update_daily_rollups(company_dates):
+    """
+    Recompute only the (company, date) days that received new contracts.
+    """
+    company_dates = {company_id: set(dates) for company_id, dates in company_dates.items() if dates}
+    if not company_dates:
+        return 0
+    rollups = compute_daily_rollups(load_floorsheet(ROLLUP_COLUMNS, company_dates=company_dates))
+    count = _store(rollups, company_dates_filter(company_dates))
+    logger.info(f"Floorsheet rollups: updated {count} daily rows for {len(company_dates)} companies")
+    return count
+
+
+def compare_with_price_history(company_ids=None, tolerance=0.01):
+    """
+    Check PriceHistory against the OHLC implied by the floorsheet
+    (first/max/min/last rate). Returns a DataFrame of (company, date) rows
+    where any leg differs by more than `tolerance` (relative).
+    """
+    daily = FloorSheetDaily.objects.all()
+    prices = PriceHistory.objects.all()
+    if company_ids is not None:
+        daily = daily.filter(company_id__in=company_ids)
+        prices = prices.filter(company_id__in=company_ids)
+
+    implied = pd.DataFrame.from_records(
+        daily.values_list('company_id', 'date', 'first_rate', 'max_rate', 'min_rate', 'last_rate'),
+        columns=['company_id', 'date', 'fs_open', 'fs_high', 'fs_low', 'fs_close'],
+    )
+    stored = pd.DataFrame.from_records(
+        prices.filter(date__in=implied['date'].unique().tolist()).values_list(
+            'company_id', 'date', 'open_price', 'high_price', 'low_price', 'close_price'
+        ),
+        columns=['company_id', 'date', 'open', 'high', 'low', 'close'],
+    )
+    merged = implied.merge(stored, on=['company_id', 'date'], how='inner')
+    if merged.empty:
+        return merged
+
+    mismatch = np.zeros(len(merged), dtype=bool)
+    for leg in ('open', 'high', 'low', 'close'):
+        merged[leg] = merged[leg].astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            merged[f'{leg}_diff'] = (merged[f'fs_{leg}'] - merged[leg]) / merged[leg]
+        mismatch |= merged[f'{leg}_diff'].abs().to_numpy() > tolerance
+    return merged[mismatch].reset_index(drop=True)
@@ -0,0 +1,203 @@
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import ScrapeRun, ScrapeRunItem
+
+import logging
+logger = logging.getLogger('stocks')
+
+MAX_ATTEMPTS = getattr(settings, 'SCRAPE_RETRY_MAX_ATTEMPTS', 3)
+BASE_DELAY = getattr(settings, 'SCRAPE_RETRY_BASE_DELAY', 30)
+MAX_DELAY = getattr(settings, 'SCRAPE_RETRY_MAX_DELAY', 300)
+# An unfinished run is picked up again by the same task within this window...
+RESUME_WINDOW = timedelta(hours=getattr(settings, 'SCRAPE_RUN_RESUME_HOURS', 12))
+# ...but only once its heartbeat is this old; a fresher one is still being worked on.
+STALE_AFTER = timedelta(seconds=getattr(settings, 'SCRAPE_RUN_STALE_SECONDS', 600))
+
+
+class RunInProgress(Exception):
+    pass
+
+
+def backoff_delay(attempts, base=BASE_DELAY, cap=MAX_DELAY):
+    """
+    Exponential backoff with "equal jitter": half the capped delay is fixed,
+    the other half random, so retries from many symbols don't line up.
+    """
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def start_or_resume_run(task_name, dataset, source, symbols):
+    """
+    The unfinished run of `task_name` to resume, or a new run with one
+    pending item per symbol. Raises RunInProgress when another worker is
+    still heartbeating on the unfinished run.
+    """
+    now = timezone.now()
+    run = (
+        ScrapeRun.objects.filter(task_name=task_name, status='running', started_at__gte=now - RESUME_WINDOW)
+        .order_by('-started_at').first()
+    )
+    if run is not None:
+        if now - run.heartbeat_at < STALE_AFTER:
+            raise RunInProgress(f"{task_name} run #{run.id} is still active")
+        done = run.items.filter(status='succeeded').count()
+        # Items caught mid-scrape by the crash go back in the queue.
+        run.items.filter(status='running').update(status='pending')
+        run.resumed += 1
+        run.save(update_fields=['resumed', 'heartbeat_at'])
+        logger.info(f"Resuming {task_name} run #{run.id}: {done}/{run.items.count()} symbols already done")
+        return run
+
+    ScrapeRun.objects.filter(task_name=task_name, status='running').update(status='failed', finished_at=now)
+    run = ScrapeRun.objects.create(task_name=task_name, dataset=dataset, source=source)
+    ScrapeRunItem.objects.bulk_create([ScrapeRunItem(run=run, symbol=symbol) for symbol in symbols])
+    return run
+
+
+def _next_item(run):
+    """
+    Pending items first (in order), then the failed item whose retry is due
+    soonest. Returns (item, seconds_to_wait) or (None, None) when done.
+    """
+    item = run.items.filter(status='pending').order_by('id').first()
+    if item is not None:
+        return item, 0
+    item = (
+        run.items.filter(status='failed', attempts__lt=MAX_ATTEMPTS, next_retry_at__isnull=False)
+        .order_by('next_retry_at').first()
+    )
+    if item is None:
+        return None, None
+    return item, max(0.0, (item.next_retry_at - timezone.now()).total_seconds())
+
+
+def _wait(run, seconds):
+    """
+    Sleep until a retry is due, heartbeating so the run isn't taken for dead.
+    """
+    deadline = time.monotonic() + seconds
+    while (remaining := deadline - time.monotonic()) > 0:
+        time.sleep(min(remaining, 30))
+        run.save(update_fields=['heartbeat_at'])
+
+
+def execute_run(run, work):
+    """
+    Work through the run's items. `work(symbol)` returns (source, records)
+    and should raise on failure; a source of None also counts as a failure.
+    Every item's status is committed as it finishes, so a crash loses at
+    most the symbol in flight.
+    """
+    while True:
+        item, wait = _next_item(run)
+        if item is None:
+            break
+        if wait:
+            logger.info(f"Run #{run.id}: retrying {item.symbol} in {wait:.0f}s (attempt {item.attempts + 1})")
+            _wait(run, wait)
+
+        item.status = 'running'
+        item.attempts += 1
+        item.started_at = timezone.now()
+        item.save(update_fields=['status', 'attempts', 'started_at'])
+        run.save(update_fields=['heartbeat_at'])
+
+        started = time.monotonic()
+        try:
+            source, records = work(item.symbol)
+            if source is None:
+                raise RuntimeError("No source available")
+        except Exception as e:
+            item.status = 'failed'
+            item.error_type = type(e).__name__
+            item.error = str(e)[:2000]
+            if item.attempts < MAX_ATTEMPTS:
+                item.next_retry_at = timezone.now() + timedelta(seconds=backoff_delay(item.attempts))
+            else:
+                item.next_retry_at = None
+                logger.error(f"Run #{run.id}: {item.symbol} failed after {item.attempts} attempts: {e}")
+        else:
+            item.status = 'succeeded'
+            item.source = source
+            item.records = records
+            item.error_type = item.error = ''
+            item.next_retry_at = None
+        item.finished_at = timezone.now()
+        item.duration = time.monotonic() - started
+        item.save()
+
+    run.status = 'failed' if run.items.filter(status='failed').exists() else 'completed'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at', 'heartbeat_at'])
+    return run
+
+
+def run_summary(run):
+    """
+    Throughput and failure breakdown for a run.
+    """
+    items = run.items.all()
+    status_counts = dict(items.values_list('status').annotate(n=Count('id')).order_by())
+    totals = items.aggregate(records=Sum('records'), attempts=Sum('attempts'), busy=Sum('duration'))
+    end = run.finished_at or timezone.now()
+    elapsed = (end - run.started_at).total_seconds()
+    finished = status_counts.get('succeeded', 0) + status_counts.get('failed', 0)
+    failed = items.filter(status='failed')
+    return {
+        'run': run.id,
+        'task': run.task_name,
+        'status': run.status,
+        'resumed': run.resumed,
+        'symbols': sum(status_counts.values()),
+        'by_status': status_counts,
+        'records': totals['records'] or 0,
+        'attempts': totals['attempts'] or 0,
+        'elapsed_seconds': round(elapsed, 1),
+        'symbols_per_minute': round(finished / elapsed * 60, 2) if elapsed else None,
+        'records_per_second': round((totals['records'] or 0) / elapsed, 2) if elapsed else None,
+        'avg_symbol_seconds': round(totals['busy'] / finished, 2) if totals['busy'] and finished else None,
+        'served_by': dict(Counter(items.filter(status='succeeded').values_list('source', flat=True))),
+        'failures_by_type': dict(Counter(failed.values_list('error_type', flat=True))),
+        'failed_symbols': list(failed.values_list('symbol', flat=True)),
+    }
+
+
+def start_item(item_id):
+    ScrapeRunItem.objects.filter(id=item_id).update(status='running', started_at=timezone.now())
+
+
+def finish_item(item_id, source=None, records=0, error=None, attempts=1):
+    """
+    Record the outcome of an item processed outside execute_run (the staged
+    pipeline), and close the run once nothing is left in flight.
+    """
+    item = ScrapeRunItem.objects.select_related('run').get(id=item_id)
+    item.attempts = attempts
+    item.finished_at = timezone.now()
+    if item.started_at:
+        item.duration = (item.finished_at - item.started_at).total_seconds()
+    if error is None:
+        item.status, item.source, item.records = 'succeeded', source, records
+        item.error_type = item.error = ''
+    else:
+        item.status = 'failed'
+        item.error_type = type(error).__name__
+        item.error = str(error)[:2000]
+    item.next_retry_at = None
+    item.save()
+
+    run = item.run
+    if not run.items.filter(status__in=['pending', 'running']).exists():
+        run.status = 'failed' if run.items.filter(status='failed').exists() else 'completed'
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at', 'heartbeat_at'])
+    else:
+        run.save(update_fields=['heartbeat_at'])
@@ -3,16 +3,23 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from stockmarket import settings
 import pandas as pd
+import time
 import logging
+from ..metrics import span
+from ..jobs import report_progress
 
 logger = logging.getLogger('stocks')
 
 class BaseScraper:
+    # Label for the stage metrics recorded by span(); set by each site's scrapers.
+    source = ''
+
     def __init__(self, headless=True, timeout=15, chromedriver_path=settings.CHROMEDRIVER_PATH):
         self.headless = headless
         self.timeout = timeout
         self.chromedriver_path = chromedriver_path
-        self.driver = self._init_driver()
+        with self.span('driver_start'):
+            self.driver = self._init_driver()
         self.records = []
 
     def _init_driver(self):
@@ -37,6 +44,24 @@ class BaseScraper:
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         return driver
 
+    def span(self, stage):
+        return span(stage, source=self.source, symbol=getattr(self, 'symbol', None))
+
+    def load(self, url):
+        with self.span('page_load'):
+            self.driver.get(url)
+
+    def pause(self, seconds):
+        with self.span('sleep'):
+            time.sleep(seconds)
+
+    def report_progress(self, rows, page=None):
+        """
+        Called by the scrapers as pages complete; forwarded to the job
+        status of the Celery task running this scraper, if any.
+        """
+        report_progress(rows=rows, page=page, source=self.source, symbol=getattr(self, 'symbol', None))
+
     def save_to_csv(self, filename):
         if not self.records:
             print("⚠ No data to save.")
@@ -47,4 +72,5 @@ class BaseScraper:
 
     def close(self):
         if hasattr(self, 'driver'):
-            self.driver.quit()
+            with self.span('driver_quit'):
+                self.driver.quit()
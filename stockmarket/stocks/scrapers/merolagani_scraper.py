@@ -2,7 +2,6 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoAlertPresentException, TimeoutException, NoSuchElementException
-import time
 from dateutil import parser as date_parser
 from dateutil.parser import parse as parse_datetime
 from django.utils import timezone
@@ -18,6 +17,8 @@ from .base_scraper import BaseScraper
 logger = logging.getLogger('stocks')
 
 class MerolaganiScraper(BaseScraper):
+    source = 'merolagani'
+
     def __init__(self, symbol, headless=False):
         super().__init__(headless=headless)
         self.symbol = symbol
@@ -36,7 +37,7 @@ class MerolaganiScraper(BaseScraper):
 
     def fetch_price_history(self, max_records=20):
         try:
-            self.driver.get(self.base_url)
+            self.load(self.base_url)
             self.dismiss_alert_if_present()
 
             price_history_tab = WebDriverWait(self.driver, self.timeout).until(
@@ -48,7 +49,7 @@ class MerolaganiScraper(BaseScraper):
             WebDriverWait(self.driver, self.timeout).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "table.table-bordered"))
             )
-            time.sleep(1)
+            self.pause(1)
 
             rows = self.driver.find_elements(By.CSS_SELECTOR, "table.table-bordered tbody tr")
 
@@ -69,6 +70,7 @@ class MerolaganiScraper(BaseScraper):
                         "Turnover": cols[8].text.strip().replace(",", "")
                     })
             logger.info(f"Fetched {len(self.records)} records for {self.symbol}")
+            self.report_progress(len(self.records))
             return self.records
         except Exception as e:
             logger.error(f"Error fetching price history: {e}")
@@ -77,6 +79,8 @@ class MerolaganiScraper(BaseScraper):
             self.close()
 
 class MerolaganiFloorsheetScraper(BaseScraper):
+    source = 'merolagani'
+
     def __init__(self, headless=False):
         super().__init__(headless=headless)
         self.base_url = "https://merolagani.com/Floorsheet.aspx"
@@ -94,7 +98,7 @@ class MerolaganiFloorsheetScraper(BaseScraper):
     def extract_date(self):
         try:
             logger.info("Extracting date from the page...")
-            self.driver.get(self.base_url)
+            self.load(self.base_url)
 
             # Wait for the date element to load
             market_date_element = WebDriverWait(self.driver, self.timeout).until(
@@ -159,12 +163,14 @@ class MerolaganiFloorsheetScraper(BaseScraper):
                         "Date": date_str
                     })
             logger.info(f"Scraped {len(floorsheet_data)} records.")
+            self.report_progress(len(floorsheet_data))
             return floorsheet_data
         except Exception as e:
             logger.error(f"Error scraping floorsheet data: {e}")
             return []
 
     def run_scraper(self, symbol):
+        self.symbol = symbol
         date = self.extract_date()
         if date:
             self.search_floorsheet(symbol, date)
@@ -172,6 +178,8 @@ class MerolaganiFloorsheetScraper(BaseScraper):
         return []
 
 class MerolaganiNewsScraper(BaseScraper):
+    source = 'merolagani'
+
     def __init__(self, max_records=20, headless=True):
         super().__init__(headless=headless)
         self.base_url = "https://merolagani.com/NewsList.aspx"
@@ -207,14 +215,14 @@ class MerolaganiNewsScraper(BaseScraper):
 
             # Scroll into view to avoid overlap by other elements
             self.driver.execute_script("arguments[0].scrollIntoView(true);", load_more)
-            time.sleep(1)  # Let scrolling finish
+            self.pause(1)  # Let scrolling finish
 
             # Click using JavaScript to avoid click interception
             self.driver.execute_script("arguments[0].click();", load_more)
 
             self.dismiss_alert_if_present()
             logger.info("Clicked 'Load More' button.")
-            time.sleep(2)  # Allow time for content to load
+            self.pause(2)  # Allow time for content to load
 
         except TimeoutException:
             logger.info("⚠️ 'Load More' button not found or not clickable.")
@@ -275,9 +283,9 @@ class MerolaganiNewsScraper(BaseScraper):
         return records
     
     def _extract_news_body(self, records):
-        for record in records:
+        for done, record in enumerate(records, 1):
             try:    
-                self.driver.get(record['url'])
+                self.load(record['url'])
                 self._close_ads()
                 WebDriverWait(self.driver, self.timeout).until(
                     EC.presence_of_element_located((By.ID, "ctl00_ContentPlaceHolder1_newsDetail"))
@@ -335,13 +343,14 @@ class MerolaganiNewsScraper(BaseScraper):
             except (TimeoutException, NoSuchElementException) as e:
                 logger.error(f"⚠ Failed to extract body from {record['url']} – {e}")
                 record["body"] = ""
+            self.report_progress(done)
         return records
 
     def fetch_news(self):
         try:
-            self.driver.get(self.base_url)
+            self.load(self.base_url)
             total_rows_needed = self.max_records // 2
-            time.sleep(2)
+            self.pause(2)
 
             # while True:
             #     rows_loaded = len(self.driver.find_elements(By.CSS_SELECTOR, ".news-list .row"))
@@ -3,36 +3,39 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
 from selenium.common.exceptions import TimeoutException
-import time
 import logging
 
 from .base_scraper import BaseScraper
+from ..utility import newer_contracts
 
 logger = logging.getLogger('stocks')
 
 class NepalstockScraper(BaseScraper):
+    source = 'nepstock'
+
     def __init__(self, headless=True):
         super().__init__(headless=headless)
         self.base_url = "https://www.nepalstock.com"
         self.search_delay = 2
 
     def search_company(self, symbol):
+        self.symbol = symbol
         try:
-            self.driver.get(self.base_url)
-            time.sleep(1)
+            self.load(self.base_url)
+            self.pause(1)
             search_input = WebDriverWait(self.driver, self.timeout).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, ".header__search--wrap input"))
             )
             search_input.clear()
             search_input.send_keys(symbol)
             search_input.send_keys(Keys.RETURN)
-            time.sleep(self.search_delay)
+            self.pause(self.search_delay)
 
             company_link = WebDriverWait(self.driver, self.timeout).until(
                 EC.presence_of_element_located((By.XPATH, f"//a[contains(., '{symbol}')]"))
             )
             url = company_link.get_attribute('href')
-            self.driver.get(url)
+            self.load(url)
             logger.info(f"🔍 Navigated to {url}")
             return True
         except Exception as e:
@@ -49,7 +52,7 @@ class NepalstockScraper(BaseScraper):
             WebDriverWait(self.driver, self.timeout).until(
                 EC.visibility_of_element_located((By.CSS_SELECTOR, "div.tab-pane.active#pricehistorys"))
             )
-            time.sleep(2)
+            self.pause(2)
             return True
         except Exception as e:
             logger.error(f" Error clicking Price History tab: {e}")
@@ -94,7 +97,7 @@ class NepalstockScraper(BaseScraper):
                 EC.element_to_be_clickable((By.CSS_SELECTOR, "li.pagination-next a"))
             )
             next_button.click()
-            time.sleep(3)
+            self.pause(3)
             return True
         except Exception as e:
             logger.info("🔚 No next page or error navigating")
@@ -106,6 +109,7 @@ class NepalstockScraper(BaseScraper):
             while page <= max_pages:
                 if not self.scrape_current_page():
                     break
+                self.report_progress(len(self.records), page)
                 if not self.go_to_next_page():
                     break
                 page += 1
@@ -122,7 +126,7 @@ class NepalstockScraper(BaseScraper):
             )
             floorsheet_tab.click()
             logger.info("📄 Clicked on Floorsheet tab")
-            time.sleep(1)  # Allow content to load
+            self.pause(1)  # Allow content to load
             return True
         except Exception as e:
             logger.error(f"Failed to click Floorsheet tab: {e}")
@@ -139,7 +143,7 @@ class NepalstockScraper(BaseScraper):
             )
             option.click()
             logger.info(f"📊 Set items per page to {count}")
-            time.sleep(5)
+            self.pause(5)
             return True
         except Exception as e:
             logger.error(f"Failed to select items per page ({count}): {e}")
@@ -171,14 +175,36 @@ class NepalstockScraper(BaseScraper):
             logger.info("Clicked Filter button")
 
             wait.until(lambda driver: len(driver.find_elements(By.CSS_SELECTOR, "table.table-striped tbody tr")) != initial_rows)
-            time.sleep(3)  # Allow table to reload
+            self.pause(3)  # Allow table to reload
             return True
 
         except Exception as e:
             logger.error(f"Failed to click Filter button: {e}")
             return False
 
-    def scrape_floorsheet_data(self):
+    def _read_floorsheet_page(self):
+        records = []
+        rows = self.driver.find_elements(By.CSS_SELECTOR, "table.table-striped tbody tr")
+        for row in rows:
+            cols = row.find_elements(By.TAG_NAME, "td")
+            if len(cols) >= 7:
+                records.append({
+                    "SN": cols[0].text.strip(),
+                    "Contract No": cols[1].text.strip(),
+                    "Buyer No": cols[2].text.strip(),
+                    "Seller No": cols[3].text.strip(),
+                    "Quantity": cols[4].text.strip(),
+                    "Rate": cols[5].text.strip(),
+                    "Amount": cols[6].text.strip()
+                })
+        return records
+
+    def scrape_floorsheet_data(self, since=None):
+        """
+        All floorsheet pages, or with `since` (a contract number) only the
+        contracts newer than it: NEPSE lists the latest contracts first, so
+        paging stops at the first one already seen.
+        """
         floorsheet_data = []
         page_count = 1
         wait = WebDriverWait(self.driver, self.timeout)
@@ -188,22 +214,13 @@ class NepalstockScraper(BaseScraper):
                 # Wait for at least one row in the table
                 wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "table.table-striped tbody tr")))
 
-                rows = self.driver.find_elements(By.CSS_SELECTOR, "table.table-striped tbody tr")
-                for row in rows:
-                    cols = row.find_elements(By.TAG_NAME, "td")
-                    if len(cols) >= 7:
-                        record = {
-                            "SN": cols[0].text.strip(),
-                            "Contract No": cols[1].text.strip(),
-                            "Buyer No": cols[2].text.strip(),
-                            "Seller No": cols[3].text.strip(),
-                            "Quantity": cols[4].text.strip(),
-                            "Rate": cols[5].text.strip(),
-                            "Amount": cols[6].text.strip()
-                        }
-                        floorsheet_data.append(record)
-
-                logger.info(f"📄 Scraped page {page_count} with {len(rows)} rows")
+                page, reached_known = newer_contracts(self._read_floorsheet_page(), since, "Contract No")
+                floorsheet_data.extend(page)
+
+                logger.info(f"📄 Scraped page {page_count} with {len(page)} new rows")
+                self.report_progress(len(floorsheet_data), page_count)
+                if reached_known:
+                    break
 
                 # Check if 'Next' button is disabled
                 pagination = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "ul.ngx-pagination")))
@@ -220,7 +237,7 @@ class NepalstockScraper(BaseScraper):
                 next_button.click()
 
                 page_count += 1
-                time.sleep(2)  # Let the table reload
+                self.pause(2)  # Let the table reload
 
             except Exception as e:
                 logger.error(f"Error scraping floorsheet or paginating: {e}")
@@ -228,6 +245,16 @@ class NepalstockScraper(BaseScraper):
 
         return floorsheet_data
 
+    def tail_floorsheet(self, symbol, since=None):
+        """
+        Contracts of `symbol` newer than contract number `since`, for polling
+        during the session. Uses NEPSE's default page size so a poll normally
+        reads one page; the browser stays open between calls.
+        """
+        if not self.search_company(symbol) or not self.click_floorsheet_tab():
+            raise RuntimeError(f"Could not open the NEPSE floorsheet for {symbol}")
+        return self.scrape_floorsheet_data(since=since)
+
 
 def scrape_company_floorsheet_nepstock(company_symbol: str, headless: bool = True):
     scraper = NepalstockScraper(headless=headless)
@@ -247,9 +274,10 @@ def scrape_company_floorsheet_nepstock(company_symbol: str, headless: bool = Tru
         if not scraper.click_filter_button():
             logger.error("Could not click filter button.")
             return
+
+        return scraper.scrape_floorsheet_data()
     finally:
         scraper.close()
-    return scraper.scrape_floorsheet_data()
 
 def scrape_company_price_history_nepstock(symbol, max_pages=2, output_csv=False):
     scraper = NepalstockScraper(headless=True)
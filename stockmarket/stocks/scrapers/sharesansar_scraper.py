@@ -8,8 +8,7 @@ from ..models import CompanyNews
 from dateutil import parser as date_parser
 from django.utils.timezone import make_aware, is_naive
 
-from ..utility import get_latest_data_of_pricehistory, get_latest_ss_news_date
-import time
+from ..utility import get_latest_data_of_pricehistory, get_latest_ss_news_date, newer_contracts
 from datetime import datetime
 import logging
 
@@ -17,27 +16,37 @@ from .base_scraper import BaseScraper
 
 logger = logging.getLogger('stocks')
 
+# Oldest date a routine price-history scrape walks back to.
+DEFAULT_PRICE_HISTORY_START = datetime(2025, 1, 1).date()
+
 class SharesansarPriceScraper(BaseScraper):
+    source = 'sharesansar'
+
     def __init__(self, symbol, headless=False):
         super().__init__(headless=headless)
         self.symbol = symbol
         self.base_url = f"https://www.sharesansar.com/company/{self.symbol}"
         self.wait = WebDriverWait(self.driver, self.timeout)
 
-    def fetch_price_history(self, max_records=9999):
-
+    def fetch_price_history(self, max_records=9999, since=None):
+        """
+        Scrape price history newest-first. By default stops at 2025 or at the
+        latest date already in the DB; pass `since` (a date) to backfill down
+        to that date regardless of what is stored.
+        """
         self.records = []
         logger.info(f"Started Scraping price history for {self.symbol} from ShareSansar")
 
         try:
-            self.driver.get(self.base_url)
+            self.load(self.base_url)
 
             price_history_tab = self.wait.until(
                 EC.element_to_be_clickable((By.ID, "btn_cpricehistory"))
             )
             price_history_tab.click()
-            time.sleep(1)
-            latest_data = get_latest_data_of_pricehistory(self.symbol)
+            self.pause(1)
+            latest_data = get_latest_data_of_pricehistory(self.symbol) if since is None else None
+            stop_before = since or DEFAULT_PRICE_HISTORY_START
             keep_scraping = True
             while keep_scraping:
                 table = self.wait.until(
@@ -57,9 +66,9 @@ class SharesansarPriceScraper(BaseScraper):
 
                             date_obj = datetime.strptime(date, "%Y-%m-%d").date()
 
-                            if date_obj.year < 2025:
+                            if date_obj < stop_before:
                                 keep_scraping = False
-                                break  # Stop scraping if older than 2025
+                                break  # Stop scraping once past the requested range
 
                             record = {
                                 "Date": str(date_obj),
@@ -80,6 +89,8 @@ class SharesansarPriceScraper(BaseScraper):
                         except Exception as e:
                             logger.warning(f"Error parsing row: {e}")
 
+                self.report_progress(len(self.records))
+
                 # Click 'Next' if still scraping
                 if keep_scraping:
                     try:
@@ -88,7 +99,7 @@ class SharesansarPriceScraper(BaseScraper):
                         if "disabled" in next_btn.get_attribute("class"):
                             break
                         self.driver.execute_script("arguments[0].click();", next_btn)
-                        time.sleep(1)
+                        self.pause(1)
                     except NoSuchElementException:
                         logger.info("Next button not found, ending pagination.")
                         break
@@ -102,6 +113,8 @@ class SharesansarPriceScraper(BaseScraper):
         return self.records
 
 class SharesansarFloorsheetScraper(BaseScraper):
+    source = 'sharesansar'
+
     def __init__(self, symbol, headless=False):
         super().__init__(headless=headless)
         self.symbol = symbol
@@ -112,60 +125,29 @@ class SharesansarFloorsheetScraper(BaseScraper):
         floorsheet = []
         logger.info(f"Started Scraping floorsheet for {self.symbol} from ShareSansar")
         try:
-            self.driver.get(self.base_url)
+            self.load(self.base_url)
 
             # Step 1: Click the Floorsheet tab
             floorsheet_tab = WebDriverWait(self.driver, self.timeout).until(
                 EC.element_to_be_clickable((By.ID, "btn_cfloorsheet"))
             )
             floorsheet_tab.click()
-            time.sleep(2)
+            self.pause(2)
 
             # Step 2: Set dropdown to 500 entries
             select_elem = Select(WebDriverWait(self.driver, self.timeout).until(
                 EC.presence_of_element_located((By.NAME, "myTableCFloorsheet_length"))
             ))
             select_elem.select_by_value("500")
-            time.sleep(2)
+            self.pause(2)
 
             while True:
                 # Step 3: Scrape table rows
-                rows = self.driver.find_elements(By.CSS_SELECTOR, "#myTableCFloorsheet tbody tr")
-
-                for row in rows:
-                    cols = row.find_elements(By.TAG_NAME, "td")
-                    if cols and len(cols) >= 8:
-                        try:
-                            transaction_id = cols[1].text.strip()
-                            buyer = int(cols[2].text.strip())
-                            seller = int(cols[3].text.strip())
-                            quantity = float(cols[4].text.strip().replace(",", ""))
-                            rate = float(cols[5].text.strip().replace(",", ""))
-                            amount = float(cols[6].text.strip().replace(",", ""))
-                            date_str = cols[7].text.strip()
-                            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-
-                            record = {
-                                "transaction_id": transaction_id,
-                                "buyer": buyer,
-                                "seller": seller,
-                                "quantity": quantity,
-                                "rate": rate,
-                                "amount": amount,
-                                "date": date_obj,
-                            }
-                            floorsheet.append(record)
-                        except Exception as e:
-                            logger.warning(f"Error parsing row: {e}")
+                floorsheet.extend(self._read_floorsheet_page())
+                self.report_progress(len(floorsheet))
 
                 # Step 4: Click next if not disabled
-                try:
-                    next_btn = self.driver.find_element(By.ID, "myTableCFloorsheet_next")
-                    if "disabled" in next_btn.get_attribute("class"):
-                        break
-                    next_btn.click()
-                    time.sleep(2)
-                except Exception:
+                if not self._next_floorsheet_page():
                     break
 
         except Exception as e:
@@ -175,8 +157,68 @@ class SharesansarFloorsheetScraper(BaseScraper):
 
         logger.info(f"Scraped {len(floorsheet)} floorsheet records for {self.symbol} from ShareSansar")
         return floorsheet
+
+    def _read_floorsheet_page(self):
+        records = []
+        rows = self.driver.find_elements(By.CSS_SELECTOR, "#myTableCFloorsheet tbody tr")
+        for row in rows:
+            cols = row.find_elements(By.TAG_NAME, "td")
+            if cols and len(cols) >= 8:
+                try:
+                    records.append({
+                        "transaction_id": cols[1].text.strip(),
+                        "buyer": int(cols[2].text.strip()),
+                        "seller": int(cols[3].text.strip()),
+                        "quantity": float(cols[4].text.strip().replace(",", "")),
+                        "rate": float(cols[5].text.strip().replace(",", "")),
+                        "amount": float(cols[6].text.strip().replace(",", "")),
+                        "date": datetime.strptime(cols[7].text.strip(), "%Y-%m-%d").date(),
+                    })
+                except Exception as e:
+                    logger.warning(f"Error parsing row: {e}")
+        return records
+
+    def _next_floorsheet_page(self):
+        try:
+            next_btn = self.driver.find_element(By.ID, "myTableCFloorsheet_next")
+            if "disabled" in next_btn.get_attribute("class"):
+                return False
+            next_btn.click()
+            self.pause(2)
+            return True
+        except Exception:
+            return False
+
+    def tail_floorsheet(self, symbol, since=None):
+        """
+        Contracts of `symbol` newer than contract number `since`, for polling
+        during the session. The table is sorted newest-first and paging stops
+        at the first contract already seen, so a poll normally reads a single
+        (default-sized) page. The browser stays open between calls.
+        """
+        self.symbol = symbol
+        self.base_url = f"https://www.sharesansar.com/company/{symbol}"
+        self.load(self.base_url)
+        WebDriverWait(self.driver, self.timeout).until(
+            EC.element_to_be_clickable((By.ID, "btn_cfloorsheet"))
+        ).click()
+        self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "#myTableCFloorsheet tbody tr")))
+        # Column 1 is the transaction number; sort it descending through DataTables.
+        self.driver.execute_script("jQuery('#myTableCFloorsheet').DataTable().order([1, 'desc']).draw();")
+        self.pause(1)
+
+        new = []
+        while True:
+            page, reached_known = newer_contracts(self._read_floorsheet_page(), since, "transaction_id")
+            new.extend(page)
+            self.report_progress(len(new))
+            if reached_known or not self._next_floorsheet_page():
+                break
+        return new
     
 class SharesansarNewsScraper(BaseScraper):
+    source = 'sharesansar'
+
     def __init__(self, headless=False, max_records=9999):
         super().__init__(headless=headless)
         self.base_url = "https://www.sharesansar.com/category/latest"
@@ -204,7 +246,7 @@ class SharesansarNewsScraper(BaseScraper):
         logger.info("Started scraping news from ShareSansar")
 
         try:
-            self.driver.get(self.base_url)
+            self.load(self.base_url)
             keep_scraping = True
 
             latest_db_date = get_latest_ss_news_date()
@@ -242,6 +284,7 @@ class SharesansarNewsScraper(BaseScraper):
                             "news_image": news_image
                         }
                     self.records.append(news_record)
+                    self.report_progress(len(self.records))
 
                     if len(self.records) >= self.max_records:
                         keep_scraping = False
@@ -297,7 +340,7 @@ class SharesansarNewsScraper(BaseScraper):
         news_date = None
 
         try:
-            self.driver.get(news_url)
+            self.load(news_url)
             self._close_ads()  # Close any ads that may appear
             content_section = self.wait.until(EC.presence_of_element_located((By.ID, "newsdetail-content")))
             news_body = content_section.text.strip()
@@ -339,8 +382,8 @@ class SharesansarNewsScraper(BaseScraper):
             next_button = self.driver.find_element(By.CSS_SELECTOR, "ul.pagination li.page-item a")
             next_url = next_button.get_attribute("href")
             if next_url:
-                self.driver.get(next_url)
-                time.sleep(2)
+                self.load(next_url)
+                self.pause(2)
                 return True
             else:
                 return False
@@ -0,0 +1,258 @@
+import ast
+import functools
+import operator
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .indicators import load_closes
+from .models import CompanyProfile, FloorSheetDaily, TechnicalIndicator
+
+import logging
+logger = logging.getLogger('stocks')
+
+SNAPSHOT_PATH = Path(getattr(settings, 'SCREENER_SNAPSHOT_PATH', settings.BASE_DIR / 'var' / 'screener_snapshot.npz'))
+
+TEXT_COLUMNS = ['symbol', 'sector']
+NUMERIC_COLUMNS = [
+    'close', 'return_1d', 'return_5d', 'return_20d', 'high_52w', 'low_52w',
+    'volume', 'avg_volume_20d', 'volume_ratio', 'turnover', 'trades',
+    'rsi_14', 'sma_20', 'sma_50', 'macd_hist',
+]
+COLUMNS = ['company_id'] + TEXT_COLUMNS + NUMERIC_COLUMNS
+
+
+class ScreenerQueryError(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Snapshot building (nightly) and loading (once per worker process)
+# ---------------------------------------------------------------------------
+
+def _price_metrics():
+    df = load_closes()
+    if df.empty:
+        return pd.DataFrame(columns=['close', 'return_1d', 'return_5d', 'return_20d', 'high_52w', 'low_52w'])
+    grouped = df.groupby('company_id')['close']
+    for days in (1, 5, 20):
+        df[f'return_{days}d'] = grouped.pct_change(days) * 100
+    df['high_52w'] = grouped.rolling(250, min_periods=1).max().reset_index(level=0, drop=True)
+    df['low_52w'] = grouped.rolling(250, min_periods=1).min().reset_index(level=0, drop=True)
+    return df.groupby('company_id').tail(1).set_index('company_id').drop(columns='date')
+
+
+def _volume_metrics():
+    daily = pd.DataFrame.from_records(
+        FloorSheetDaily.objects.order_by('company_id', 'date').values_list(
+            'company_id', 'date', 'total_quantity', 'turnover', 'trade_count'
+        ),
+        columns=['company_id', 'date', 'volume', 'turnover', 'trades'],
+    )
+    if daily.empty:
+        return pd.DataFrame(columns=['volume', 'avg_volume_20d', 'volume_ratio', 'turnover', 'trades'])
+    # Average of the 20 sessions *before* the latest one, so a spike today
+    # shows up as volume_ratio > 1 instead of being diluted by itself.
+    previous = daily.groupby('company_id')['volume'].shift(1)
+    daily['avg_volume_20d'] = (
+        previous.groupby(daily['company_id']).rolling(20, min_periods=1).mean().reset_index(level=0, drop=True)
+    )
+    latest = daily.groupby('company_id').tail(1).set_index('company_id')
+    latest['volume_ratio'] = latest['volume'] / latest['avg_volume_20d']
+    return latest[['volume', 'avg_volume_20d', 'volume_ratio', 'turnover', 'trades']]
+
+
+def _indicator_metrics():
+    df = pd.DataFrame.from_records(
+        TechnicalIndicator.objects.order_by('company_id', 'date').values_list(
+            'company_id', 'rsi_14', 'sma_20', 'sma_50', 'macd_hist'
+        ),
+        columns=['company_id', 'rsi_14', 'sma_20', 'sma_50', 'macd_hist'],
+    )
+    return df.groupby('company_id').tail(1).set_index('company_id')
+
+
+def build_snapshot():
+    """
+    Per-company metrics as a dict of equal-length NumPy columns.
+    """
+    companies = pd.DataFrame.from_records(
+        CompanyProfile.objects.values_list('id', 'symbol', 'sector'), columns=['company_id', 'symbol', 'sector']
+    ).set_index('company_id')
+    frame = companies.join(_price_metrics()).join(_volume_metrics()).join(_indicator_metrics())
+
+    snapshot = {'company_id': frame.index.to_numpy(dtype=np.int64)}
+    for column in TEXT_COLUMNS:
+        snapshot[column] = frame[column].fillna('').astype(str).to_numpy(dtype=str)
+    for column in NUMERIC_COLUMNS:
+        snapshot[column] = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+    return snapshot
+
+
+def refresh_snapshot(path=SNAPSHOT_PATH):
+    """
+    Rebuild the snapshot and atomically replace the file workers load from.
+    """
+    snapshot = build_snapshot()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as fh:
+        np.savez(fh, **snapshot)
+    os.replace(tmp_path, path)
+    logger.info(f"Screener snapshot refreshed: {len(snapshot['company_id'])} companies -> {path}")
+    return snapshot
+
+
+_cache = {'snapshot': None, 'mtime': None}
+_cache_lock = threading.Lock()
+
+
+def get_snapshot(path=SNAPSHOT_PATH):
+    """
+    The in-memory snapshot for this process. The file is only re-read when
+    the nightly refresh has replaced it (one os.stat per call).
+    """
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        mtime = None
+
+    if _cache['snapshot'] is not None and _cache['mtime'] == mtime:
+        return _cache['snapshot']
+
+    with _cache_lock:
+        if _cache['snapshot'] is None or _cache['mtime'] != mtime:
+            if mtime is None:
+                _cache['snapshot'] = refresh_snapshot(path)
+                mtime = path.stat().st_mtime
+            else:
+                with np.load(path, allow_pickle=False) as data:
+                    _cache['snapshot'] = {column: data[column] for column in data.files}
+            _cache['mtime'] = mtime
+    return _cache['snapshot']
+
+
+# ---------------------------------------------------------------------------
+# Filter expressions
+# ---------------------------------------------------------------------------
+
+_COMPARE = {
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt,
+    ast.GtE: operator.ge, ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+_ARITH = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+_UNARY = {ast.Not: np.logical_not, ast.USub: operator.neg}
+_SYMBOLS = {
+    ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!=',
+    ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Not: 'not', ast.USub: '-',
+}
+
+
+def evaluate(expression, snapshot):
+    """
+    Evaluate a filter such as
+        sector == "Commercial Banks" and rsi_14 < 30 and volume_ratio >= 2
+    against the snapshot columns, returning a boolean mask.
+
+    Supports and/or/not, comparisons (chained too), + - * /, `in` with a
+    literal list, column names and number/string literals. Anything else is
+    rejected, so user input never reaches eval().
+    """
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise ScreenerQueryError(f"Invalid expression: {e.msg}")
+    size = len(snapshot['company_id'])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = _eval(tree.body, snapshot)
+    result = np.asarray(result)
+    if result.dtype != bool:
+        raise ScreenerQueryError("Expression must be a condition, e.g. rsi_14 < 30.")
+    return np.full(size, bool(result)) if result.ndim == 0 else result
+
+
+def _eval(node, snapshot):
+    if isinstance(node, ast.BoolOp):
+        values = [_eval(value, snapshot) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return functools.reduce(combine, values)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+        operand = _eval(node.operand, snapshot)
+        try:
+            return _UNARY[type(node.op)](operand)
+        except TypeError:
+            raise ScreenerQueryError(f"Cannot use '{_SYMBOLS[type(node.op)]}' on text.")
+    if isinstance(node, ast.Compare):
+        left = _eval(node.left, snapshot)
+        mask = True
+        for op, comparator in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if not isinstance(comparator, (ast.List, ast.Tuple)):
+                    raise ScreenerQueryError("'in' needs a literal list, e.g. sector in ['Hydro Power', 'Finance'].")
+                options = [_eval(element, snapshot) for element in comparator.elts]
+                current = np.isin(left, options, invert=isinstance(op, ast.NotIn))
+                right = None
+            elif type(op) in _COMPARE:
+                right = _eval(comparator, snapshot)
+                current = _apply(op, _COMPARE[type(op)], left, right)
+            else:
+                raise ScreenerQueryError(f"Unsupported comparison: {type(op).__name__}")
+            mask = np.logical_and(mask, current)
+            left = right
+        return mask
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITH:
+        return _apply(node.op, _ARITH[type(node.op)], _eval(node.left, snapshot), _eval(node.right, snapshot))
+    if isinstance(node, ast.Name):
+        if node.id not in snapshot or node.id == 'company_id':
+            raise ScreenerQueryError(f"Unknown column '{node.id}'. Available: {', '.join(TEXT_COLUMNS + NUMERIC_COLUMNS)}")
+        return snapshot[node.id]
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)) and not isinstance(node.value, bool):
+        return node.value
+    raise ScreenerQueryError(f"Unsupported syntax in expression: {type(node).__name__}")
+
+
+def _apply(op, func, left, right):
+    """
+    A comparison or arithmetic on columns/literals; mixing text and numbers
+    (sector < 5, symbol + 1) is the user's mistake, not a server error.
+    """
+    try:
+        return func(left, right)
+    except TypeError:
+        raise ScreenerQueryError(f"Cannot use '{_SYMBOLS[type(op)]}' between text and numbers.")
+
+
+def screen(expression=None, sort=None, limit=50, snapshot=None):
+    """
+    Filter and sort the snapshot. `sort` is a column name, prefixed with '-'
+    for descending; NaNs always sort last. Returns (total_matches, rows).
+    """
+    if limit < 1:
+        raise ScreenerQueryError("limit must be at least 1.")
+    snapshot = snapshot if snapshot is not None else get_snapshot()
+    size = len(snapshot['company_id'])
+    mask = evaluate(expression, snapshot) if expression else np.ones(size, dtype=bool)
+    indices = np.flatnonzero(mask)
+
+    if sort:
+        column = sort.lstrip('-')
+        if column not in snapshot:
+            raise ScreenerQueryError(f"Unknown sort column '{column}'.")
+        values = snapshot[column][indices]
+        if column in TEXT_COLUMNS:
+            order = np.argsort(values, kind='stable')
+            order = order[::-1] if sort.startswith('-') else order
+        else:
+            keys = -values if sort.startswith('-') else values
+            order = np.argsort(np.where(np.isnan(keys), np.inf, keys), kind='stable')
+        indices = indices[order]
+
+    rows = []
+    for i in indices[:limit]:
+        row = {column: snapshot[column][i].item() for column in COLUMNS}
+        rows.append({key: (None if isinstance(value, float) and np.isnan(value) else value) for key, value in row.items()})
+    return len(indices), rows
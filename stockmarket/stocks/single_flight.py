@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+import uuid
+
+import redis
+from django.conf import settings
+
+from .circuit_breaker import get_redis
+
+import logging
+logger = logging.getLogger('stocks')
+
+KEY_PREFIX = 'stocks:flight'
+TTL = getattr(settings, 'SINGLE_FLIGHT_TTL', 120)
+WAIT = getattr(settings, 'SINGLE_FLIGHT_WAIT', 600)
+RESULT_TTL = getattr(settings, 'SINGLE_FLIGHT_RESULT_TTL', 60)
+POLL_INTERVAL = 0.5
+
+# Only the holder may extend or release its lock; a lock that expired while
+# its worker was stuck may already belong to someone else.
+_EXTEND = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class InFlight(Exception):
+    """
+    The job is already running elsewhere and the caller chose not to wait
+    for it (or waited longer than allowed).
+    """
+
+
+class FlightFailed(Exception):
+    """
+    The job this caller attached to failed; carries the leader's error.
+    """
+
+
+def flight_key(source, dataset, symbol=None):
+    return f"{KEY_PREFIX}:{source}:{dataset}:{symbol or '*'}"
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, client, key, token, ttl):
+        super().__init__(daemon=True)
+        self.client, self.key, self.token, self.ttl = client, key, token, ttl
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.ttl / 3):
+            try:
+                if not self.client.eval(_EXTEND, 1, self.key, self.token, self.ttl):
+                    logger.warning(f"Lost single-flight lock {self.key}")
+                    return
+            except redis.RedisError as e:
+                logger.warning(f"Could not extend single-flight lock {self.key}: {e}")
+
+
+def single_flight(source, dataset, symbol, func, wait=None, ttl=None, client=None):
+    """
+    Run `func()` unless the same (source, dataset, symbol) job is already in
+    flight on any worker, in which case wait for that job and return its
+    result instead. Returns (result, shared); results must be JSON-serialisable.
+
+    The lock expires `ttl` seconds after its holder stops heartbeating, so a
+    crashed worker's job is taken over by the next caller. With wait=0 a
+    caller that finds the job in flight gets InFlight immediately. When Redis
+    is unreachable `func` simply runs.
+    """
+    ttl = ttl or TTL
+    wait = WAIT if wait is None else wait
+    client = client or get_redis()
+    key = flight_key(source, dataset, symbol)
+    deadline = time.monotonic() + wait
+
+    while True:
+        token = uuid.uuid4().hex
+        try:
+            acquired = client.set(key, token, nx=True, ex=ttl)
+            leader = None if acquired else client.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight store unavailable ({e}), running {key} without a lock")
+            return func(), False
+
+        if acquired:
+            return _lead(client, key, token, ttl, func), False
+        if leader is None:
+            continue  # released between SET and GET
+        if wait == 0:
+            raise InFlight(f"{key} is already running")
+
+        logger.info(f"🔗 {key} already in flight, waiting for its result")
+        outcome = _follow(client, key, leader, deadline)
+        if outcome is not None:
+            if 'error' in outcome:
+                raise FlightFailed(outcome['error'])
+            return outcome['result'], True
+        if time.monotonic() >= deadline:
+            raise InFlight(f"Timed out waiting for {key}")
+        logger.warning(f"Holder of {key} went away without a result, taking over")
+
+
+def _lead(client, key, token, ttl, func):
+    heartbeat = _Heartbeat(client, key, token, ttl)
+    heartbeat.start()
+    outcome = {}
+    try:
+        outcome['result'] = func()
+        return outcome['result']
+    except Exception as e:
+        outcome['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        heartbeat.stopped.set()
+        try:
+            client.eval(_RELEASE, 2, key, f"{key}:result:{token}", token, json.dumps(outcome, default=str), RESULT_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"Could not release single-flight lock {key}: {e}")
+
+
+def _follow(client, key, token, deadline):
+    """
+    Poll for the result of the job held with `token`. None when the holder's
+    lock vanished without a result (it crashed) or the deadline passed.
+    """
+    result_key = f"{key}:result:{token}"
+    while time.monotonic() < deadline:
+        try:
+            pipe = client.pipeline()
+            pipe.get(result_key)
+            pipe.get(key)
+            result, holder = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight store unavailable while waiting for {key}: {e}")
+            return None
+        if result is not None:
+            return json.loads(result)
+        if holder != token:
+            return None
+        time.sleep(POLL_INTERVAL)
+    return None
+
+
+def in_flight(client=None):
+    """
+    Jobs currently holding a lock, with the seconds left on each lock.
+    """
+    client = client or get_redis()
+    flights = []
+    for key in client.scan_iter(f"{KEY_PREFIX}:*"):
+        if ':result:' in key:
+            continue
+        _, _, source, dataset, symbol = key.split(':', 4)
+        flights.append({'source': source, 'dataset': dataset, 'symbol': None if symbol == '*' else symbol, 'ttl': client.ttl(key)})
+    return sorted(flights, key=lambda flight: (flight['source'], flight['dataset'], flight['symbol'] or ''))
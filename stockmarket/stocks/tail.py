@@ -0,0 +1,161 @@
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import labels, recording, span
+from .models import CompanyProfile, FloorSheet, FloorsheetWatermark
+from .scrapers.nepstock_scraper import NepalstockScraper
+from .scrapers.sharesansar_scraper import SharesansarFloorsheetScraper
+from .single_flight import single_flight
+from .trading_calendar import is_market_open, nepal_today
+from .utility import contract_number, store_floorsheet_to_db_nepstock, store_floorsheet_to_db_ss
+
+import logging
+logger = logging.getLogger('stocks')
+
+# source -> (scraper class, saver, key of the contract number in the raw rows)
+TAIL_SOURCES = {
+    'sharesansar': (lambda: SharesansarFloorsheetScraper(symbol='', headless=True), store_floorsheet_to_db_ss, 'transaction_id'),
+    'nepstock': (lambda: NepalstockScraper(headless=True), store_floorsheet_to_db_nepstock, 'Contract No'),
+}
+
+INTERVAL = getattr(settings, 'FLOORSHEET_TAIL_INTERVAL', 30)
+# Chrome is restarted after this many polls to keep its memory in check.
+RECYCLE_AFTER = getattr(settings, 'FLOORSHEET_TAIL_RECYCLE_AFTER', 200)
+
+
+def get_watermark(company, source, session):
+    """
+    The company's watermark for `session`, started from the contracts already
+    stored for that day when it is new (or left over from an earlier day).
+    """
+    watermark, _ = FloorsheetWatermark.objects.get_or_create(company=company, source=source, defaults={'date': session})
+    if watermark.date != session or not watermark.last_contract:
+        stored = FloorSheet.objects.filter(company=company, date=session).values_list('transaction_id', flat=True)
+        numbers = [n for n in map(contract_number, stored) if n is not None]
+        watermark.date = session
+        watermark.last_contract = str(max(numbers)) if numbers else ''
+        watermark.contracts = len(numbers)
+        watermark.last_new_at = None
+        watermark.save()
+    return watermark
+
+
+class FloorsheetTail:
+    """
+    Polls the floorsheet of `symbols` from one source, newest-first, saving
+    only contracts above each symbol's watermark. One browser is kept open
+    for all symbols, so a cycle costs a page load or two per symbol.
+    """
+
+    def __init__(self, source, symbols):
+        if source not in TAIL_SOURCES:
+            raise ValueError(f"Tail mode supports {', '.join(TAIL_SOURCES)}, not {source}")
+        self.source = source
+        self.companies = list(CompanyProfile.objects.filter(symbol__in=symbols))
+        missing = set(symbols) - {company.symbol for company in self.companies}
+        if missing:
+            logger.warning(f"Tail: unknown symbols skipped: {', '.join(sorted(missing))}")
+        self.scraper = None
+        self.polls = 0
+
+    def _get_scraper(self):
+        if self.scraper is not None and self.polls >= RECYCLE_AFTER:
+            self.close()
+        if self.scraper is None:
+            self.scraper = TAIL_SOURCES[self.source][0]()
+            self.polls = 0
+        return self.scraper
+
+    def close(self):
+        if self.scraper is not None:
+            try:
+                self.scraper.close()
+            except Exception as e:
+                logger.warning(f"Tail: could not close {self.source} browser: {e}")
+            self.scraper = None
+
+    def poll(self, company, session):
+        """
+        Fetch and save the contracts newer than the watermark. Returns how
+        many were stored; a contract another scraper stored first is not counted.
+        """
+        _, save, key = TAIL_SOURCES[self.source]
+        watermark = get_watermark(company, self.source, session)
+        since = int(watermark.last_contract) if watermark.last_contract else None
+
+        self.polls += 1
+        rows = self._get_scraper().tail_floorsheet(company.symbol, since=since)
+        now = timezone.now()
+        inserted = 0
+        if rows:
+            inserted = save(company.symbol, rows)
+            # Rows without a parseable contract number are stored, but cannot
+            # move the watermark.
+            newest = max((n for n in (contract_number(row[key]) for row in rows) if n is not None), default=since or 0)
+            if newest:
+                watermark.last_contract = str(max(newest, since or 0))
+            if inserted:
+                watermark.contracts += inserted
+                watermark.last_new_at = now
+        watermark.polled_at = now
+        watermark.save()
+        return inserted
+
+    def cycle(self):
+        """
+        Poll every symbol once. Returns (new contracts, seconds taken).
+        """
+        session = nepal_today()
+        started = time.monotonic()
+        total = 0
+        with recording():
+            for company in self.companies:
+                with labels(source=self.source, symbol=company.symbol), span('tail_poll'):
+                    try:
+                        total += self.poll(company, session)
+                    except Exception as e:
+                        # A wedged browser is the usual cause; start a fresh one next poll.
+                        logger.error(f"Tail: {self.source} poll failed for {company.symbol}: {e}")
+                        self.close()
+        return total, time.monotonic() - started
+
+    def run(self, interval=None, cycles=None, ignore_hours=False):
+        """
+        Poll in a loop, starting a cycle every `interval` seconds, until the
+        session closes (or after `cycles` cycles). A trade shows up in the DB
+        at most about interval + one cycle after it is printed.
+        """
+        interval = interval or INTERVAL
+        done = 0
+        try:
+            while cycles is None or done < cycles:
+                if not ignore_hours and not is_market_open():
+                    logger.info("Tail: market is closed, stopping")
+                    break
+                new, elapsed = self.cycle()
+                done += 1
+                logger.info(f"Tail: {self.source} cycle {done}: {new} new contracts across {len(self.companies)} symbols in {elapsed:.1f}s")
+                if elapsed > interval:
+                    logger.warning(
+                        f"Tail: cycle took {elapsed:.1f}s, longer than the {interval}s interval; "
+                        f"track fewer symbols or run another tail process"
+                    )
+                elif cycles is None or done < cycles:
+                    time.sleep(interval - elapsed)
+        finally:
+            self.close()
+        return done
+
+
+def run_tail(source, symbols, interval=None, cycles=None, ignore_hours=False):
+    """
+    FloorsheetTail.run under a lock, so only one tail per source runs at a time.
+    """
+    tail = FloorsheetTail(source, symbols)
+    return single_flight(
+        source, 'floorsheet-tail', None,
+        lambda: tail.run(interval=interval, cycles=cycles, ignore_hours=ignore_hours),
+        wait=0,
+    )[0]
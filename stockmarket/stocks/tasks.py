@@ -1,118 +1,136 @@
 from celery import shared_task
-from .utility import save_price_history_to_db, save_price_history_to_db_ss, save_price_history_to_db_ml, store_floorsheet_to_db_ss, store_floorsheet_to_db_ml, store_news_to_db_ml, store_news_to_db_ss
-from .scrapers.sharesansar_scraper import SharesansarPriceScraper, SharesansarFloorsheetScraper, SharesansarNewsScraper
-from .scrapers.merolagani_scraper import MerolaganiScraper, MerolaganiFloorsheetScraper, MerolaganiNewsScraper
-from .scrapers.nepstock_scraper import scrape_company_price_history_nepstock, scrape_company_floorsheet_nepstock
+from .utility import save_price_history_to_db, save_price_history_to_db_ss, save_price_history_to_db_ml, store_news_to_db_ml, store_news_to_db_ss, after_reconcile
+from .scrapers.sharesansar_scraper import SharesansarPriceScraper, SharesansarNewsScraper
+from .scrapers.merolagani_scraper import MerolaganiScraper, MerolaganiNewsScraper
+from .scrapers.nepstock_scraper import scrape_company_price_history_nepstock
 from .models import CompanyProfile
+from .trading_calendar import trading_days_only, infer_holidays
+from .gaps import plan_backfill, enqueue_backfill
+from .indicators import refresh_indicators
+from .screener import refresh_snapshot
+from .brokers import refresh_broker_flows
+from .rollups import refresh_daily_rollups
+from . import columnar
+from .reconciliation import reconcile, disagreement_report
+from .failover import DATASETS, scrape_with_failover
+from .priority import select_symbols
+from .scrape_runs import RunInProgress, start_or_resume_run, execute_run, run_summary, backoff_delay, start_item, finish_item, MAX_ATTEMPTS
+from .metrics import recording, prune
+from .single_flight import InFlight, single_flight
+from .jobs import reporting, task_progress
+from .entity_linking import backfill_links
+from .news_dedup import backfill_duplicates
+from .view_cache import invalidate
+from . import pipeline
+from datetime import date
 
 import logging
 logger = logging.getLogger('stocks')
 
+def scrape_symbols(task, dataset, preferred, budget=None):
+    """
+    Scrape `dataset` for every company from `preferred`, failing over to
+    another source per symbol while `preferred`'s circuit is open.
+    With a `budget`, only that many symbols are scraped, chosen by
+    stocks.priority (activity and staleness).
+    Progress is checkpointed per symbol in a ScrapeRun, so a run cut short
+    by a crash or worker restart is resumed by the task's next invocation.
+    Only one run per (source, dataset) goes at a time: an invocation that
+    finds one in flight is skipped, and a symbol already being scraped by
+    an on-demand request waits for that scrape instead of repeating it.
+    """
+    try:
+        return single_flight(preferred, dataset, None, lambda: _scrape_run(task, dataset, preferred, budget), wait=0)[0]
+    except InFlight as e:
+        logger.info(f"Celery: {e}, skipping")
+        return str(e)
+
+def _scrape_run(task, dataset, preferred, budget):
+    if budget:
+        symbols = select_symbols(dataset, budget)
+    else:
+        symbols = list(CompanyProfile.objects.values_list('symbol', flat=True))
+    try:
+        run = start_or_resume_run(task.name, dataset, preferred, symbols)
+    except RunInProgress as e:
+        logger.info(f"Celery: {e}, skipping")
+        return str(e)
+
+    def scrape(symbol):
+        with recording(run.id):
+            source, data = scrape_with_failover(dataset, symbol, preferred)
+        if source:
+            logger.info(f"Celery: {len(data)} records saved for {symbol} from {source}")
+        return source, len(data)
+
+    def work(symbol):
+        logger.info(f"Celery: Processing for {symbol}")
+        (source, records), shared = single_flight(preferred, dataset, symbol, lambda: scrape(symbol))
+        if shared:
+            logger.info(f"Celery: {symbol} was already being scraped, reused its result")
+        return source, records
+
+    summary = run_summary(execute_run(run, work))
+    logger.info(f"Celery: Run #{run.id} finished: {summary}")
+    return (
+        f"Run #{run.id} {summary['status']}: {summary['by_status']}, "
+        f"{summary['symbols_per_minute']} symbols/min, failures {summary['failures_by_type']}"
+    )
+
 @shared_task(bind=True)
-def run_sharesansar_pricehistory_scraper(self):
+@trading_days_only
+def run_sharesansar_pricehistory_scraper(self, budget=None):
     logger.info("Celery Task Started: Sharesansar Price History Scraper")
-    symbols = CompanyProfile.objects.values_list('symbol', flat=True)
-    for symbol in symbols:
-        logger.info(f"Celery: Processing for {symbol}")
-        scraper = SharesansarPriceScraper(symbol=symbol, headless=True)
-        data = scraper.fetch_price_history()
-        logger.info(f"Celery: Data Scraped for {symbol}")
-        save_price_history_to_db_ss(symbol, data)
-        logger.info(f"Celery: Data saved for {symbol}")
-    return "Celery Task Executed"
+    return scrape_symbols(self, 'price_history', 'sharesansar', budget)
 
 @shared_task(bind=True)
-def run_merolagani_pricehistory_scraper(self):
+@trading_days_only
+def run_merolagani_pricehistory_scraper(self, budget=None):
     logger.info("Celery Task Started: Merolagani Price History Scraper")
-    symbols = CompanyProfile.objects.values_list('symbol', flat=True)
-    for symbol in symbols:
-        logger.info(f"Celery: Processing for {symbol}")
-        scraper = MerolaganiScraper(symbol=symbol, headless=True)
-        data = scraper.fetch_price_history(max_records=80)
-        logger.info(f"Celery: Data Scraped for {symbol}")
-        save_price_history_to_db_ml(symbol, data)
-        logger.info(f"Celery: Data saved for {symbol}")
-    return "Celery Task Executed"
+    return scrape_symbols(self, 'price_history', 'merolagani', budget)
 
 @shared_task(bind=True)
-def run_nepstock_pricehistory_scraper(self):
+@trading_days_only
+def run_nepstock_pricehistory_scraper(self, budget=None):
     logger.info("Celery Task Started: Nepstock Price History Scraper")
-    symbols = CompanyProfile.objects.values_list('symbol', flat=True)
-    for symbol in symbols:
-        logger.info(f"Celery: Processing for {symbol}")
-        price_history_data = scrape_company_price_history_nepstock(symbol, max_pages=8, output_csv=False)
-        logger.info(f"Celery: Data Scraped for {symbol}")
-        save_price_history_to_db(symbol, price_history_data)
-        logger.info(f"Celery: Data saved for {symbol}")
-    return "Celery Task Executed"
+    return scrape_symbols(self, 'price_history', 'nepstock', budget)
 
 @shared_task(bind=True)
-def run_sharesansar_floorsheet_scraper(self):
+@trading_days_only
+def run_sharesansar_floorsheet_scraper(self, budget=None):
     logger.info("Celery Task Started: Sharesansar Floorsheet Scraper")
-    try:
-        symbols = CompanyProfile.objects.values_list('symbol', flat=True)
-        for symbol in symbols:
-            logger.info(f"Celery: Processing for {symbol}")
-            scraper = SharesansarFloorsheetScraper(symbol=symbol, headless=True)
-            floorsheet_data = scraper.fetch_floorsheet()
-            logger.info(f"Celery: Floorsheet Data Scraped for {symbol}")
-            store_floorsheet_to_db_ss(symbol, floorsheet_data)
-            logger.info(f"Celery: Data saved for {symbol}")
-        return "Celery Task Executed"
-    except Exception as e:
-        logger.error(f"Error in run_sharesansar_floorsheet_scraper: {e}")
-        return "Error in Celery Task: run_sharesansar_floorsheet_scraper"
-    
+    return scrape_symbols(self, 'floorsheet', 'sharesansar', budget)
+
 @shared_task(bind=True)
-def run_merolagani_floorsheet_scraper(self):
+@trading_days_only
+def run_merolagani_floorsheet_scraper(self, budget=None):
     logger.info("Celery Task Started: Merolagani Floorsheet Scraper")
-    try:
-        symbols = CompanyProfile.objects.values_list('symbol', flat=True)
-        for symbol in symbols:
-            logger.info(f"Celery: Processing for {symbol}")
-            scraper = MerolaganiFloorsheetScraper(headless=True)
-            floorsheet_data = scraper.run_scraper(symbol=symbol)
-            logger.info(f"Celery: Floorsheet Data Scraped for {symbol}")
-            store_floorsheet_to_db_ml(symbol, floorsheet_data)
-            logger.info(f"Celery: Data saved for {symbol}")
-        return "Celery Task Executed"
-    except Exception as e:
-        logger.error(f"Error in run_merolagani_floorsheet_scraper: {e}")
-        return "Error in Celery Task: run_merolagani_floorsheet_scraper"
+    return scrape_symbols(self, 'floorsheet', 'merolagani', budget)
 
 @shared_task(bind=True)
-def run_nepstock_floorsheet_scraper(self):
+@trading_days_only
+def run_nepstock_floorsheet_scraper(self, budget=None):
     logger.info("Celery Task Started: Nepstock Floorsheet Scraper")
-    try:
-        symbols = CompanyProfile.objects.values_list('symbol', flat=True)
-        for symbol in symbols:
-            logger.info(f"Celery: Processing for {symbol}")
-            floorsheet_data = scrape_company_floorsheet_nepstock(symbol, headless=True)
-            logger.info(f"Celery: Floorsheet Data Scraped for {symbol}")
-            store_floorsheet_to_db_ss(symbol, floorsheet_data)
-            logger.info(f"Celery: Data saved for {symbol}")
-        return "Celery Task Executed"
-    except Exception as e:
-        logger.error(f"Error in run_nepstock_floorsheet_scraper: {e}")
-        return "Error in Celery Task: run_nepstock_floorsheet_scraper"
-    
+    return scrape_symbols(self, 'floorsheet', 'nepstock', budget)
+
 @shared_task(bind=True)
 def run_merolagani_news_scraper(self):
     logger.info("Celery Task Started: Merolagani News Scraper")
 
     scraper = None
     try:
-        scraper = MerolaganiNewsScraper(headless=True, max_records=8)
-        records = scraper.fetch_news()
-        logger.info(f"Celery: Fetched {len(records)} news items from listing page")
+        with reporting(task_progress(self)):
+            scraper = MerolaganiNewsScraper(headless=True, max_records=8)
+            records = scraper.fetch_news()
+            logger.info(f"Celery: Fetched {len(records)} news items from listing page")
 
-        detailed_records = scraper._extract_news_body(records=records)
-        logger.info("Celery: News bodies extracted")
+            detailed_records = scraper._extract_news_body(records=records)
+            logger.info("Celery: News bodies extracted")
 
         store_news_to_db_ml(news_data=detailed_records)
         logger.info("Celery: News successfully stored to DB")
 
-        return "Celery: Merolagani news scraping completed successfully"
+        return {'rows': len(detailed_records), 'message': "Merolagani news scraping completed successfully"}
     except Exception as e:
         logger.exception("Celery: Error during Merolagani news scraping task:")
         raise self.retry(exc=e, countdown=60, max_retries=3)  # Optional retry mechanism
@@ -123,17 +141,207 @@ def run_merolagani_news_scraper(self):
 @shared_task(bind=True)
 def run_sharesansar_news_scraper(self):
     logger.info("Celery Task Started: Sharesansar News Scraper")
+    news_scraper = None
     try:
-        news_scraper = SharesansarNewsScraper(headless=True, max_records=2)
-        records = news_scraper.fetch_news()
+        with reporting(task_progress(self)):
+            news_scraper = SharesansarNewsScraper(headless=True, max_records=2)
+            records = news_scraper.fetch_news()
         logger.info(f"Celery: Fetched {len(records)} news items from listing page")
         logger.info("Celery: News bodies extracted")
 
         store_news_to_db_ss(records)
         logger.info("Celery: News successfully stored to DB")
+        return {'rows': len(records), 'message': "Sharesansar news scraping completed successfully"}
     except Exception as e:
         logger.exception("Celery: Error during Sharesansar news scraping task:")
         raise self.retry(exc=e, countdown=60, max_retries=3)
 
     finally:
-        news_scraper.close()
\ No newline at end of file
+        if news_scraper:
+            news_scraper.close()
+
+@shared_task(bind=True)
+def scrape_company_job(self, dataset, source, symbol):
+    """
+    On-demand scrape of one company from one source, queued by the scrape
+    views. Progress is published per page for the job status API.
+    """
+    logger.info(f"Celery: On-demand {dataset} scrape of {symbol} from {source}")
+
+    def work():
+        fetch, save = DATASETS[dataset][source]
+        with reporting(task_progress(self)):
+            data = fetch(symbol) or []
+        save(symbol, data)
+        return len(data)
+
+    records, shared = single_flight(source, dataset, symbol, work)
+    return {
+        'rows': records,
+        'coalesced': shared,
+        'message': f"Scraped and saved {records} {dataset.replace('_', ' ')} records for {symbol} from {source}",
+    }
+
+@shared_task(bind=True)
+def refresh_trading_calendar(self):
+    logger.info("Celery Task Started: Trading Calendar Refresh")
+    added, removed = infer_holidays()
+    return f"Trading calendar refreshed: {len(added)} holidays added, {len(removed)} removed"
+
+@shared_task(bind=True)
+def run_price_backfill(self, source, symbol, pages, rows, since):
+    """
+    Scrape just deep enough into one source to cover a company's price gaps.
+    """
+    logger.info(f"Celery Task Started: Price Backfill for {symbol} via {source} ({pages} pages)")
+    since = date.fromisoformat(since)
+    if source == 'sharesansar':
+        scraper = SharesansarPriceScraper(symbol=symbol, headless=True)
+        data = scraper.fetch_price_history(max_records=rows, since=since)
+        save_price_history_to_db_ss(symbol, data)
+    elif source == 'merolagani':
+        scraper = MerolaganiScraper(symbol=symbol, headless=True)
+        data = scraper.fetch_price_history(max_records=rows)
+        save_price_history_to_db_ml(symbol, data)
+    elif source == 'nepstock':
+        data = scrape_company_price_history_nepstock(symbol, max_pages=pages, output_csv=False)
+        save_price_history_to_db(symbol, data)
+    else:
+        raise ValueError(f"Unknown price history source: {source}")
+    logger.info(f"Celery: Backfill saved {len(data)} records for {symbol}")
+    return f"Backfilled {len(data)} records for {symbol} from {source}"
+
+@shared_task(bind=True)
+def run_gap_backfill(self):
+    logger.info("Celery Task Started: Gap Backfill Planner")
+    jobs = plan_backfill()
+    queued = enqueue_backfill(jobs)
+    return f"Queued {queued} backfill jobs"
+
+@shared_task(bind=True)
+def run_indicator_refresh(self):
+    logger.info("Celery Task Started: Technical Indicator Refresh")
+    count = refresh_indicators()
+    invalidate('prices')
+    return f"Recomputed {count} indicator rows"
+
+@shared_task(bind=True)
+def refresh_screener_snapshot(self):
+    logger.info("Celery Task Started: Screener Snapshot Refresh")
+    snapshot = refresh_snapshot()
+    return f"Screener snapshot refreshed for {len(snapshot['company_id'])} companies"
+
+@shared_task(bind=True)
+def run_broker_flow_refresh(self):
+    logger.info("Celery Task Started: Broker Flow Rebuild")
+    count = refresh_broker_flows()
+    return f"Rebuilt {count} broker flow rows"
+
+@shared_task(bind=True)
+def run_floorsheet_rollup_refresh(self):
+    logger.info("Celery Task Started: Floorsheet Daily Rollup Rebuild")
+    count = refresh_daily_rollups()
+    return f"Rebuilt {count} floorsheet daily rows"
+
+@shared_task(bind=True)
+def run_columnar_store_rebuild(self, datasets=None):
+    logger.info("Celery Task Started: Columnar Store Rebuild")
+    count = sum(columnar.rebuild(dataset) for dataset in datasets or columnar.DATASETS)
+    return f"Rebuilt {count} columnar store partitions"
+
+@shared_task(bind=True)
+def run_price_reconciliation(self):
+    logger.info("Celery Task Started: Price Reconciliation")
+    result = reconcile()
+    after_reconcile(result.changed)
+    for row in disagreement_report():
+        logger.info(f"Reconciliation: {row['source']} disagrees on {row['disagreements']}/{row['compared']} compared days")
+    return f"Reconciled {result.compared} multi-source days, {result.disputed} disputed"
+
+@shared_task(bind=True)
+def run_news_link_backfill(self, batch_size=500, start_id=0):
+    logger.info("Celery Task Started: News Company Linking Backfill")
+    articles, mentions = backfill_links(batch_size=batch_size, start_id=start_id)
+    invalidate('news')
+    return f"Linked {articles} articles, {mentions} company mentions"
+
+@shared_task(bind=True)
+def run_news_dedup_backfill(self, batch_size=500):
+    logger.info("Celery Task Started: News Near-Duplicate Backfill")
+    articles, duplicates = backfill_duplicates(batch_size=batch_size)
+    invalidate('news')
+    return f"Signed {articles} articles, {duplicates} near-duplicates"
+
+# ---------------------------------------------------------------------------
+# Staged pipeline: fetch (browser queue) -> parse (cpu) -> persist (db)
+# ---------------------------------------------------------------------------
+
+@shared_task(bind=True)
+@trading_days_only
+def run_scrape_pipeline(self, dataset, preferred, budget=None):
+    """
+    Queue one fetch -> parse -> persist chain per symbol. Same selection and
+    ScrapeRun bookkeeping as the monolithic tasks, but each stage runs on
+    workers sized for its resource (see stockmarket/celery.py).
+    """
+    symbols = select_symbols(dataset, budget) if budget else list(CompanyProfile.objects.values_list('symbol', flat=True))
+    try:
+        run = start_or_resume_run(f"{self.name}:{dataset}:{preferred}", dataset, preferred, symbols)
+    except RunInProgress as e:
+        logger.info(f"Celery: {e}, skipping")
+        return str(e)
+
+    items = list(run.items.filter(status__in=['pending', 'failed']).values_list('id', 'symbol'))
+    for item_id, symbol in items:
+        pipeline.build_chain(dataset, preferred, symbol, item_id, run.id).apply_async()
+    logger.info(f"Celery: Run #{run.id} queued {len(items)} {dataset} pipelines")
+    return f"Run #{run.id}: queued {len(items)} pipelines"
+
+@shared_task(bind=True, acks_late=True)
+def fetch_stage(self, payload):
+    if payload.get('item_id') and not self.request.retries:
+        start_item(payload['item_id'])
+    attempts = self.request.retries + 1
+    try:
+        with recording(payload.get('run_id')):
+            # Coalesced with concurrent fetches of the same symbol; the result
+            # may be another chain's payload, so keep this chain's own ids.
+            fetched, _ = single_flight(
+                payload['preferred'], f"{payload['dataset']}-fetch", payload['symbol'], lambda: pipeline.fetch(payload),
+            )
+        return {**fetched, 'item_id': payload.get('item_id'), 'run_id': payload.get('run_id'), 'attempts': attempts}
+    except Exception as e:
+        if attempts < MAX_ATTEMPTS:
+            raise self.retry(exc=e, countdown=backoff_delay(attempts), max_retries=MAX_ATTEMPTS - 1)
+        if payload.get('item_id'):
+            finish_item(payload['item_id'], error=e, attempts=attempts)
+        raise
+
+@shared_task(bind=True)
+def parse_stage(self, payload):
+    try:
+        with recording(payload.get('run_id')):
+            return pipeline.parse(payload)
+    except Exception as e:
+        if payload.get('item_id'):
+            finish_item(payload['item_id'], error=e, attempts=payload['attempts'])
+        raise
+
+@shared_task(bind=True)
+def persist_stage(self, payload):
+    try:
+        with recording(payload.get('run_id')):
+            records = pipeline.persist(payload)
+    except Exception as e:
+        if payload.get('item_id'):
+            finish_item(payload['item_id'], error=e, attempts=payload['attempts'])
+        raise
+    if payload.get('item_id'):
+        finish_item(payload['item_id'], source=payload['source'], records=records, attempts=payload['attempts'])
+    return f"{payload['symbol']}: {records} {payload['dataset']} rows from {payload['source']}"
+
+@shared_task
+def prune_stage_metrics():
+    deleted = prune()
+    logger.info(f"Celery: Pruned {deleted} stage metric rows")
+    return deleted
@@ -1,3 +1,1241 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import numpy as np
+import pandas as pd
+import redis
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from . import columnar, fixed_point
+from .backtesting import BacktestConfig, DifferenceCache, run_backtest, walk_forward_origins
+from .brokers import FLOW_FIELDS, compute_broker_flows, refresh_broker_flows, top_brokers, update_broker_flows
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .entity_linking import Automaton, CompanyLinker, link_articles
+from .failover import scrape_with_failover
+from .forecasting import NumpyARForecaster, StatsmodelsARIMAForecaster, get_forecaster
+from .gaps import choose_source, find_gaps, gap_runs, last_complete_trading_day
+from .jobs import enqueue, job_status
+from .indicators import INDICATOR_FIELDS, refresh_indicators, update_indicators
+from .live import Broadcaster, Subscription, format_event, publish
+from .metrics import Recorder, prometheus_text, prune, store
+from .models import (
+    BrokerDailyFlow, CompanyNews, CompanyProfile, FloorSheet, FloorSheetDaily, FloorsheetWatermark, MarketHoliday, PriceHistory,
+    PriceObservation, ScrapeRun, ScrapeRunItem, StageMetric, TechnicalIndicator,
+)
+from .news_dedup import MIN_TOKENS, find_canonical, mark_duplicate, signature, similarity
+from .news_search import search_news
+from .pipeline import STAGE_QUEUES, build_chain, parse, persist
+from .priority import score_symbols, select_symbols
+from .reconciliation import LEGS, _agreement, ingest_price_observations, reconcile
+from .scrape_runs import backoff_delay
+from .screener import NUMERIC_COLUMNS, ScreenerQueryError, evaluate, screen
+from .single_flight import FlightFailed, InFlight, flight_key, single_flight
+from .tail import TAIL_SOURCES, FloorsheetTail, get_watermark
+from .trading_calendar import NEPSE_TIMEZONE, get_holidays, is_trading_day, next_trading_days, trading_days, trading_days_only
+from .rollups import DAILY_FIELDS, compare_with_price_history, compute_daily_rollups, refresh_daily_rollups, update_daily_rollups
+from .utility import after_reconcile, parse_floorsheet_nepstock, persist_floorsheet
+
+
+def contract(company, number, day, buyer, seller, quantity, rate):
+    return FloorSheet(company=company, transaction_id=str(number), date=day, buyer=buyer, seller=seller,
+                      quantity=quantity, rate=rate, amount=quantity * rate)
+
+
+def ar_series(length=400, seed=7):
+    """
+    Closing prices whose daily changes follow a stationary AR(2).
+    """
+    rng = np.random.default_rng(seed)
+    changes = np.zeros(length)
+    for t in range(2, length):
+        changes[t] = 0.5 * changes[t - 1] - 0.3 * changes[t - 2] + rng.normal()
+    return 500 + np.cumsum(changes)
+
+
+STORY = (
+    "Upper Tamakoshi Hydropower has proposed a ten percent cash dividend for the last fiscal year "
+    "after posting record profit on higher electricity sales to the national grid this monsoon season."
+)
+
+
+def screener_snapshot():
+    snapshot = {
+        'company_id': np.array([1, 2, 3]),
+        'symbol': np.array(['NABIL', 'NICA', 'UPPER']),
+        'sector': np.array(['Commercial Banks', 'Commercial Banks', 'Hydro Power']),
+    }
+    snapshot.update({column: np.array([1.0, 2.0, 3.0]) for column in NUMERIC_COLUMNS})
+    snapshot['rsi_14'] = np.array([25.0, 55.0, np.nan])
+    snapshot['volume_ratio'] = np.array([2.5, 0.8, 1.2])
+    return snapshot
+
+
+# ---------------------------------------------------------------------------
+# Forecasting engines
+# ---------------------------------------------------------------------------
+
+class NumpyARForecasterTests(SimpleTestCase):
+    def test_matches_statsmodels(self):
+        series = ar_series()
+        for order in ((2, 1, 0), (3, 1, 0), (2, 2, 0)):
+            with self.subTest(order=order):
+                expected = StatsmodelsARIMAForecaster(order=order).forecast(series, steps=5)
+                np.testing.assert_allclose(NumpyARForecaster(order=order).forecast(series, steps=5), expected, atol=0.01)
+
+    def test_batch_matches_one_series_at_a_time(self):
+        forecaster = NumpyARForecaster(order=(3, 1, 0))
+        series_map = {1: ar_series(seed=1), 2: ar_series(length=120, seed=2), 3: ar_series(length=250, seed=3)}
+        batch = forecaster.forecast_many(series_map, steps=5)
+        for key, series in series_map.items():
+            with self.subTest(key=key):
+                np.testing.assert_allclose(batch[key], forecaster.forecast(series, steps=5))
+
+    def test_too_short_series_are_skipped(self):
+        self.assertEqual(NumpyARForecaster(order=(2, 1, 0)).forecast_many({1: [100.0, 101.0]}), {})
+
+    def test_rejects_ma_terms_and_unknown_engines(self):
+        with self.assertRaises(ValueError):
+            NumpyARForecaster(order=(2, 1, 1))
+        with self.assertRaises(ValueError):
+            get_forecaster('prophet')
+
+
+# ---------------------------------------------------------------------------
+# Backtesting
+# ---------------------------------------------------------------------------
+
+class WalkForwardTests(SimpleTestCase):
+    def test_origins_leave_room_for_the_horizon(self):
+        self.assertEqual(walk_forward_origins(100, horizon=5, min_train=60, step=10), [60, 70, 80, 90])
+        self.assertEqual(walk_forward_origins(95, horizon=5, min_train=60, step=10), [60, 70, 80, 90])
+        self.assertEqual(walk_forward_origins(64, horizon=5, min_train=60, step=10), [])
+
+    def test_cached_difference_serves_every_origin(self):
+        series = ar_series(length=100)
+        cache = DifferenceCache({1: series})
+        self.assertIs(cache.get(1, 2), cache.get(1, 2))
+        for origin in (60, 75, 90):
+            with self.subTest(origin=origin):
+                np.testing.assert_array_equal(cache.get(1, 2)[:origin - 2], np.diff(series[:origin], n=2))
+
+    def test_errors_match_forecasts_made_one_origin_at_a_time(self):
+        series_map = {1: ar_series(length=120, seed=1), 2: ar_series(length=90, seed=2)}
+        config = BacktestConfig('numpy', (3, 1, 0))
+        [result] = run_backtest(series_map, [config], horizon=5, min_train=60, step=10, workers=1)
+
+        forecaster = NumpyARForecaster(order=config.order)
+        errors = [
+            forecaster.forecast(series[:origin], steps=5) - series[origin:origin + 5]
+            for series in series_map.values()
+            for origin in walk_forward_origins(len(series), horizon=5, min_train=60, step=10)
+        ]
+        self.assertEqual(result['forecasts'], 6 + 3)
+        np.testing.assert_allclose(result['mae'], np.abs(errors).mean(axis=0))
+
+
+# ---------------------------------------------------------------------------
+# Trading calendar
+# ---------------------------------------------------------------------------
+
+class TradingCalendarTests(TestCase):
+    def setUp(self):
+        # Week of Sunday 2024-01-07; Friday and Saturday are the weekend.
+        MarketHoliday.objects.create(date=date(2024, 1, 8), description='Official')
+        MarketHoliday.objects.create(date=date(2024, 1, 9), inferred=True)
+        MarketHoliday.objects.create(date=date(2024, 1, 10), inferred=True, reviewed=True)
+
+    def test_unreviewed_inferred_holidays_are_trading_days(self):
+        self.assertFalse(is_trading_day(date(2024, 1, 8)))
+        self.assertTrue(is_trading_day(date(2024, 1, 9)))
+        self.assertFalse(is_trading_day(date(2024, 1, 10)))
+        self.assertEqual(trading_days(date(2024, 1, 7), date(2024, 1, 13)).tolist(), [date(2024, 1, 7), date(2024, 1, 9), date(2024, 1, 11)])
+
+    def test_unreviewed_inferred_holidays_are_opt_in(self):
+        holidays = get_holidays(include_unreviewed=True)
+        self.assertFalse(is_trading_day(date(2024, 1, 9), holidays=holidays))
+        self.assertEqual(trading_days(date(2024, 1, 7), date(2024, 1, 13), holidays=holidays).tolist(), [date(2024, 1, 7), date(2024, 1, 11)])
+
+    def test_forecast_dates(self):
+        self.assertEqual(
+            [day.date() for day in next_trading_days(date(2024, 1, 7), periods=3)],
+            [date(2024, 1, 9), date(2024, 1, 11), date(2024, 1, 14)],
+        )
+
+    def test_tasks_skip_closed_days_only(self):
+        task = trading_days_only(lambda: 'ran')
+        for today, expected in ((date(2024, 1, 8), 'Skipped: market closed on 2024-01-08'), (date(2024, 1, 9), 'ran')):
+            with self.subTest(today=today), mock.patch('stocks.trading_calendar.nepal_today', return_value=today):
+                self.assertEqual(task(), expected)
+
+
+# ---------------------------------------------------------------------------
+# Backfill planning
+# ---------------------------------------------------------------------------
+
+class ChooseSourceTests(SimpleTestCase):
+    sources = {
+        'shallow': {'rows_per_page': 150, 'max_pages': 1, 'startup_seconds': 8, 'page_seconds': 3},
+        'paged': {'rows_per_page': 20, 'max_pages': None, 'startup_seconds': 6, 'page_seconds': 2},
+        'capped': {'rows_per_page': 10, 'max_pages': 5, 'startup_seconds': 1, 'page_seconds': 1},
+    }
+
+    def test_cheapest_source_that_reaches_the_gap(self):
+        self.assertEqual(choose_source(5, self.sources), ('capped', 1))        # 2s vs 8s paged, 11s shallow
+        self.assertEqual(choose_source(60, self.sources), ('shallow', 1))      # 11s vs 12s paged; capped can't reach
+        self.assertEqual(choose_source(400, self.sources), ('paged', 20))
+
+    def test_pages_round_up(self):
+        self.assertEqual(choose_source(21, {'paged': self.sources['paged']}), ('paged', 2))
+
+    def test_deepest_source_when_none_reaches(self):
+        sources = {name: spec for name, spec in self.sources.items() if name != 'paged'}
+        self.assertEqual(choose_source(1000, sources), ('shallow', 1))
+
+
+class GapRunTests(TestCase):
+    def test_unreviewed_holidays_stay_gaps_within_one_run(self):
+        company = CompanyProfile.objects.create(name='Nabil Bank Limited', symbol='NABIL')
+        MarketHoliday.objects.create(date=date(2024, 1, 8), description='Official')
+        MarketHoliday.objects.create(date=date(2024, 1, 10), inferred=True)
+        for day in (date(2024, 1, 7), date(2024, 1, 14), date(2024, 1, 16)):
+            PriceHistory.objects.create(company=company, date=day, open_price=500, high_price=500, low_price=500, close_price=500)
+        missing = find_gaps(end=date(2024, 1, 16))[company.id].missing
+        self.assertEqual(missing.tolist(), [date(2024, 1, 9), date(2024, 1, 10), date(2024, 1, 11), date(2024, 1, 15)])
+        self.assertEqual(gap_runs(missing), [
+            (date(2024, 1, 9), date(2024, 1, 11), 3),
+            (date(2024, 1, 15), date(2024, 1, 15), 1),
+        ])
+
+
+# ---------------------------------------------------------------------------
+# Technical indicators
+# ---------------------------------------------------------------------------
+
+class IndicatorUpdateTests(TestCase):
+    start = date(2024, 1, 1)
+
+    def setUp(self):
+        self.company = CompanyProfile.objects.create(name='Nabil Bank', symbol='NABIL')
+        self.closes = ar_series(length=300, seed=3)
+
+    def add_prices(self, first, last):
+        PriceHistory.objects.bulk_create(
+            PriceHistory(company=self.company, date=self.start + timedelta(days=i), open_price=round(close, 2),
+                         high_price=round(close, 2), low_price=round(close, 2), close_price=round(close, 2))
+            for i, close in enumerate(self.closes[first:last], start=first)
+        )
+
+    def stored(self):
+        rows = TechnicalIndicator.objects.filter(company=self.company).order_by('date')
+        return np.array(list(rows.values_list(*INDICATOR_FIELDS)), dtype=float)
+
+    def test_incremental_update_matches_full_recompute(self):
+        self.add_prices(0, 280)
+        refresh_indicators()
+        self.add_prices(280, 300)
+        update_indicators({self.company.id: self.start + timedelta(days=280)})
+        incremental = self.stored()
+
+        refresh_indicators()
+        full = self.stored()
+        self.assertEqual(incremental.shape, (300, len(INDICATOR_FIELDS)))
+        np.testing.assert_allclose(incremental, full, rtol=1e-6, atol=1e-6, equal_nan=True)
+
+    def test_warm_up_rows_are_not_rewritten(self):
+        self.add_prices(0, 280)
+        refresh_indicators()
+        before = dict(TechnicalIndicator.objects.filter(company=self.company).values_list('date', 'id'))
+        self.add_prices(280, 300)
+        update_indicators({self.company.id: self.start + timedelta(days=280)})
+        after = dict(TechnicalIndicator.objects.filter(company=self.company).values_list('date', 'id'))
+        self.assertEqual(len(after), 300)
+        self.assertTrue(all(after[day] == row_id for day, row_id in before.items()))
+
+
+# ---------------------------------------------------------------------------
+# Screener
+# ---------------------------------------------------------------------------
+
+class ScreenerEvaluateTests(SimpleTestCase):
+    def setUp(self):
+        self.snapshot = screener_snapshot()
+
+    def mask(self, expression):
+        return evaluate(expression, self.snapshot).tolist()
+
+    def test_comparisons_and_boolean_operators(self):
+        self.assertEqual(self.mask('rsi_14 < 30'), [True, False, False])
+        self.assertEqual(self.mask('sector == "Commercial Banks" and volume_ratio >= 2'), [True, False, False])
+        self.assertEqual(self.mask('rsi_14 < 30 or sector == "Hydro Power"'), [True, False, True])
+        self.assertEqual(self.mask('not volume_ratio > 1'), [False, True, False])
+
+    def test_chained_comparison_and_arithmetic(self):
+        self.assertEqual(self.mask('1 < volume_ratio <= 2.5'), [True, False, True])
+        self.assertEqual(self.mask('close * 2 - 1 > 2'), [False, True, True])
+
+    def test_in_literal_list(self):
+        self.assertEqual(self.mask('symbol in ["NABIL", "UPPER"]'), [True, False, True])
+        self.assertEqual(self.mask('symbol not in ["NABIL"]'), [False, True, True])
+
+    def test_nan_never_matches(self):
+        self.assertEqual(self.mask('rsi_14 >= 0'), [True, True, False])
+
+    def test_text_compared_with_number_is_a_query_error(self):
+        for expression in ('sector < 5', 'close > "a"', 'symbol + 1 > 2', '-sector == "a"', 'not symbol'):
+            with self.subTest(expression=expression), self.assertRaises(ScreenerQueryError):
+                evaluate(expression, self.snapshot)
+
+    def test_rejected_syntax(self):
+        for expression in ('__import__("os")', 'rsi_14.real > 1', 'rsi_14 <', 'company_id > 1', 'unknown > 1', 'rsi_14'):
+            with self.subTest(expression=expression), self.assertRaises(ScreenerQueryError):
+                evaluate(expression, self.snapshot)
+
+    def test_screen_sorts_nan_last(self):
+        total, rows = screen(sort='-rsi_14', snapshot=self.snapshot)
+        self.assertEqual(total, 3)
+        self.assertEqual([row['symbol'] for row in rows], ['NICA', 'NABIL', 'UPPER'])
+        self.assertIsNone(rows[-1]['rsi_14'])
+
+
+class ScreenerViewTests(SimpleTestCase):
+    def get(self, **params):
+        with mock.patch('stocks.screener.get_snapshot', return_value=screener_snapshot()):
+            return self.client.get('/screener/', params)
+
+    def test_type_mismatch_is_bad_request(self):
+        response = self.get(q='sector<5')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    def test_negated_text_is_bad_request(self):
+        self.assertEqual(self.get(q='-sector == "Hydro Power"').status_code, 400)
+
+    def test_limit_must_be_positive(self):
+        for limit in ('0', '-1', 'x'):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.get(limit=limit).status_code, 400)
+        self.assertEqual(len(self.get(limit='2').json()['results']), 2)
+
+    def test_matches(self):
+        response = self.get(q='rsi_14 < 30')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+
+
+# ---------------------------------------------------------------------------
+# Broker flows
+# ---------------------------------------------------------------------------
+
+class BrokerFlowTests(TestCase):
+    day = date(2024, 3, 4)
+
+    def setUp(self):
+        self.company = CompanyProfile.objects.create(name='Nabil Bank', symbol='NABIL')
+
+    def test_each_contract_counts_once_per_side(self):
+        contracts = pd.DataFrame(
+            [(1, self.day, 1, 2, 100.0, 1000.0), (1, self.day, 1, 3, 50.0, 520.0), (1, self.day, 3, 1, 20.0, 200.0)],
+            columns=['company_id', 'date', 'buyer', 'seller', 'quantity', 'amount'],
+        )
+        flows = compute_broker_flows(contracts).set_index('broker')
+        self.assertEqual(flows.loc[1, FLOW_FIELDS].tolist(), [150.0, 20.0, 1520.0, 200.0, 2, 1])
+        self.assertEqual(flows.loc[2, FLOW_FIELDS].tolist(), [0.0, 100.0, 0.0, 1000.0, 0, 1])
+        self.assertEqual(flows.loc[3, FLOW_FIELDS].tolist(), [20.0, 50.0, 200.0, 520.0, 1, 1])
+        for side in ('quantity', 'amount', 'trades'):
+            self.assertEqual(flows[f'buy_{side}'].sum(), flows[f'sell_{side}'].sum())
+
+    def test_contract_order_is_chosen_per_company(self):
+        contracts = pd.DataFrame(
+            [(1, self.day, '10', 1.0, 105.0, 105.0), (1, self.day, '9', 1.0, 100.0, 100.0),
+             (2, self.day, 'B-2', 1.0, 50.0, 50.0), (2, self.day, 'A-10', 1.0, 55.0, 55.0)],
+            columns=['company_id', 'date', 'transaction_id', 'quantity', 'rate', 'amount'],
+        )
+        rollups = compute_daily_rollups(contracts).set_index('company_id')
+        self.assertEqual(rollups.loc[1, ['first_rate', 'last_rate']].tolist(), [100.0, 105.0])
+        self.assertEqual(rollups.loc[2, ['first_rate', 'last_rate']].tolist(), [55.0, 50.0])
+
+    def test_incremental_update_matches_rebuild(self):
+        next_day = self.day + timedelta(days=1)
+        FloorSheet.objects.bulk_create([
+            contract(self.company, 1, self.day, 1, 2, 100, 10), contract(self.company, 2, self.day, 3, 1, 40, 10),
+        ])
+        refresh_broker_flows()
+        FloorSheet.objects.bulk_create([
+            contract(self.company, 3, self.day, 2, 3, 10, 11), contract(self.company, 4, next_day, 1, 3, 5, 12),
+        ])
+        update_broker_flows({self.company.id: {self.day, next_day}})
+        fields = ['date', 'broker'] + FLOW_FIELDS
+        incremental = sorted(BrokerDailyFlow.objects.values_list(*fields))
+        refresh_broker_flows()
+        self.assertEqual(incremental, sorted(BrokerDailyFlow.objects.values_list(*fields)))
+        self.assertEqual(len(incremental), 5)
+
+    def test_top_brokers_are_ranked_by_net_quantity(self):
+        FloorSheet.objects.bulk_create([
+            contract(self.company, 1, self.day, 1, 2, 100, 10), contract(self.company, 2, self.day, 3, 2, 40, 10),
+            contract(self.company, 3, self.day, 2, 4, 10, 10),
+        ])
+        refresh_broker_flows()
+        accumulators, distributors = top_brokers(company_id=self.company.id)
+        self.assertEqual([(row['broker'], row['net_quantity']) for row in accumulators], [(1, 100.0), (3, 40.0)])
+        self.assertEqual([(row['broker'], row['net_quantity']) for row in distributors], [(2, -130.0), (4, -10.0)])
+
+
+# ---------------------------------------------------------------------------
+# Daily floorsheet rollups
+# ---------------------------------------------------------------------------
+
+class DailyRollupTests(TestCase):
+    day = date(2024, 3, 4)
+
+    def setUp(self):
+        self.company = CompanyProfile.objects.create(name='Nabil Bank', symbol='NABIL')
+
+    def test_totals_and_first_last_in_contract_order(self):
+        contracts = pd.DataFrame(
+            [(1, self.day, '11', 10.0, 103.0, 1030.0), (1, self.day, '9', 30.0, 100.0, 3000.0),
+             (1, self.day, '10', 20.0, 105.0, 2100.0)],
+            columns=['company_id', 'date', 'transaction_id', 'quantity', 'rate', 'amount'],
+        )
+        [daily] = compute_daily_rollups(contracts).to_dict('records')
+        self.assertEqual(
+            {field: daily[field] for field in DAILY_FIELDS if field != 'vwap'},
+            {'total_quantity': 60.0, 'turnover': 6130.0, 'trade_count': 3,
+             'min_rate': 100.0, 'max_rate': 105.0, 'first_rate': 100.0, 'last_rate': 103.0},
+        )
+        self.assertAlmostEqual(daily['vwap'], 6130.0 / 60.0)
+
+    def test_contract_order_is_chosen_per_company(self):
+        contracts = pd.DataFrame(
+            [(1, self.day, '10', 1.0, 105.0, 105.0), (1, self.day, '9', 1.0, 100.0, 100.0),
+             (2, self.day, 'B-2', 1.0, 50.0, 50.0), (2, self.day, 'A-10', 1.0, 55.0, 55.0)],
+            columns=['company_id', 'date', 'transaction_id', 'quantity', 'rate', 'amount'],
+        )
+        rollups = compute_daily_rollups(contracts).set_index('company_id')
+        self.assertEqual(rollups.loc[1, ['first_rate', 'last_rate']].tolist(), [100.0, 105.0])
+        self.assertEqual(rollups.loc[2, ['first_rate', 'last_rate']].tolist(), [55.0, 50.0])
+
+    def test_incremental_update_matches_rebuild(self):
+        next_day = self.day + timedelta(days=1)
+        FloorSheet.objects.bulk_create([
+            contract(self.company, 1, self.day, 1, 2, 100, 10), contract(self.company, 2, self.day, 3, 1, 40, 12),
+        ])
+        refresh_daily_rollups()
+        FloorSheet.objects.bulk_create([
+            contract(self.company, 3, self.day, 2, 3, 10, 9), contract(self.company, 4, next_day, 1, 3, 5, 11),
+        ])
+        update_daily_rollups({self.company.id: {self.day, next_day}})
+        incremental = sorted(FloorSheetDaily.objects.values_list('date', *DAILY_FIELDS))
+        refresh_daily_rollups()
+        self.assertEqual(incremental, sorted(FloorSheetDaily.objects.values_list('date', *DAILY_FIELDS)))
+        self.assertEqual([row[3] for row in incremental], [1570.0, 55.0])
+
+    def test_price_history_mismatches_are_reported(self):
+        FloorSheet.objects.bulk_create([
+            contract(self.company, 1, self.day, 1, 2, 100, 10), contract(self.company, 2, self.day, 3, 1, 40, 12),
+        ])
+        refresh_daily_rollups()
+        PriceHistory.objects.create(company=self.company, date=self.day, open_price=10, high_price=12,
+                                    low_price=10, close_price=12)
+        self.assertTrue(compare_with_price_history().empty)
+        PriceHistory.objects.filter(company=self.company).update(close_price=13)
+        mismatches = compare_with_price_history()
+        self.assertEqual(len(mismatches), 1)
+        self.assertAlmostEqual(mismatches.loc[0, 'close_diff'], (12 - 13) / 13)
+
+
+# ---------------------------------------------------------------------------
+# Cross-source price reconciliation
+# ---------------------------------------------------------------------------
+
+def bar(day, close, **legs):
+    return {'date': day, 'open_price': close, 'high_price': close, 'low_price': close, 'close_price': close, **legs}
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.company = CompanyProfile.objects.create(name='Nabil Bank Limited', symbol='NABIL')
+        self.day = date(2024, 1, 2)
+
+    def flags(self):
+        return dict(PriceObservation.objects.filter(company=self.company).values_list('source', 'agrees_with_consensus'))
+
+    def stored_close(self):
+        return PriceHistory.objects.get(company=self.company, date=self.day).close_price
+
+    def test_majority_beats_priority(self):
+        ingest_price_observations(self.company, 'nepstock', [bar(self.day, 110)])
+        ingest_price_observations(self.company, 'sharesansar', [bar(self.day, 100)])
+        changed = ingest_price_observations(self.company, 'merolagani', [bar(self.day, 100.2)])
+
+        self.assertEqual(changed, [self.day])
+        self.assertEqual(self.stored_close(), 100)
+        self.assertEqual(self.flags(), {'nepstock': False, 'sharesansar': True, 'merolagani': True})
+
+    def test_two_conflicting_sources_go_to_priority(self):
+        ingest_price_observations(self.company, 'merolagani', [bar(self.day, 100)])
+        ingest_price_observations(self.company, 'nepstock', [bar(self.day, 110)])
+        result = reconcile({self.company.id: [self.day]})
+
+        self.assertEqual(self.stored_close(), 110)
+        self.assertEqual((result.compared, result.disputed), (1, 1))
+        self.assertEqual(self.flags(), {'nepstock': True, 'merolagani': False})
+
+    def test_single_source_over_existing_history(self):
+        PriceHistory.objects.create(company=self.company, date=self.day, open_price=100, high_price=100,
+                                    low_price=100, close_price=100)
+        ingest_price_observations(self.company, 'merolagani', [bar(self.day, 110)])
+
+        legacy = PriceObservation.objects.get(company=self.company, source='legacy')
+        self.assertEqual(legacy.close_price, 100)
+        self.assertEqual(self.flags(), {'merolagani': True, 'legacy': False})
+        self.assertEqual(reconcile({self.company.id: [self.day]}).disputed, 1)
+
+        # A second source siding with the stored row outvotes the first one.
+        ingest_price_observations(self.company, 'sharesansar', [bar(self.day, 100)])
+        self.assertEqual(self.stored_close(), 100)
+        self.assertEqual(PriceObservation.objects.filter(company=self.company, source='legacy').count(), 1)
+
+    def test_days_already_staged_get_no_legacy_row(self):
+        ingest_price_observations(self.company, 'nepstock', [bar(self.day, 100)])
+        ingest_price_observations(self.company, 'sharesansar', [bar(self.day, 100)])
+        self.assertFalse(PriceObservation.objects.filter(source='legacy').exists())
+
+
+class AgreementTests(SimpleTestCase):
+    def agreement(self, *rows):
+        values = np.array([rows], dtype=float)
+        return _agreement(values, np.ones(values.shape[:2], dtype=bool), 0.005)[0]
+
+    def test_leg_missing_on_one_side_is_skipped(self):
+        full = [100, 102, 99, 101]
+        no_open = [np.nan, 102, 99, 101]
+        self.assertTrue(self.agreement(full, no_open)[0, 1])
+        self.assertFalse(self.agreement(full, [np.nan, 102, 99, 110])[0, 1])
+
+    def test_no_leg_in_common(self):
+        self.assertFalse(self.agreement([100] + [np.nan] * (len(LEGS) - 1), [np.nan] * (len(LEGS) - 1) + [100])[0, 1])
+
+    def test_zero_prices_agree(self):
+        self.assertTrue(self.agreement([0, 0, 0, 0], [0, 0, 0, 0])[0, 1])
+
+
+# ---------------------------------------------------------------------------
+# Circuit breakers and failover
+# ---------------------------------------------------------------------------
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        clock = mock.patch('stocks.circuit_breaker.time')
+        self.clock = clock.start()
+        self.clock.time.return_value = 1000.0
+        self.addCleanup(clock.stop)
+
+    def breaker(self):
+        return CircuitBreaker('sharesansar', failure_threshold=3, cooldown=600, client=self.redis)
+
+    def trip(self, breaker):
+        for _ in range(3):
+            breaker.record_failure('timeout')
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = self.breaker()
+        self.assertEqual(breaker.record_failure('timeout'), CLOSED)
+        breaker.record_success()
+        self.assertEqual([breaker.record_failure('timeout') for _ in range(3)], [CLOSED, CLOSED, OPEN])
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.status()['retry_in'], 600)
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.clock.time.return_value += 601
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.status()['state'], HALF_OPEN)
+        self.assertFalse(self.breaker().allow())
+        breaker.record_success()
+        self.assertEqual(breaker.status()['state'], CLOSED)
+        self.assertTrue(self.breaker().allow())
+
+    def test_failed_trial_reopens(self):
+        breaker = self.breaker()
+        self.trip(breaker)
+        self.clock.time.return_value += 601
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.record_failure('timeout'), OPEN)
+        self.assertFalse(breaker.allow())
+        self.clock.time.return_value += 601
+        self.assertTrue(breaker.allow())
+
+
+class FailoverTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.saved = []
+        self.fetched = []
+
+    def source(self, name, data):
+        def fetch(symbol):
+            self.fetched.append(name)
+            if isinstance(data, Exception):
+                raise data
+            return data
+        return fetch, lambda symbol, rows: self.saved.append((name, rows))
+
+    def scrape(self, **sources):
+        datasets = {'price_history': {name: self.source(name, data) for name, data in sources.items()}}
+        with mock.patch('stocks.failover.DATASETS', datasets), \
+                mock.patch('stocks.circuit_breaker.get_redis', return_value=self.redis):
+            return scrape_with_failover('price_history', 'NABIL', 'sharesansar')
+
+    def test_falls_back_in_configured_order(self):
+        result = self.scrape(sharesansar=TimeoutError('timed out'), merolagani=[{'close': 1}], nepstock=[])
+        self.assertEqual(result, ('merolagani', [{'close': 1}]))
+        self.assertEqual(self.fetched, ['sharesansar', 'nepstock', 'merolagani'])
+        self.assertEqual(self.saved, [('merolagani', [{'close': 1}])])
+
+    def test_open_source_is_skipped(self):
+        for _ in range(3):
+            CircuitBreaker('sharesansar', client=self.redis).record_failure('timeout')
+        result = self.scrape(sharesansar=[{'close': 1}], nepstock=[{'close': 2}])
+        self.assertEqual(result, ('nepstock', [{'close': 2}]))
+        self.assertEqual(self.fetched, ['nepstock'])
+
+    def test_nothing_left(self):
+        self.assertEqual(self.scrape(sharesansar=[], nepstock=ValueError('bad page')), (None, []))
+        self.assertEqual(self.saved, [])
+
+
+# ---------------------------------------------------------------------------
+# Scrape run retries
+# ---------------------------------------------------------------------------
+
+class BackoffDelayTests(SimpleTestCase):
+    def test_doubles_per_attempt_with_equal_jitter(self):
+        for attempts, delay in ((1, 30), (2, 60), (3, 120)):
+            with self.subTest(attempts=attempts):
+                for _ in range(50):
+                    self.assertTrue(delay / 2 <= backoff_delay(attempts, base=30, cap=300) <= delay)
+
+    def test_capped(self):
+        for _ in range(50):
+            self.assertTrue(150 <= backoff_delay(10, base=30, cap=300) <= 300)
+
+    def test_jitter_spreads_retries(self):
+        self.assertGreater(len({backoff_delay(3, base=30, cap=300) for _ in range(20)}), 1)
+
+
+# ---------------------------------------------------------------------------
+# Scraping priority
+# ---------------------------------------------------------------------------
+
+class PriorityTests(TestCase):
+    def setUp(self):
+        day = last_complete_trading_day()
+        run = ScrapeRun.objects.create(task_name='scrape_floorsheet', dataset='floorsheet', source='sharesansar')
+        for symbol, turnover, trades in (('NABIL', 3e6, 300), ('NICA', 2e6, 200), ('UPPER', 1e6, 100)):
+            company = CompanyProfile.objects.create(name=symbol, symbol=symbol)
+            FloorSheetDaily.objects.create(
+                company=company, date=day, vwap=100, total_quantity=turnover / 100, turnover=turnover,
+                trade_count=trades, min_rate=100, max_rate=100, first_rate=100, last_rate=100,
+            )
+            ScrapeRunItem.objects.create(run=run, symbol=symbol, status='succeeded', finished_at=timezone.now())
+
+    def test_most_active_symbols_fill_the_budget(self):
+        self.assertEqual(select_symbols('floorsheet', budget=2), ['NABIL', 'NICA'])
+        scores = score_symbols('floorsheet')
+        np.testing.assert_allclose(scores['staleness'], 0.0, atol=1e-3)
+        self.assertTrue(scores['score'].is_monotonic_decreasing)
+
+    def test_never_scraped_symbol_outranks_quiet_fresh_ones(self):
+        CompanyProfile.objects.create(name='New Listing', symbol='NEW')
+        scores = score_symbols('floorsheet')
+        self.assertEqual(scores.loc[scores['symbol'] == 'NEW', 'staleness'].item(), 1.0)
+        self.assertEqual(select_symbols('floorsheet', budget=3), ['NABIL', 'NICA', 'NEW'])
+
+
+# ---------------------------------------------------------------------------
+# Scraping pipeline stages
+# ---------------------------------------------------------------------------
+
+class PipelineStageTests(TestCase):
+    raw = [
+        {'Transact. No.': '2024030401000001', 'Buyer': '58', 'Seller': '21', 'Quantity': '1,000',
+         'Rate': '512.5', 'Amount': '512,500', 'Date': '2024-03-04'},
+        {'Transact. No.': '2024030401000002', 'Buyer': '21', 'Seller': '34', 'Quantity': '20',
+         'Rate': '515', 'Amount': '10,300', 'Date': '2024-03-04'},
+    ]
+
+    def setUp(self):
+        self.company = CompanyProfile.objects.create(name='Nabil Bank', symbol='NABIL')
+
+    def through_queue(self, payload):
+        # Celery's JSON serializer turns dates into ISO strings between stages.
+        return json.loads(json.dumps(payload, default=str))
+
+    def test_parsed_rows_survive_the_queue_and_persist_once(self):
+        payload = {'dataset': 'floorsheet', 'symbol': 'NABIL', 'source': 'merolagani', 'raw': self.raw}
+        parsed = self.through_queue(parse(payload))
+        self.assertEqual(parsed['rows'][0]['quantity'], 1000.0)
+        self.assertEqual(persist(parsed), 2)
+        self.assertEqual(persist(parsed), 0)
+
+        self.assertEqual(FloorSheet.objects.filter(company=self.company, date=date(2024, 3, 4)).count(), 2)
+        daily = FloorSheetDaily.objects.get(company=self.company)
+        self.assertEqual((daily.trade_count, daily.turnover), (2, 522800.0))
+
+    def test_only_inserted_contracts_are_published_and_rolled_up(self):
+        rows = parse({'dataset': 'floorsheet', 'symbol': 'NABIL', 'source': 'merolagani', 'raw': self.raw})['rows']
+        aggregate = FloorSheet.objects.aggregate
+
+        def stored_by_another_worker(*args, **kwargs):
+            # The first contract lands after persist_floorsheet checked for it.
+            FloorSheet.objects.create(company=self.company, **rows[0])
+            return aggregate(*args, **kwargs)
+
+        with mock.patch.object(FloorSheet.objects, 'aggregate', side_effect=stored_by_another_worker), \
+                mock.patch('stocks.utility.publish') as publish_events, \
+                mock.patch('stocks.utility.after_floorsheet_ingest') as derived:
+            self.assertEqual(persist_floorsheet('NABIL', rows), 1)
+        events = publish_events.call_args.args[1]
+        self.assertEqual([event['transaction_id'] for event in events], [rows[1]['transaction_id']])
+        derived.assert_called_once_with(self.company, {date(2024, 3, 4)})
+
+    def test_nepstock_rows_before_the_open_belong_to_the_previous_session(self):
+        raw = [{'Contract No': '2024030501000001', 'Buyer No': '58', 'Seller No': '21', 'Quantity': '10',
+                'Rate': '512.5', 'Amount': '5,125'}]
+        for moment, session in [
+            (datetime(2024, 3, 5, 10, 30), date(2024, 3, 4)),   # Tuesday, before the open
+            (datetime(2024, 3, 5, 11, 0), date(2024, 3, 5)),
+            (datetime(2024, 3, 10, 9, 0), date(2024, 3, 7)),    # Sunday morning: Thursday's session
+        ]:
+            now = moment.replace(tzinfo=NEPSE_TIMEZONE)
+            with self.subTest(now=now), mock.patch('stocks.trading_calendar.timezone.now', return_value=now):
+                self.assertEqual(parse_floorsheet_nepstock(raw)[0]['date'], session)
+
+    def test_chain_routes_each_stage_to_its_queue(self):
+        chain = build_chain('floorsheet', 'sharesansar', 'NABIL')
+        queues = [STAGE_QUEUES[stage] for stage in ('fetch', 'parse', 'persist')]
+        self.assertEqual([task.options['queue'] for task in chain.tasks], queues)
+        self.assertEqual(chain.tasks[0].args[0]['symbol'], 'NABIL')
+
+
+# ---------------------------------------------------------------------------
+# Stage metrics
+# ---------------------------------------------------------------------------
+
+class PrometheusExportTests(TestCase):
+    def record(self, *seconds):
+        recorder = Recorder()
+        for value in seconds:
+            recorder.add('parse', 'merolagani', 'NABIL', value)
+        store(recorder)
+
+    def count(self):
+        line = next(line for line in prometheus_text().splitlines() if line.startswith('stocks_stage_seconds_count'))
+        return int(line.split()[-1])
+
+    def test_counters_survive_pruning(self):
+        self.record(0.2, 0.3)
+        StageMetric.objects.update(recorded_at=timezone.now() - timedelta(days=60))
+        self.record(0.1)
+        self.assertEqual(self.count(), 3)
+        self.assertEqual(prune(days=30), 1)
+        self.assertEqual(StageMetric.objects.count(), 1)
+        self.assertEqual(self.count(), 3)
+        self.assertIn('stocks_stage_seconds_bucket{stage="parse",source="merolagani",le="0.25"} 2', prometheus_text())
+
+
+# ---------------------------------------------------------------------------
+# Single-flight locks
+# ---------------------------------------------------------------------------
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.key = flight_key('sharesansar', 'floorsheet', 'NABIL')
+
+    def fly(self, func, **kwargs):
+        return single_flight('sharesansar', 'floorsheet', 'NABIL', func, client=self.redis, **kwargs)
+
+    def finish_leader(self, outcome):
+        self.redis.set(self.key, 'leader')
+        self.redis.set(f"{self.key}:result:leader", json.dumps(outcome))
+
+    def test_leader_runs_and_releases(self):
+        self.assertEqual(self.fly(lambda: {'rows': 3}), ({'rows': 3}, False))
+        self.assertIsNone(self.redis.get(self.key))
+
+    def test_follower_shares_the_leaders_result(self):
+        self.finish_leader({'result': {'rows': 3}})
+        func = mock.Mock()
+        self.assertEqual(self.fly(func), ({'rows': 3}, True))
+        func.assert_not_called()
+
+    def test_follower_sees_the_leaders_error(self):
+        self.finish_leader({'error': 'TimeoutError: page did not load'})
+        with self.assertRaisesMessage(FlightFailed, 'page did not load'):
+            self.fly(mock.Mock())
+
+    def test_follower_takes_over_from_a_crashed_holder(self):
+        self.redis.set(self.key, 'crashed', ex=60)
+        # The crashed holder's lock expires while the follower is polling.
+        with mock.patch('stocks.single_flight.time.sleep', side_effect=lambda seconds: self.redis.delete(self.key)):
+            self.assertEqual(self.fly(lambda: 'fresh'), ('fresh', False))
+
+    def test_no_wait_raises_in_flight(self):
+        self.redis.set(self.key, 'leader')
+        with self.assertRaises(InFlight):
+            self.fly(mock.Mock(), wait=0)
+
+
+# ---------------------------------------------------------------------------
+# On-demand scrape jobs
+# ---------------------------------------------------------------------------
+
+class FakeResult:
+    states = {}
+
+    def __init__(self, job_id):
+        self.state, self.info = self.states.get(job_id, ('PENDING', None))
+
+    def ready(self):
+        return self.state in ('SUCCESS', 'FAILURE', 'REVOKED')
+
+
+class JobTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.task = mock.Mock()
+        self.task.name = 'stocks.tasks.scrape_company_job'
+        FakeResult.states = {}
+        for patcher in (mock.patch('stocks.jobs.get_redis', return_value=self.redis),
+                        mock.patch('stocks.jobs.AsyncResult', FakeResult)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def enqueue(self, symbol='NABIL'):
+        return enqueue(self.task, {'symbol': symbol}, 'sharesansar', 'floorsheet', symbol)
+
+    def test_requests_for_a_running_job_are_coalesced(self):
+        job_id, coalesced = self.enqueue()
+        self.assertFalse(coalesced)
+        FakeResult.states[job_id] = ('PROGRESS', {'rows': 40})
+        self.assertEqual(self.enqueue(), (job_id, True))
+        self.task.apply_async.assert_called_once_with(kwargs={'symbol': 'NABIL'}, task_id=job_id)
+        self.assertNotEqual(self.enqueue('NICA')[0], job_id)
+
+    def test_finished_job_is_replaced(self):
+        first, _ = self.enqueue()
+        FakeResult.states[first] = ('SUCCESS', {'rows': 120})
+        second, coalesced = self.enqueue()
+        self.assertNotEqual(second, first)
+        self.assertFalse(coalesced)
+        self.assertEqual(self.enqueue(), (second, True))
+        self.assertEqual(self.task.apply_async.call_count, 2)
+
+    def test_finished_job_replaced_concurrently_is_joined(self):
+        first, _ = self.enqueue()
+        FakeResult.states[first] = ('SUCCESS', {'rows': 120})
+        ready = FakeResult.ready
+
+        def replaced_meanwhile(result):
+            # Another request swaps in its own job right after this one read the key.
+            self.redis.set('stocks:job:sharesansar:floorsheet:NABIL', 'other-job')
+            return ready(result)
+
+        with mock.patch.object(FakeResult, 'ready', replaced_meanwhile):
+            self.assertEqual(self.enqueue(), ('other-job', True))
+        self.assertEqual(self.task.apply_async.call_count, 1)
+
+    def test_status_reports_progress_and_result(self):
+        job_id, _ = self.enqueue()
+        self.assertEqual(job_status(job_id)['status'], 'queued')
+        FakeResult.states[job_id] = ('PROGRESS', {'rows': 40})
+        self.assertEqual((job_status(job_id)['status'], job_status(job_id)['rows']), ('running', 40))
+        FakeResult.states[job_id] = ('SUCCESS', {'rows': 120})
+        status = job_status(job_id)
+        self.assertEqual((status['status'], status['rows'], status['symbol']), ('done', 120, 'NABIL'))
+        self.assertIsNone(job_status('unknown'))
+
+    def test_queued_without_coalescing_when_redis_is_down(self):
+        self.redis.set = mock.Mock(side_effect=redis.ConnectionError('down'))
+        job_id, coalesced = self.enqueue()
+        self.assertFalse(coalesced)
+        self.task.apply_async.assert_called_once_with(kwargs={'symbol': 'NABIL'}, task_id=job_id)
+
+
+# ---------------------------------------------------------------------------
+# Live feed
+# ---------------------------------------------------------------------------
+
+class LiveFeedTests(TestCase):
+    def test_published_after_commit(self):
+        client = mock.Mock()
+        with mock.patch('stocks.live.get_redis', return_value=client):
+            with self.captureOnCommitCallbacks(execute=True):
+                publish('prices', [{'symbol': 'NABIL', 'date': date(2024, 3, 4), 'close': 512.5}])
+                publish('prices', [])
+                client.publish.assert_not_called()
+        client.publish.assert_called_once_with(
+            'stocks:live:prices', json.dumps([{'symbol': 'NABIL', 'date': '2024-03-04', 'close': 512.5}])
+        )
+
+    def test_subscription_filters_kinds_and_symbols(self):
+        subscription = Subscription(['prices'], ['NABIL'])
+        subscription.offer('floorsheet', [{'symbol': 'NABIL'}])
+        subscription.offer('prices', [{'symbol': 'NICA'}])
+        subscription.offer('prices', [{'symbol': 'NICA'}, {'symbol': 'NABIL'}])
+        self.assertEqual(subscription.queue.qsize(), 1)
+        self.assertEqual(subscription.queue.get_nowait(), ('prices', [{'symbol': 'NABIL'}]))
+
+    def test_broadcaster_fans_out_one_redis_subscription(self):
+        server = fakeredis.FakeServer()
+        client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+        async def scenario():
+            broadcaster = Broadcaster(client=client)
+            nabil = await broadcaster.subscribe(['prices'], ['NABIL'])
+            everything = await broadcaster.subscribe(['prices', 'news'], [])
+            while not await client.pubsub_numpat():
+                await asyncio.sleep(0.01)
+            fakeredis.FakeRedis(server=server).publish(
+                'stocks:live:prices', json.dumps([{'symbol': 'NICA'}, {'symbol': 'NABIL'}])
+            )
+            received = [await asyncio.wait_for(queue.get(), 5) for queue in (nabil.queue, everything.queue)]
+            broadcaster.unsubscribe(nabil)
+            broadcaster.unsubscribe(everything)
+            return received
+
+        self.assertEqual(asyncio.run(scenario()), [
+            ('prices', [{'symbol': 'NABIL'}]),
+            ('prices', [{'symbol': 'NICA'}, {'symbol': 'NABIL'}]),
+        ])
+
+    def test_event_format(self):
+        self.assertEqual(format_event('news', [{'id': 1}]), 'event: news\ndata: [{"id": 1}]\n\n')
+
+
+# ---------------------------------------------------------------------------
+# Intraday floorsheet tail
+# ---------------------------------------------------------------------------
+
+class FakeTailScraper:
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.calls = []
+
+    def tail_floorsheet(self, symbol, since=None):
+        self.calls.append(since)
+        return self.pages.pop(0)
+
+    def close(self):
+        pass
+
+
+class FloorsheetTailTests(TestCase):
+    session = date(2024, 3, 4)
+
+    def setUp(self):
+        self.company = CompanyProfile.objects.create(name='Nabil Bank', symbol='NABIL')
+
+    def rows(self, *numbers):
+        return [
+            {'transaction_id': str(number), 'buyer': 58, 'seller': 21, 'quantity': 10, 'rate': 500, 'amount': 5000,
+             'date': self.session}
+            for number in numbers
+        ]
+
+    def tail(self, *pages):
+        scraper = FakeTailScraper(pages)
+        _, save, key = TAIL_SOURCES['sharesansar']
+        patcher = mock.patch.dict(TAIL_SOURCES, {'sharesansar': (lambda: scraper, save, key)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return FloorsheetTail('sharesansar', ['NABIL']), scraper
+
+    def test_watermark_advances_with_each_poll(self):
+        tail, scraper = self.tail(self.rows(101, 103, 102), self.rows(105, 104), [])
+        self.assertEqual([tail.poll(self.company, self.session) for _ in range(3)], [3, 2, 0])
+        self.assertEqual(scraper.calls, [None, 103, 105])
+
+        watermark = FloorsheetWatermark.objects.get(company=self.company, source='sharesansar')
+        self.assertEqual((watermark.date, watermark.last_contract, watermark.contracts), (self.session, '105', 5))
+        self.assertIsNotNone(watermark.polled_at)
+        self.assertEqual(FloorSheet.objects.filter(company=self.company).count(), 5)
+
+    def test_contracts_stored_elsewhere_are_not_counted(self):
+        FloorSheet.objects.bulk_create(contract(self.company, number, self.session, 1, 2, 10, 500) for number in (101, 102))
+        tail, _ = self.tail(self.rows(103, 102, 101))
+        self.assertEqual(tail.poll(self.company, self.session), 1)
+
+        watermark = FloorsheetWatermark.objects.get(company=self.company, source='sharesansar')
+        self.assertEqual((watermark.last_contract, watermark.contracts), ('103', 3))  # 2 stored before + 1 new
+
+    def test_new_session_starts_from_stored_contracts(self):
+        FloorsheetWatermark.objects.create(
+            company=self.company, source='sharesansar', date=self.session - timedelta(days=1), last_contract='99', contracts=40,
+        )
+        FloorSheet.objects.bulk_create(contract(self.company, number, self.session, 1, 2, 10, 500) for number in (201, 207))
+        watermark = get_watermark(self.company, 'sharesansar', self.session)
+        self.assertEqual((watermark.date, watermark.last_contract, watermark.contracts), (self.session, '207', 2))
+
+
+# ---------------------------------------------------------------------------
+# News search
+# ---------------------------------------------------------------------------
+
+class NewsSearchTests(TestCase):
+    def setUp(self):
+        self.nabil = CompanyProfile.objects.create(name='Nabil Bank Limited', symbol='NABIL')
+        self.upper = CompanyProfile.objects.create(name='Upper Tamakoshi Hydropower', symbol='UPPER')
+
+    def article(self, n, title, body, company=None):
+        article = CompanyNews.objects.create(
+            company=company, news_url=f'https://example.com/{n}', news_title=title,
+            news_date=timezone.now() - timedelta(days=n), news_body=body,
+        )
+        link_articles([article], CompanyLinker([(self.nabil.id, 'NABIL', self.nabil.name), (self.upper.id, 'UPPER', self.upper.name)]))
+        return article
+
+    def ids(self, query, **kwargs):
+        return [result['id'] for result in search_news(query, **kwargs)[1]]
+
+    def test_title_hits_rank_above_body_hits(self):
+        in_body = self.article(1, 'Board meeting held', 'The board approved a cash dividend for shareholders.')
+        in_title = self.article(2, 'Cash dividend approved', 'The board met on Sunday.')
+        self.article(3, 'Rights issue', 'Nothing about payouts.')
+        self.assertEqual(search_news('dividend')[0], 2)
+        self.assertEqual(self.ids('dividends'), [in_title.id, in_body.id])
+
+    def test_last_word_is_a_prefix_and_operators_are_plain_words(self):
+        article = self.article(1, 'NABIL dividend', 'Bonus shares too.')
+        self.assertEqual(self.ids('nabil divid'), [article.id])
+        self.assertEqual(self.ids('nabil OR "bonus'), [])
+        self.assertEqual(search_news('!!!'), (0, []))
+
+    def test_snippets_mark_matches_and_escape_markup(self):
+        self.article(1, 'Results', 'Profit <b>rose</b> and a dividend was declared.')
+        [result] = search_news('dividend')[1]
+        self.assertIn('<mark>dividend</mark>', result['snippet'])
+        self.assertIn('&lt;b&gt;rose&lt;/b&gt;', result['snippet'])
+
+    def test_edits_are_reindexed(self):
+        article = self.article(1, 'Bonus shares approved', 'The board approved a hydropower dividend.')
+        article.news_title = 'Rights issue approved'
+        article.save()
+        self.assertEqual(self.ids('bonus'), [])
+        self.assertEqual(self.ids('rights'), [article.id])
+        article.news_body = 'Merger talks continue.'
+        article.save()
+        self.assertEqual(self.ids('dividend'), [])
+        self.assertEqual(self.ids('merger'), [article.id])
+        article.delete()
+        self.assertEqual(search_news('merger'), (0, []))
+
+    def test_endpoint(self):
+        article = self.article(1, 'UPPER dividend', 'Cash dividend announced.', company=self.upper)
+        response = self.client.get('/news/search/', {'q': 'dividend'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['id'] for result in response.json()['results']], [article.id])
+        self.assertEqual(self.client.get('/news/search/').status_code, 400)
+        self.assertEqual(self.client.get('/news/search/', {'q': 'dividend', 'symbol': 'NOPE'}).status_code, 404)
+
+    def test_near_duplicates_are_left_out(self):
+        original = self.article(2, 'UPPER dividend', STORY)
+        copy = self.article(1, 'UPPER dividend (repost)', STORY + ' Shared by another portal.')
+        self.assertEqual(mark_duplicate(original), None)
+        self.assertEqual(mark_duplicate(copy), original.id)
+        self.assertEqual(search_news('dividend')[0], 1)
+        self.assertEqual(self.ids('dividend'), [original.id])
+
+    def test_find_canonical_stays_within_window(self):
+        original = self.article(30, 'UPPER dividend', STORY)
+        mark_duplicate(original)
+        copy = self.article(1, 'UPPER dividend', STORY)
+        self.assertIsNone(find_canonical(copy, signature(copy.news_title, copy.news_body)))
+        recent = self.article(29, 'UPPER dividend', STORY)
+        self.assertEqual(find_canonical(recent, signature(recent.news_title, recent.news_body)), original.id)
+
+    def test_company_filter_uses_mentions(self):
+        about_upper = self.article(1, 'UPPER declares dividend', 'Cash dividend announced.', company=self.upper)
+        mentions_both = self.article(2, 'Dividend season', 'NABIL and UPPER both announced a dividend.', company=self.upper)
+        self.assertCountEqual(self.ids('dividend'), [about_upper.id, mentions_both.id])
+        self.assertEqual(self.ids('dividend', company_id=self.nabil.id), [mentions_both.id])
+
+
+# ---------------------------------------------------------------------------
+# News entity linking
+# ---------------------------------------------------------------------------
+
+class AutomatonTests(SimpleTestCase):
+    def test_overlapping_patterns(self):
+        automaton = Automaton()
+        for pattern in ('he', 'she', 'his', 'hers'):
+            automaton.add(pattern, pattern)
+        automaton.build()
+        self.assertEqual(
+            list(automaton.iter('ushers')),
+            [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')],
+        )
+
+    def test_no_match(self):
+        automaton = Automaton()
+        automaton.add('abc', 1)
+        self.assertEqual(list(automaton.build().iter('abxabd')), [])
+
+
+class CompanyLinkerTests(SimpleTestCase):
+    companies = [
+        (1, 'NABIL', 'Nabil Bank Limited'),
+        (2, 'NLIC', 'Nepal Life Insurance Company Ltd.'),
+        (3, 'NLI', 'Nepal Life Insurance'),
+        (4, 'ADBL', 'Agricultural Development Bank Limited'),
+        (5, 'ADBL', 'Some Other Listing'),
+    ]
+
+    def setUp(self):
+        self.linker = CompanyLinker(self.companies)
+
+    def test_symbols_are_upper_case_whole_words(self):
+        self.assertEqual(self.linker.link('NABIL dividend', ''), {1: (1, True)})
+        self.assertEqual(self.linker.link('nabil dividend', ''), {})
+        self.assertEqual(self.linker.link('NABILX rights', ''), {})
+
+    def test_names_without_suffix_case_insensitive(self):
+        self.assertEqual(self.linker.link('', 'Profit at nabil bank rose.'), {1: (1, False)})
+
+    def test_longest_name_wins(self):
+        self.assertEqual(self.linker.link('Nepal Life Insurance Company AGM', ''), {2: (1, True)})
+
+    def test_ambiguous_symbols_are_dropped(self):
+        self.assertEqual(self.linker.link('ADBL', 'Agricultural Development Bank and NABIL'), {4: (1, False), 1: (1, False)})
+
+
+# ---------------------------------------------------------------------------
+# News deduplication
+# ---------------------------------------------------------------------------
+
+class SignatureTests(SimpleTestCase):
+    def test_short_text_is_not_signed(self):
+        self.assertIsNone(signature('Short', ' '.join(['word'] * (MIN_TOKENS - 2))))
+
+    def test_similarity_tracks_overlap(self):
+        original = signature('Dividend', STORY)
+        self.assertEqual(similarity(original, signature('dividend', STORY.upper())), 1.0)
+        self.assertGreater(similarity(original, signature('Dividend', STORY + ' Shared by another portal.')), 0.6)
+        self.assertLess(similarity(original, signature('Rights', ' '.join(reversed(STORY.split())))), 0.2)
+
+
+# ---------------------------------------------------------------------------
+# Columnar store
+# ---------------------------------------------------------------------------
+
+class ColumnarStoreTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(columnar, 'STORE_PATH', Path(directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        columnar._cache.clear()
+        self.company = CompanyProfile.objects.create(name='Nabil Bank Limited', symbol='NABIL')
+        for day, close in ((date(2023, 12, 29), 500), (date(2024, 1, 2), 510), (date(2024, 1, 1), 505)):
+            self.price(day, close)
+
+    def price(self, day, close):
+        PriceHistory.objects.create(company=self.company, date=day, open_price=close, high_price=close, low_price=close, close_price=close)
+
+    def test_refresh_and_read(self):
+        self.assertEqual(columnar.refresh('prices', self.company), 2)
+        self.assertEqual([name for name, _ in columnar.partitions('prices', 'NABIL')], ['2023', '2024'])
+        closes = columnar.read('prices', 'NABIL', columns=['close'])['close']
+        self.assertEqual(closes.tolist(), [500, 505, 510])
+        self.assertFalse(closes.flags.writeable)
+
+        one_year = columnar.read('prices', 'NABIL', start='2024-01-02', end='2024-12-31')
+        self.assertIsInstance(one_year['close'].base, np.memmap)
+        self.assertEqual(one_year['date'].tolist(), [date(2024, 1, 2)])
+        self.assertEqual(len(columnar.read('prices', 'NABIL', start='2025-01-01')['close']), 0)
+
+    def test_update_store_rewrites_touched_partitions_only(self):
+        self.assertEqual(columnar.update_store('prices', self.company, {date(2024, 1, 3)}), 0)  # no store yet
+        columnar.refresh('prices', self.company)
+        manifest = lambda: columnar._read_manifest(columnar._symbol_dir('prices', 'NABIL'))['partitions']
+        before = manifest()
+        self.price(date(2024, 1, 3), 520)
+        self.assertEqual(columnar.update_store('prices', self.company, {date(2024, 1, 3)}), 1)
+        self.assertEqual(dict(columnar.partitions('prices', 'NABIL'))['2024']['close'].tolist(), [505, 510, 520])
+        self.assertEqual(manifest()['2023'], before['2023'])
+        self.assertNotEqual(manifest()['2024'], before['2024'])
+
+    def test_load_builds_an_empty_store_once(self):
+        company = CompanyProfile.objects.create(name='Upper Tamakoshi Hydropower', symbol='UPPER')
+        self.assertEqual(len(columnar.load('prices', company, columns=['close'])['close']), 0)
+        with self.assertNumQueries(0):
+            columnar.load('prices', company, columns=['close'])
+
+
+# ---------------------------------------------------------------------------
+# Fixed-point loader
+# ---------------------------------------------------------------------------
+
+class FixedPointLoadTests(TestCase):
+    def setUp(self):
+        self.nabil = CompanyProfile.objects.create(name='Nabil Bank Limited', symbol='NABIL')
+        self.upper = CompanyProfile.objects.create(name='Upper Tamakoshi Hydropower', symbol='UPPER')
+        for company, day, rate in ((self.nabil, date(2024, 1, 2), '512.35'), (self.nabil, date(2024, 1, 1), '0.07'),
+                                   (self.upper, date(2024, 1, 1), '199.99')):
+            FloorSheet.objects.create(
+                company=company, transaction_id=f'{company.symbol}{day:%d}', buyer=1, seller=2,
+                quantity='10.50', rate=rate, amount='1.01', date=day,
+            )
+
+    def test_exact_paisa_and_dates(self):
+        columns = fixed_point.load('floorsheet', company_ids=[np.int64(self.nabil.id)], fields=['rate', 'quantity'], ordered=True)
+        self.assertEqual(sorted(columns), ['company_id', 'date', 'quantity', 'rate'])
+        self.assertEqual(columns['rate'].dtype, np.int64)
+        self.assertEqual(columns['rate'].tolist(), [7, 51235])
+        self.assertEqual(columns['quantity'].tolist(), [1050, 1050])
+        self.assertEqual(columns['date'].tolist(), [date(2024, 1, 1), date(2024, 1, 2)])
+        self.assertEqual(fixed_point.to_rupees(columns['rate']).tolist(), [0.07, 512.35])
+
+    def test_filters(self):
+        self.assertEqual(len(fixed_point.load('floorsheet')['rate']), 3)
+        self.assertEqual(fixed_point.load('floorsheet', start=date(2024, 1, 2))['rate'].tolist(), [51235])
+        self.assertEqual(fixed_point.load('floorsheet', end=date(2024, 1, 1), company_ids=[self.upper.id])['rate'].tolist(), [19999])
+        empty = fixed_point.load('floorsheet', company_ids=[])
+        self.assertEqual(len(empty['rate']), 0)
+        self.assertEqual(empty['date'].dtype, np.dtype('datetime64[D]'))
+
+    def test_unsupported_backend(self):
+        with mock.patch.object(fixed_point.connection, 'vendor', 'oracle'), self.assertRaises(NotImplementedError):
+            fixed_point.load('prices')
+
+
+# ---------------------------------------------------------------------------
+# Price reconciliation
+# ---------------------------------------------------------------------------
+
+class AfterReconcileTests(TestCase):
+    def test_refreshes_everything_derived_from_prices(self):
+        company = CompanyProfile.objects.create(name='Nabil Bank Limited', symbol='NABIL')
+        changed = {company.id: [date(2024, 1, 3), date(2024, 1, 2)]}
+        with mock.patch('stocks.utility.update_indicators') as indicators, \
+                mock.patch('stocks.utility.update_store') as store, mock.patch('stocks.utility.invalidate') as invalidate:
+            after_reconcile(changed)
+        indicators.assert_called_once_with({company.id: date(2024, 1, 2)})
+        store.assert_called_once_with('prices', company, changed[company.id])
+        invalidate.assert_called_once_with('prices', changed)
+
+    def test_nothing_changed(self):
+        with mock.patch('stocks.utility.invalidate') as invalidate:
+            after_reconcile({})
+        invalidate.assert_not_called()
@@ -0,0 +1,181 @@
+import functools
+from datetime import date as date_cls, time as time_cls, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import MarketHoliday, PriceHistory
+
+import logging
+logger = logging.getLogger('stocks')
+
+# NEPSE trades Sunday to Thursday; Friday and Saturday are the weekend.
+WEEKMASK = 'Sun Mon Tue Wed Thu'
+NEPSE_TIMEZONE = ZoneInfo('Asia/Kathmandu')
+# Continuous trading session, Kathmandu time.
+MARKET_OPEN = time_cls(11, 0)
+MARKET_CLOSE = time_cls(15, 0)
+# A day with no data is only inferred to be a holiday when at least this many
+# companies have prices on the trading days either side of it, i.e. the
+# market was being scraped around it.
+HOLIDAY_MIN_COMPANIES = getattr(settings, 'HOLIDAY_INFERENCE_MIN_COMPANIES', 10)
+
+
+def nepal_today():
+    """
+    Current date in Kathmandu, which is what decides whether the market is open.
+    """
+    return timezone.localdate(timezone=NEPSE_TIMEZONE)
+
+
+def get_holidays(start=None, end=None, include_unreviewed=False):
+    """
+    Holiday dates from the MarketHoliday table as a datetime64[D] array:
+    manually entered ones and inferred ones someone has reviewed. An
+    unreviewed inferred holiday may just be a failed market-wide scrape, so
+    it is only included with `include_unreviewed`. Every calendar function
+    below defaults to this list; pass `holidays=` to use another.
+    """
+    qs = MarketHoliday.objects.all()
+    if not include_unreviewed:
+        qs = qs.exclude(inferred=True, reviewed=False)
+    if start is not None:
+        qs = qs.filter(date__gte=pd.Timestamp(start).date())
+    if end is not None:
+        qs = qs.filter(date__lte=pd.Timestamp(end).date())
+    return np.array(list(qs.values_list('date', flat=True)), dtype='datetime64[D]')
+
+
+def is_trading_day(day=None, holidays=None):
+    day = day or nepal_today()
+    if holidays is None:
+        holidays = get_holidays(day, day)
+    return bool(np.is_busday(np.datetime64(day, 'D'), weekmask=WEEKMASK, holidays=holidays))
+
+
+def is_market_open(now=None, holidays=None):
+    """
+    Whether NEPSE's trading session is running at `now` (default: current time).
+    """
+    now = (now or timezone.now()).astimezone(NEPSE_TIMEZONE)
+    return MARKET_OPEN <= now.time() < MARKET_CLOSE and is_trading_day(now.date(), holidays)
+
+
+def trading_days(start, end, holidays=None):
+    """
+    All NEPSE trading days between start and end (inclusive) as datetime64[D].
+    """
+    if holidays is None:
+        holidays = get_holidays(start, end)
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    return days[np.is_busday(days, weekmask=WEEKMASK, holidays=holidays)]
+
+
+def latest_trading_day(day=None, holidays=None):
+    """
+    `day` (today in Kathmandu by default) if the market trades on it,
+    otherwise the trading day before it.
+    """
+    day = day or nepal_today()
+    if holidays is None:
+        holidays = get_holidays(end=day)
+    latest = np.busday_offset(np.datetime64(day, 'D'), 0, roll='backward', weekmask=WEEKMASK, holidays=holidays)
+    return latest.astype(date_cls)
+
+
+def latest_session(now=None, holidays=None):
+    """
+    The trading day of the most recent session that has opened by `now`
+    (default: current time). Before the open that is the previous trading
+    day, not today.
+    """
+    now = (now or timezone.now()).astimezone(NEPSE_TIMEZONE)
+    day = now.date() if now.time() >= MARKET_OPEN else now.date() - timedelta(days=1)
+    return latest_trading_day(day, holidays)
+
+
+def trading_day_index(start, end, holidays=None):
+    """
+    Same as trading_days, as a pandas DatetimeIndex for reindexing series.
+    """
+    return pd.DatetimeIndex(trading_days(start, end, holidays=holidays))
+
+
+def trading_day_offset(holidays=None):
+    """
+    A pandas offset that steps over weekends and known holidays.
+    """
+    if holidays is None:
+        holidays = get_holidays()
+    return pd.offsets.CustomBusinessDay(weekmask=WEEKMASK, holidays=list(holidays))
+
+
+def next_trading_days(after, periods, holidays=None):
+    """
+    The `periods` trading days following `after`, as a DatetimeIndex.
+    """
+    if holidays is None:
+        holidays = get_holidays(start=after)
+    offset = trading_day_offset(holidays)
+    return pd.date_range(start=pd.Timestamp(after) + offset, periods=periods, freq=offset)
+
+
+def infer_holidays(dry_run=False, min_companies=None):
+    """
+    Mark Sunday-Thursday dates with no PriceHistory rows for any company as
+    inferred holidays, within the span of dates we have data for, provided
+    at least `min_companies` (HOLIDAY_MIN_COMPANIES) companies have prices on
+    the trading days before and after. They still await review in the admin:
+    until then the gap planner keeps treating them as days to backfill.
+
+    Inferred holidays that have since gained price data are removed again.
+    Manually entered holidays are never touched.
+    Returns (added_dates, removed_dates).
+    """
+    min_companies = HOLIDAY_MIN_COMPANIES if min_companies is None else min_companies
+    counts = list(
+        PriceHistory.objects.values('date').annotate(companies=Count('company_id'))
+        .order_by('date').values_list('date', 'companies')
+    )
+    if not counts:
+        return [], []
+    seen = np.array([day for day, _ in counts], dtype='datetime64[D]')
+    covered = np.array([companies for _, companies in counts]) >= min_companies
+
+    weekdays = trading_days(seen.min(), seen.max(), holidays=[])
+    missing = np.setdiff1d(weekdays, seen)
+    # seen[after - 1] and seen[after] are the days with data either side.
+    after = np.searchsorted(seen, missing)
+    missing = missing[covered[after - 1] & covered[after]]
+
+    existing = set(MarketHoliday.objects.values_list('date', flat=True))
+    added = [day for day in missing.astype(date_cls).tolist() if day not in existing]
+    stale = MarketHoliday.objects.filter(inferred=True, date__in=seen.astype(date_cls).tolist())
+    removed = list(stale.values_list('date', flat=True))
+
+    if not dry_run:
+        MarketHoliday.objects.bulk_create(
+            [MarketHoliday(date=day, description="Inferred: no trading data", inferred=True) for day in added],
+            ignore_conflicts=True,
+        )
+        stale.delete()
+    logger.info(f"Trading calendar: {len(added)} holidays inferred, {len(removed)} stale removed")
+    return added, removed
+
+
+def trading_days_only(task_func):
+    """
+    Decorator for scraping tasks: return early when NEPSE is closed today.
+    """
+    @functools.wraps(task_func)
+    def wrapper(*args, **kwargs):
+        today = nepal_today()
+        if not is_trading_day(today):
+            logger.info(f"Market closed on {today}, skipping {task_func.__name__}")
+            return f"Skipped: market closed on {today}"
+        return task_func(*args, **kwargs)
+    return wrapper
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     # Other URL patterns...
     path('', views.company_list, name='company_list'),
+    path('screener/', views.screener, name='screener'),
     path('predict-future-prices/<int:id>/', views.predict_future_prices, name='predict_future_prices'),
     
     path('company/<int:id>/', views.company_detail, name='company_detail'),
@@ -11,8 +12,10 @@ urlpatterns = [
     path('companies/create/', views.company_create, name='company_create'),
 
     path('company/<int:id>/price-history/', views.price_history, name='price_history'),
+    path('company/<int:id>/indicators/', views.company_indicators, name='company_indicators'),
     path('news/', views.company_news_list, name='company_news_list'),
     path('news/add/', views.add_company_news, name='add_company_news'),
+    path('news/search/', views.news_search, name='news_search'),
     path('news/<int:news_id>/', views.company_news_detail, name='company_news_detail'),
 
     path('prices/', views.price_history_list, name='price_history_list'),
@@ -21,8 +24,14 @@ urlpatterns = [
     path('scrape-company-sharesansar/<int:id>/', views.scrape_sharesansar_pricehistory, name='scrape_price_sharesansar'),
     path('scrape-company-nepstock/<int:id>/', views.scrape_nepstock_pricehistory, name='scrape_price_nepstock'),
     path('scrape-company-merolagani/<int:id>/', views.scrpae_merolagani_pricehistory, name='scrape_price_merolagani'),
+    path('sources/status/', views.source_status, name='source_status'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
+    path('live/', views.live_feed, name='live_feed'),
+    path('metrics/', views.stage_metrics, name='stage_metrics'),
 
     path('floorsheet/<int:id>', views.list_floorsheet, name='floorsheet_list'),
+    path('floorsheet/<int:id>/brokers', views.broker_flows, name='broker_flows'),
+    path('floorsheet/<int:id>/daily', views.floorsheet_daily, name='floorsheet_daily'),
     path('empty-floorsheet/<int:id>', views.empty_floorsheet, name='empty_floorsheet'),
     path('floorsheet/<int:id>/scrape-ss', views.scrape_floorsheet_ss, name='scrape_floorsheet_ss'),
     path('floorsheet/<int:id>/scrape-ns', views.scrape_floorsheet_nepstock, name='scrape_floorsheet_ns'),
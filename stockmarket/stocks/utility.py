@@ -2,7 +2,19 @@ from datetime import datetime
 from stocks.models import CompanyProfile, PriceHistory, FloorSheet, CompanyNews
 from django.utils import timezone
 from dateutil.parser import parse as parse_datetime
+from django.db import transaction
 from django.db.models import Max
+from .indicators import update_indicators
+from .brokers import update_broker_flows
+from .rollups import update_daily_rollups
+from .columnar import update_store
+from .reconciliation import ingest_price_observations
+from .trading_calendar import latest_session
+from .metrics import timed
+from .live import publish, price_event, floorsheet_event, news_event
+from .entity_linking import link_articles
+from .news_dedup import mark_duplicate
+from .view_cache import invalidate
 import logging
 
 logger = logging.getLogger("stocks")
@@ -12,12 +24,23 @@ def save_price_history_to_db(symbol, price_history_data):
     Save standardized price history data to the Django DB.
     Supports NepalStock format
     """
-    try:
-        company = CompanyProfile.objects.get(symbol=symbol)
-    except CompanyProfile.DoesNotExist:
-        logger.warning(f"🚫 Company '{symbol}' not found in DB.")
-        return
+    persist_price_history(symbol, "nepstock", parse_price_history(price_history_data))
 
+def save_price_history_to_db_ml(symbol, price_history_data):
+    """
+    Save Merolagani price history data to the Django DB.
+    """
+    persist_price_history(symbol, "merolagani", parse_price_history_ml(price_history_data))
+
+def save_price_history_to_db_ss(symbol, price_history_data):
+    persist_price_history(symbol, "sharesansar", parse_price_history_ss(price_history_data))
+
+@timed('parse')
+def parse_price_history(price_history_data):
+    """
+    NepalStock rows -> observation dicts (date, open/high/low/close floats).
+    """
+    observations = []
     for record in price_history_data:
         try:
             date_str = record.get("Date")
@@ -30,30 +53,131 @@ def save_price_history_to_db(symbol, price_history_data):
                 logger.warning(f"⚠️ Could not parse date: {date_str}")
                 continue
 
-            # Avoid duplicates
-            if PriceHistory.objects.filter(company=company, date=date_obj).exists():
-                logger.info(f"🟡 Already exists: {symbol} - {date_str}")
-                continue
-
             # Normalize keys from different scrapers
             open_price = record.get("Open") or record.get("Open Price")
             high_price = record.get("High")
             low_price = record.get("Low")
             close_price = record.get("Close") or record.get("LTP")
 
-            price_entry = PriceHistory(
-                company=company,
-                date=date_obj,
-                open_price=safe_float(open_price),
-                high_price=safe_float(high_price),
-                low_price=safe_float(low_price),
-                close_price=safe_float(close_price)
-            )
-            price_entry.save()
-            # logger.info(f" Saved: {symbol} - {date_obj}")
+            observations.append({
+                "date": date_obj,
+                "open_price": safe_float(open_price),
+                "high_price": safe_float(high_price),
+                "low_price": safe_float(low_price),
+                "close_price": safe_float(close_price),
+            })
 
         except Exception as e:
-            logger.error(f" Error saving record: {record}, Error: {e}")
+            logger.error(f" Error parsing record: {record}, Error: {e}")
+    return observations
+
+@timed('parse')
+def parse_price_history_ml(price_history_data):
+    observations = []
+    for record in price_history_data:
+        try:
+            date_str = record["Date"].replace("/", "-")  # Convert format to YYYY-MM-DD
+            observations.append({
+                "date": datetime.strptime(date_str, "%Y-%m-%d").date(),
+                "open_price": float(record["Open"].replace(",", "")),
+                "high_price": float(record["High"].replace(",", "")),
+                "low_price": float(record["Low"].replace(",", "")),
+                "close_price": float(record["LTP"].replace(",", "")),
+            })
+        except Exception as e:
+            logger.error(f" Failed to parse record: {record}")
+    return observations
+
+@timed('parse')
+def parse_price_history_ss(price_history_data):
+    observations = []
+    for record in price_history_data:
+        try:
+            observations.append({
+                "date": datetime.strptime(record["Date"], "%Y-%m-%d").date(),
+                "open_price": float(record["Open"].replace(",", "")),
+                "high_price": float(record["High"].replace(",", "")),
+                "low_price": float(record["Low"].replace(",", "")),
+                "close_price": float(record["Close"].replace(",", ""))
+            })
+        except Exception as e:
+            logger.error(f" Failed to parse record: {record}")
+    return observations
+
+@timed('persist')
+def persist_price_history(symbol, source, observations):
+    """
+    Stage one source's parsed rows and write the reconciled PriceHistory.
+    """
+    try:
+        company = CompanyProfile.objects.get(symbol=symbol)
+    except CompanyProfile.DoesNotExist:
+        logger.warning(f"🚫 Company '{symbol}' not found in DB.")
+        return
+    for observation in observations:
+        observation["date"] = to_date(observation["date"])
+    try:
+        changed_dates = ingest_price_observations(company, source, observations)
+    except Exception as e:
+        logger.error(f"Failed to save {source} price history for {symbol}: {e}")
+        return
+    if changed_dates:
+        rows = PriceHistory.objects.filter(company=company, date__in=changed_dates).order_by("date")
+        publish("prices", [price_event(row, symbol) for row in rows])
+    after_price_ingest(company, changed_dates)
+
+@timed('derived')
+def after_price_ingest(company, new_dates):
+    """
+    Refresh data derived from PriceHistory once a saver has added or corrected rows.
+    """
+    if not new_dates:
+        return
+    try:
+        update_indicators({company.id: min(new_dates)})
+    except Exception as e:
+        logger.error(f"Failed to update indicators for {company.symbol}: {e}")
+    try:
+        update_store("prices", company, new_dates)
+    except Exception as e:
+        logger.error(f"Failed to update the columnar price store for {company.symbol}: {e}")
+    invalidate("prices", [company.id])
+
+@timed('derived')
+def after_reconcile(changed):
+    """
+    Refresh data derived from PriceHistory once reconciliation has rewritten
+    rows ({company_id: dates}); shared by the Celery task and reconcile_prices.
+    """
+    if not changed:
+        return
+    try:
+        update_indicators({company_id: min(dates) for company_id, dates in changed.items()})
+    except Exception as e:
+        logger.error(f"Failed to update indicators after reconciliation: {e}")
+    for company in CompanyProfile.objects.filter(id__in=changed):
+        try:
+            update_store("prices", company, changed[company.id])
+        except Exception as e:
+            logger.error(f"Failed to update the columnar price store for {company.symbol}: {e}")
+    invalidate("prices", changed)
+
+@timed('derived')
+def after_floorsheet_ingest(company, new_dates):
+    """
+    Refresh data derived from FloorSheet for the days that received new contracts.
+    """
+    if not new_dates:
+        return
+    try:
+        update_daily_rollups({company.id: new_dates})
+    except Exception as e:
+        logger.error(f"Failed to update floorsheet rollups for {company.symbol}: {e}")
+    try:
+        update_broker_flows({company.id: new_dates})
+    except Exception as e:
+        logger.error(f"Failed to update broker flows for {company.symbol}: {e}")
+    invalidate("floorsheet", [company.id])
 
 def try_parse_date(date_str):
     """
@@ -67,132 +191,150 @@ def try_parse_date(date_str):
             continue
     return None
 
-def save_price_history_to_db_ml(symbol, price_history_data):
+
+def to_date(value):
     """
-    Save Merolagani price history data to the Django DB.
+    Dates come back as ISO strings when a parsed payload has crossed a queue.
     """
-    try:
-        company = CompanyProfile.objects.get(symbol=symbol)
-    except CompanyProfile.DoesNotExist:
-        logger.error(f" Company with symbol '{symbol}' not found.")
-        return
-
-    for record in price_history_data:
-        try:
-            date_str = record["Date"].replace("/", "-")  # Convert format to YYYY-MM-DD
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+    return value if not isinstance(value, str) else datetime.strptime(value, "%Y-%m-%d").date()
 
-            if PriceHistory.objects.filter(company=company, date=date_obj).exists():
-                logger.info(f"⚠ Skipping existing record: {symbol} - {date_str}")
-                continue
+def contract_number(value):
+    """
+    Contract/transaction numbers as integers (they are stored as strings and
+    may carry separators), or None when there are no digits.
+    """
+    digits = "".join(ch for ch in str(value) if ch.isdigit())
+    return int(digits) if digits else None
 
-            # Safely convert fields
-            open_price = float(record["Open"].replace(",", ""))
-            high_price = float(record["High"].replace(",", ""))
-            low_price = float(record["Low"].replace(",", ""))
-            close_price = float(record["LTP"].replace(",", ""))
-
-            # Save record
-            price_entry = PriceHistory(
-                company=company,
-                date=date_obj,
-                open_price=open_price,
-                high_price=high_price,
-                low_price=low_price,
-                close_price=close_price,
-            )
-            price_entry.save()
-            # logger.info(f" Saved: {symbol} - {date_str}")
-        except Exception as e:
-            logger.error(f" Failed to save record: {record}")
+def newer_contracts(records, since, key):
+    """
+    Split a newest-first page of floorsheet rows at the first contract not
+    newer than `since`. Returns (new_records, reached_known).
+    """
+    if since is None:
+        return records, False
+    for i, record in enumerate(records):
+        number = contract_number(record[key])
+        if number is not None and number <= since:
+            return records[:i], True
+    return records, False
 
-def save_price_history_to_db_ss(symbol, price_history_data):
-    try:
-        company = CompanyProfile.objects.get(symbol=symbol)
-    except CompanyProfile.DoesNotExist:
-        logger.error(f"Company with symbol '{symbol}' not found.")
-        return
+def store_floorsheet_to_db_ss(symbol, floorsheet_data):
+    inserted = persist_floorsheet(symbol, parse_floorsheet_ss(floorsheet_data))
+    logger.info(f" Saved Floorsheet to DB: {symbol}")
+    return inserted
 
-    for record in price_history_data:
-        try:
-            date_obj = datetime.strptime(record["Date"], "%Y-%m-%d").date()
+def store_floorsheet_to_db_ml(symbol, floorsheet_data):
+    inserted = persist_floorsheet(symbol, parse_floorsheet_ml(floorsheet_data))
+    logger.info(f"Saved Floorsheet data to DB for symbol: {symbol}")
+    return inserted
 
-            if PriceHistory.objects.filter(company=company, date=date_obj).exists():
-                logger.info(f"⚠ Skipping existing record: {symbol} - {record['Date']}")
-                continue
+def store_floorsheet_to_db_nepstock(symbol, floorsheet_data):
+    inserted = persist_floorsheet(symbol, parse_floorsheet_nepstock(floorsheet_data))
+    logger.info(f"Saved Floorsheet data to DB for symbol: {symbol}")
+    return inserted
 
-            price_entry = PriceHistory(
-                company=company,
-                date=date_obj,
-                open_price=float(record["Open"].replace(",", "")),
-                high_price=float(record["High"].replace(",", "")),
-                low_price=float(record["Low"].replace(",", "")),
-                close_price=float(record["Close"].replace(",", ""))
-            )
-            price_entry.save()
-            # logger.info(f" Saved: {symbol} - {record['Date']}")
+@timed('parse')
+def parse_floorsheet_ss(floorsheet_data):
+    """
+    Sharesansar rows are already typed by the scraper; just normalize them.
+    """
+    rows = []
+    for record in floorsheet_data:
+        try:
+            rows.append({
+                "transaction_id": str(record["transaction_id"]),
+                "buyer": int(record["buyer"]),
+                "seller": int(record["seller"]),
+                "quantity": float(record["quantity"]),
+                "rate": float(record["rate"]),
+                "amount": float(record["amount"]),
+                "date": record["date"],
+            })
         except Exception as e:
-            logger.error(f" Failed to save record: {record}")
-
-def store_floorsheet_to_db_ss(symbol, floorsheet_data):
-    try:
-        company = CompanyProfile.objects.get(symbol=symbol)
-    except CompanyProfile.DoesNotExist:
-        logger.error(f"Company with symbol '{symbol}' not found.")
-        return
+            logger.error(f"Failed to parse record: {record} | Error: {e}")
+    return rows
 
+@timed('parse')
+def parse_floorsheet_ml(floorsheet_data):
+    rows = []
     for record in floorsheet_data:
         try:
-            transaction_id = record["transaction_id"]
-            if FloorSheet.objects.filter(company=company, transaction_id=transaction_id).exists():
-                logger.info(f"⚠ Skipping existing record: {symbol} - {record['date']}")
-                continue
+            rows.append({
+                "transaction_id": record["Transact. No."],
+                "buyer": int(record["Buyer"]),
+                "seller": int(record["Seller"]),
+                "quantity": float(record["Quantity"].replace(",", "")),
+                "rate": float(record["Rate"].replace(",", "")),
+                "amount": float(record["Amount"].replace(",", "")),
+                "date": try_parse_date(record["Date"]),
+            })
+        except Exception as e:
+            logger.error(f"Failed to parse record: {record} | Error: {e}")
+    return rows
 
-            floorsheet_entry = FloorSheet(
-                company=company,
-                date=record["date"],
-                transaction_id=transaction_id,
-                buyer=record["buyer"],
-                seller=record["seller"],
-                quantity=record["quantity"],
-                rate=record["rate"],
-                amount=record["amount"]
-            )
-            floorsheet_entry.save()
+@timed('parse')
+def parse_floorsheet_nepstock(floorsheet_data):
+    """
+    NEPSE's company floorsheet tab lists the latest session and has no date
+    column, so rows are dated to the most recent session that has opened.
+    """
+    session = latest_session()
+    rows = []
+    for record in floorsheet_data:
+        try:
+            rows.append({
+                "transaction_id": record["Contract No"],
+                "buyer": int(record["Buyer No"]),
+                "seller": int(record["Seller No"]),
+                "quantity": float(record["Quantity"].replace(",", "")),
+                "rate": float(record["Rate"].replace(",", "")),
+                "amount": float(record["Amount"].replace(",", "")),
+                "date": session,
+            })
         except Exception as e:
-            logger.error(f"Failed to save record: {transaction_id}")
-    
-    logger.info(f" Saved Floorsheet to DB: {symbol}")
-    
-def store_floorsheet_to_db_ml(symbol, floorsheet_data):
+            logger.error(f"Failed to parse record: {record} | Error: {e}")
+    return rows
+
+@timed('persist')
+def persist_floorsheet(symbol, rows):
+    """
+    Insert parsed contracts that aren't stored yet, then publish them and
+    refresh the rollups for the days that received them. Returns how many
+    rows were inserted.
+    """
     try:
         company = CompanyProfile.objects.get(symbol=symbol)
     except CompanyProfile.DoesNotExist:
         logger.error(f"Company with symbol '{symbol}' not found in database.")
-        return
-
-    for record in floorsheet_data:
-        try:
-            transaction_id = record["Transact. No."]
-            if FloorSheet.objects.filter(company=company, transaction_id=transaction_id).exists():
-                logger.info(f"⚠ Skipping existing record: {symbol} - {transaction_id}")
-                continue
-
-            floorsheet_entry = FloorSheet(
-                company=company,
-                date=try_parse_date(record["Date"]),
-                transaction_id=transaction_id,
-                buyer=record["Buyer"],
-                seller=record["Seller"],
-                quantity=record["Quantity"].replace(",", ""),
-                rate=record["Rate"].replace(",", ""),
-                amount=record["Amount"].replace(",", "")
-            )
-            floorsheet_entry.save()
-        except Exception as e:
-            logger.error(f"Failed to save record: {transaction_id} | Error: {e}")
+        return 0
 
-    logger.info(f"Saved Floorsheet data to DB for symbol: {symbol}")
+    existing = set(
+        FloorSheet.objects.filter(transaction_id__in=[row["transaction_id"] for row in rows])
+        .values_list("transaction_id", flat=True)
+    )
+    new_entries = {}
+    for row in rows:
+        if row["transaction_id"] in existing or not row["date"]:
+            continue
+        new_entries[row["transaction_id"]] = FloorSheet(company=company, **{**row, "date": to_date(row["date"])})
+
+    # A concurrent worker may store some of these contracts after `existing`
+    # was read. ignore_conflicts skips them without saying which, so the rows
+    # this call inserted are read back: those with an id above the last one
+    # stored just before the insert.
+    with transaction.atomic():
+        last_id = FloorSheet.objects.aggregate(last=Max("id"))["last"] or 0
+        FloorSheet.objects.bulk_create(new_entries.values(), batch_size=1000, ignore_conflicts=True)
+        inserted = list(
+            FloorSheet.objects.filter(id__gt=last_id, transaction_id__in=list(new_entries)).order_by("id")
+        )
+    publish("floorsheet", [floorsheet_event(entry, symbol) for entry in inserted])
+    skipped = len(rows) - len(inserted)
+    if skipped:
+        logger.info(f"⚠ Skipped {skipped} existing or undated floorsheet records for {symbol}")
+    after_floorsheet_ingest(company, {entry.date for entry in inserted})
+    return len(inserted)
 
 def safe_float(value):
     try:
@@ -232,6 +374,10 @@ def store_news_to_db_ml(news_data):
                 news_body=record.get("body", "")
             )
             news_entry.save()
+            link_articles([news_entry])
+            if mark_duplicate(news_entry) is None:
+                publish("news", [news_event(news_entry)])
+            invalidate("news", news_entry.mentions.values_list("company_id", flat=True))
             logger.info(f"Saved news: {record['title']}")
 
         except Exception as e:
@@ -274,6 +420,10 @@ def store_news_to_db_ss(news_data):
                 news_body=record.get("news_body", "")
             )
             news_entry.save()
+            link_articles([news_entry])
+            if mark_duplicate(news_entry) is None:
+                publish("news", [news_event(news_entry)])
+            invalidate("news", news_entry.mentions.values_list("company_id", flat=True))
             logger.info(f"Saved news: {record['news_title']}")
         except Exception as e:
             logger.error(f"Failed to save news: {record['news_title']} | Error: {e}")
\ No newline at end of file
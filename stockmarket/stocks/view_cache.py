@@ -0,0 +1,146 @@
+import hashlib
+import time
+from functools import wraps
+
+import redis
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+import logging
+logger = logging.getLogger('stocks')
+
+# Rendered read pages, keyed on versions of the data they show. Writers bump
+# a (dataset, company) version once their transaction commits, so a page is
+# served from cache until something it shows has actually changed; entries
+# under old versions are never read again and just expire.
+#
+# Versions live in the same cache as the pages (Redis), so a bump made by a
+# Celery worker reaches every web process. While Redis is unreachable, each
+# process falls back to its own in-process cache, whose short timeout bounds
+# how long it can miss bumps made elsewhere.
+CACHE_ALIAS = getattr(settings, 'VIEW_CACHE_ALIAS', 'views')
+FALLBACK_ALIAS = getattr(settings, 'VIEW_CACHE_FALLBACK_ALIAS', 'views_local')
+RETRY_AFTER = getattr(settings, 'VIEW_CACHE_RETRY_AFTER', 30)  # seconds before Redis is tried again
+KEY_PREFIX = 'stocks:view'
+
+# Datasets are 'profile', 'prices' (with the indicators derived from them),
+# 'floorsheet' and 'news'. Besides company ids there are two pseudo-companies:
+# ANY changes with every bump of a dataset (for pages listing all companies),
+# EVERY only when a whole dataset is invalidated at once.
+ANY, EVERY = '*', 'all'
+
+_down_until = 0.0
+
+
+def _call(method, *args):
+    """
+    A cache operation on Redis, or on the in-process cache while Redis is down.
+    """
+    global _down_until
+    if time.monotonic() >= _down_until:
+        try:
+            return getattr(caches[CACHE_ALIAS], method)(*args)
+        except redis.RedisError as e:
+            logger.warning(f"View cache unavailable ({e}), using the in-process cache for {RETRY_AFTER}s")
+            _down_until = time.monotonic() + RETRY_AFTER
+    return getattr(caches[FALLBACK_ALIAS], method)(*args)
+
+
+def _version_key(dataset, company):
+    return f"{KEY_PREFIX}:version:{dataset}:{company}"
+
+
+def versions(dependencies):
+    """
+    Current version of each (dataset, company), creating missing ones. add()
+    rather than set(), so a reader can't overwrite a writer's newer bump.
+    """
+    keys = [_version_key(*dependency) for dependency in dependencies]
+    found = _call('get_many', keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            _call('add', key, time.time_ns(), None)
+        found.update(_call('get_many', missing))
+    return [str(found.get(key, 0)) for key in keys]
+
+
+def invalidate(dataset, company_ids=None):
+    """
+    Bump `dataset` for these companies (every company when None) once the
+    current transaction commits, so no page is cached from rows that are
+    rolled back.
+    """
+    companies = [EVERY] if company_ids is None else sorted(set(company_ids))
+    if not companies:
+        return
+    keys = [_version_key(dataset, company) for company in [ANY, *companies]]
+
+    def bump():
+        _call('set_many', dict.fromkeys(keys, time.time_ns()), None)
+
+    transaction.on_commit(bump)
+
+
+def cached(name, dependencies, build, timeout=None):
+    """
+    build() cached under `name` and the current versions of `dependencies`
+    ([(dataset, company_id or ANY)]). For pages and template fragments alike;
+    `timeout` defaults to the cache's own.
+    """
+    key = f"{KEY_PREFIX}:{name}:{':'.join(versions(dependencies))}"
+    value = _call('get', key)
+    if value is None:
+        value = build()
+        _call('set', key, value, *([] if timeout is None else [timeout]))
+    return value
+
+
+def cached_view(*datasets):
+    """
+    Cache a read view's successful GET responses per URL. Views taking a
+    company `id` depend on that company's versions of `datasets` (and on
+    dataset-wide invalidation); views without one on every company's.
+    """
+    datasets = ('profile', *datasets)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            company_id = kwargs.get('id', args[0] if args else None)
+            if company_id is None:
+                dependencies = [(dataset, ANY) for dataset in datasets]
+            else:
+                dependencies = [(dataset, company) for dataset in datasets for company in (company_id, EVERY)]
+            url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+            def render():
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    raise _Uncacheable(response)
+                return (response.content, response['Content-Type'])
+
+            try:
+                content, content_type = cached(f"{view.__name__}:{url}", dependencies, render)
+            except _Uncacheable as e:
+                return e.response
+            return HttpResponse(content, content_type=content_type)
+        return wrapper
+    return decorator
+
+
+class _Uncacheable(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def profile_changed(sender, instance, **kwargs):
+    """
+    post_save/post_delete handler for CompanyProfile: pages show the company's
+    name and symbol.
+    """
+    invalidate('profile', [instance.pk])
@@ -1,82 +1,85 @@
 import json
+import time
 import pandas as pd
-from statsmodels.tsa.arima.model import ARIMA
+from django.conf import settings
 from django.shortcuts import render,redirect
-from django.http import JsonResponse
+from django.urls import reverse
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
 from django.core.paginator import Paginator
-from django.contrib import messages
+from django.db.models import Q
 
-from .scrapers import merolagani_scraper
-from .scrapers import sharesansar_scraper
-from .scrapers.nepstock_scraper import scrape_company_price_history_nepstock, scrape_company_floorsheet_nepstock
-from .utility import save_price_history_to_db_ml, save_price_history_to_db, save_price_history_to_db_ss, store_floorsheet_to_db_ss, store_floorsheet_to_db_ml, store_news_to_db_ml, store_news_to_db_ss
 from .forms import CompanyNewsForm, CompanyProfileForm
-
-from .models import CompanyNews, CompanyProfile, PriceHistory, FloorSheet
-
-from statsmodels.tsa.arima.model import ARIMA
+from . import columnar
+from .forecasting import get_forecaster
+from .trading_calendar import trading_day_index, next_trading_days
+
+from .models import CompanyNews, CompanyProfile, PriceHistory, FloorSheet, TechnicalIndicator, FloorSheetDaily
+from .indicators import INDICATOR_FIELDS
+from .screener import ScreenerQueryError, screen
+from .brokers import top_brokers, broker_concentration
+from .rollups import DAILY_FIELDS
+from .failover import breaker_status
+from .metrics import prometheus_text
+from .single_flight import in_flight
+from .live import KINDS, stream
+from .jobs import enqueue, job_status as get_job_status
+from .news_search import search_news
+from .entity_linking import link_articles
+from .news_dedup import mark_duplicate
+from .view_cache import cached_view, invalidate
+from .tasks import scrape_company_job, run_merolagani_news_scraper, run_sharesansar_news_scraper
 
 import logging
 logger = logging.getLogger('stocks')
 
 def fetch_price_history(company):
-    # Fetch PriceHistory records for this specific company
-    qs = PriceHistory.objects.filter(company=company).order_by('date')
-
-    # Convert QuerySet to DataFrame
-    data = pd.DataFrame.from_records(qs.values('date', 'close_price'))
-    data.set_index('date', inplace=True)
-    
-    return data
+    # Closing prices from the memory-mapped columnar store, indexed by date
+    prices = columnar.load('prices', company, columns=['date', 'close'])
+    return pd.DataFrame({'close_price': prices['close']}, index=pd.DatetimeIndex(prices['date'], name='date'))
 
 
 def predict_future_prices(request, id):
     try:
         # Fetch company and price history based on the company ID
         company = CompanyProfile.objects.get(id=id)
-        prices = PriceHistory.objects.filter(company=company).order_by('date')
+
+        # Closing prices as floats, straight from the columnar store
+        df = fetch_price_history(company)
 
         # If there is no price history available for the company
-        if not prices.exists():
+        if df.empty:
             return JsonResponse({'message': 'No price history available for prediction.'}, status=400)
 
-        # Convert price history into a Pandas DataFrame
-        df = pd.DataFrame(list(prices.values('date', 'close_price')))
-        
-        # Ensure the date column is set as the index and convert it to datetime
-        df['date'] = pd.to_datetime(df['date'])
-        df.set_index('date', inplace=True)
-
-        # Set a daily frequency and forward fill missing data
-        df = df.asfreq('D', method='ffill')
-
-        # Convert close_price to numeric and drop any invalid rows (NaN after conversion)
-        df['close_price'] = pd.to_numeric(df['close_price'], errors='coerce')
-        df = df.dropna(subset=['close_price'])  # Drop rows where 'close_price' is NaN
+        # Align to NEPSE trading days (Sun-Thu minus holidays) and forward fill
+        # only sessions we are missing, rather than padding weekends with fake prices
+        df = df.reindex(trading_day_index(df.index[0], df.index[-1]), method='ffill')
+        df = df.dropna(subset=['close_price'])
 
         # If not enough data to make a prediction, return an error message
         if len(df) < 10:
             return JsonResponse({'message': 'Not enough data to make a prediction. Need at least 10 data points.'}, status=400)
 
-        # Fit the ARIMA model (you can adjust the order depending on your data)
-        model = ARIMA(df['close_price'], order=(20, 1, 0))  # Example: ARIMA(5,1,0)
-        model_fit = model.fit()
+        # Fit the selected engine (?engine=statsmodels|numpy, ARIMA(20,1,0) by default)
+        try:
+            forecaster = get_forecaster(request.GET.get('engine'))
+        except ValueError as e:
+            return JsonResponse({'message': str(e)}, status=400)
 
         # Forecast the next 5 days
-        forecast = model_fit.forecast(steps=5)
+        forecast = forecaster.forecast(df['close_price'].to_numpy(dtype=float), steps=5)
 
-        # Generate future dates for the forecast
+        # Generate the next 5 trading days for the forecast
         last_date = df.index[-1]
-        future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=5, freq='D')
+        future_dates = next_trading_days(last_date, periods=5)
 
         # Prepare the forecast result
         forecast_result = [
-            {"date": future_dates[i].strftime('%Y-%m-%d'), "predicted_close_price": round(float(forecast.iloc[i]), 2)}
+            {"date": future_dates[i].strftime('%Y-%m-%d'), "predicted_close_price": round(float(forecast[i]), 2)}
             for i in range(5)
         ]
 
         # Return the result as a JSON response
-        return JsonResponse({'predictions': forecast_result})
+        return JsonResponse({'engine': forecaster.name, 'predictions': forecast_result})
 
     except Exception as e:
         # Handle any unexpected exceptions
@@ -85,20 +88,49 @@ def predict_future_prices(request, id):
 def home(request):
     return render(request, 'stocks/home.html')
 
+@cached_view('prices')
 def company_detail(request, id):
     company = CompanyProfile.objects.get(id=id)
-    return render(request, 'stocks/company_detail.html', {'company': company})
+    indicators = TechnicalIndicator.objects.filter(company=company).order_by('-date').first()
+    return render(request, 'stocks/company_detail.html', {'company': company, 'indicators': indicators})
+
+def company_indicators(request, id):
+    """
+    Precomputed technical indicators for a company, oldest first.
+    Optional ?days=N limits the response to the latest N rows (default 120).
+    """
+    try:
+        company = CompanyProfile.objects.get(id=id)
+        days = int(request.GET.get('days', 120))
+        rows = list(
+            TechnicalIndicator.objects.filter(company=company)
+            .order_by('-date').values('date', *INDICATOR_FIELDS)[:days]
+        )
+        rows.reverse()
+        return JsonResponse({'symbol': company.symbol, 'indicators': rows})
+    except CompanyProfile.DoesNotExist:
+        return JsonResponse({'error': 'Company not found.'}, status=404)
+    except ValueError:
+        return JsonResponse({'error': 'days must be an integer.'}, status=400)
 
+@cached_view('news')
 def company_news(request, id):
     company = CompanyProfile.objects.get(id=id)
-    company_news = CompanyNews.objects.filter(company=company)
-    return render(request, 'stocks/company_news.html', {'company': company, 'company_news': company_news})
-
+    company_news = (
+        CompanyNews.objects.filter(mentions__company=company, canonical__isnull=True)
+        .only('id', 'news_title', 'news_date', 'news_image', 'news_teaser').order_by('-news_date', '-id')
+    )
+    page_obj = Paginator(company_news, 25).get_page(request.GET.get('page'))
+    page_range = page_obj.paginator.get_elided_page_range(page_obj.number, on_each_side=2, on_ends=1)
+    return render(request, 'stocks/company_news.html', {'company': company, 'page_obj': page_obj, 'page_range': page_range})
+
+@cached_view('prices')
 def price_history(request, id):
     company = CompanyProfile.objects.get(id=id)
     price_history = PriceHistory.objects.filter(company=company)
     return render(request, 'stocks/price_history.html', {'company': company, 'price_history': price_history})
 
+@cached_view('prices')
 def price_history_list(request):
     price_list = PriceHistory.objects.select_related('company').order_by('-date')
     paginator = Paginator(price_list, 25)  # Show 25 records per page
@@ -108,79 +140,100 @@ def price_history_list(request):
 
     return render(request, 'stocks/price_history_list.html', {'page_obj': page_obj,})
 
+def screener(request):
+    """
+    Filter companies against the in-memory metrics snapshot.
+    ?q=sector == "Commercial Banks" and rsi_14 < 30 and volume_ratio >= 2
+    &sort=-volume_ratio&limit=50
+    """
+    start = time.perf_counter()
+    try:
+        limit = int(request.GET.get('limit', 50))
+        total, rows = screen(request.GET.get('q'), sort=request.GET.get('sort'), limit=limit)
+    except ScreenerQueryError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer.'}, status=400)
+    return JsonResponse({
+        'count': total,
+        'results': rows,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+    })
+
 def company_list(request):
     companies = CompanyProfile.objects.all()
     return render(request, 'stocks/company_list.html', {'companies': companies})
 
 def company_news_list(request):
-    news = CompanyNews.objects.all()
-    return render(request, 'stocks/company_news_list.html', {'news': news})
-
-def scrape_sharesansar_pricehistory(request, id):
-    try:
-        company = CompanyProfile.objects.get(id=id)
-        symbol = company.symbol
-
-        scraper = sharesansar_scraper.SharesansarPriceScraper(symbol=symbol, headless=True)
-        data = scraper.fetch_price_history()
-        logger.info(f"Scraped {len(data)} records for {symbol} from Sharesansar")
-
-        save_price_history_to_db_ss(symbol, data)
-
-        return JsonResponse({'message': f"Successfully scraped prices for {company.name}."})
-    except CompanyProfile.DoesNotExist:
-        return JsonResponse({'message': 'Company not found.'}, status=404)
-    except Exception as e:
-        return JsonResponse({'message': f'Error occurred: {str(e)}'}, status=500)
-    
-def scrape_nepstock_pricehistory(request, id):
+    # Teasers only; bodies are loaded by company_news_detail alone.
+    news = (
+        CompanyNews.objects.filter(canonical__isnull=True)
+        .only('id', 'news_title', 'news_date', 'news_teaser').order_by('-news_date', '-id')
+    )
+    page_obj = Paginator(news, 25).get_page(request.GET.get('page'))
+    page_range = page_obj.paginator.get_elided_page_range(page_obj.number, on_each_side=2, on_ends=1)
+    return render(request, 'stocks/company_news_list.html', {'page_obj': page_obj, 'page_range': page_range})
+
+def news_search(request):
     """
-    Scrape price history for a specific company using the NepalStock scraper.
+    Ranked full-text search over news titles and bodies.
+    ?q=dividend bonus&page=1&per_page=20&symbol=NABIL
     """
+    start = time.perf_counter()
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'q is required.'}, status=400)
     try:
-        company = CompanyProfile.objects.get(id=id)
-        symbol = company.symbol
-
-        # Step 1: Scrape
-        price_history_data = scrape_company_price_history_nepstock(symbol, max_pages=8, output_csv=False)
-        logger.info(f"Scraped {len(price_history_data)} records for {symbol} from NepalStock")
-
-        # Step 2: Save to DB using unified function
-        save_price_history_to_db(symbol, price_history_data)
-        return JsonResponse({
-            "message": f"Scraped and saved {len(price_history_data)} records for {symbol}",
-            'records_scraped': len(price_history_data)
-        })
-    except CompanyProfile.DoesNotExist:
-        return JsonResponse({"error": f"Company with ID {id} not found."}, status=404)
-    except Exception as e:
-        logger.exception("Error scraping from NepalStock")
-        return JsonResponse({'error': str(e)}, status=500)
-
-def scrpae_merolagani_pricehistory(request, id):
+        page = int(request.GET.get('page', 1))
+        per_page = int(request.GET.get('per_page', 20))
+    except ValueError:
+        return JsonResponse({'error': 'page and per_page must be integers.'}, status=400)
+
+    company_id = None
+    if request.GET.get('symbol'):
+        company_id = CompanyProfile.objects.filter(symbol=request.GET['symbol'].upper()).values_list('id', flat=True).first()
+        if company_id is None:
+            return JsonResponse({'error': 'Company not found.'}, status=404)
+
+    total, results = search_news(query, page=page, per_page=per_page, company_id=company_id)
+    for result in results:
+        result['detail_url'] = reverse('company_news_detail', args=[result['id']])
+    return JsonResponse({
+        'query': query,
+        'count': total,
+        'page': page,
+        'results': results,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+    })
+
+def enqueue_company_scrape(id, dataset, source):
     """
-    Scrape price history for a specific company using the Merolagani scraper.
+    Queue an on-demand scrape of one company and return its job id right away;
+    progress is polled from job_status.
     """
     try:
         company = CompanyProfile.objects.get(id=id)
-        symbol = company.symbol
+    except CompanyProfile.DoesNotExist:
+        return JsonResponse({'error': 'Company not found.'}, status=404)
+    job_id, coalesced = enqueue(
+        scrape_company_job, {'dataset': dataset, 'source': source, 'symbol': company.symbol},
+        source, dataset, company.symbol,
+    )
+    return JsonResponse({
+        'message': f"Scraping {dataset.replace('_', ' ')} for {company.name} from {source}.",
+        'job_id': job_id,
+        'status_url': reverse('job_status', args=[job_id]),
+        'coalesced': coalesced,
+    }, status=202)
 
-        scraper = merolagani_scraper.MerolaganiScraper(symbol=symbol, headless=True)
-        data = scraper.fetch_price_history(max_records=150)
-        logger.info(f"Scraped {len(data)} records for {symbol} from Merolagani")
+def scrape_sharesansar_pricehistory(request, id):
+    return enqueue_company_scrape(id, 'price_history', 'sharesansar')
 
-        # Save using the same unified function
-        save_price_history_to_db_ml(symbol, data)
+def scrape_nepstock_pricehistory(request, id):
+    return enqueue_company_scrape(id, 'price_history', 'nepstock')
 
-        return JsonResponse({
-            "message": f"Scraped and saved {len(data)} records for {symbol}",
-            "records_saved": len(data)
-        })
-    except CompanyProfile.DoesNotExist:
-        return JsonResponse({"error": f"Company with ID {id} not found."}, status=404)
-    except Exception as e:
-        logger.exception("Error scraping from Merolagani")
-        return JsonResponse({"error": str(e)}, status=500)
+def scrpae_merolagani_pricehistory(request, id):
+    return enqueue_company_scrape(id, 'price_history', 'merolagani')
 
 def company_create(request):
     if request.method == 'POST':
@@ -196,112 +249,99 @@ def add_company_news(request):
     if request.method == 'POST':
         form = CompanyNewsForm(request.POST)
         if form.is_valid():
-            form.save()
+            news = form.save()
+            link_articles([news])
+            mark_duplicate(news)
+            invalidate('news', news.mentions.values_list('company_id', flat=True))
             return redirect('company_news_list')  # Make sure you have this URL name
     else:
         form = CompanyNewsForm()
     return render(request, 'stocks/company_news_form.html', {'form': form})
 
 def company_news_detail(request, news_id):
-    news_article = CompanyNews.objects.get(id=news_id)
-    return render(request, 'stocks/company_news_detail.html', {'article': news_article})
+    news_article = CompanyNews.objects.select_related('body').get(id=news_id)
+    # Every copy of the story: the canonical article and its near-duplicates.
+    canonical_id = news_article.canonical_id or news_article.id
+    copies = CompanyNews.objects.filter(Q(id=canonical_id) | Q(canonical_id=canonical_id)).exclude(id=news_article.id).order_by('news_date')
+    return render(request, 'stocks/company_news_detail.html', {'article': news_article, 'copies': copies})
 def delete_all_price_records(request):
     if request.method == 'POST':
         deleted_count, _ = PriceHistory.objects.all().delete()
+        columnar.clear('prices')
+        invalidate('prices')
         return redirect('price_history_list')  # Redirect to the price history list after deletion
     return render(request, 'stocks/delete_all_price_records.html')
 
-def list_floorsheet(request, id):
+def broker_flows(request, id):
     """
-    List the floorsheet for a specific company.
+    Top accumulating/distributing brokers and broker concentration for a
+    company over the last ?window= trading days (default 20).
     """
     try:
         company = CompanyProfile.objects.get(id=id)
-        floorsheet = FloorSheet.objects.filter(company=company).order_by('-date')
-        return render(request, 'stocks/floorsheet_list.html', {'company': company, 'floorsheet': floorsheet})
+        window = int(request.GET.get('window', 20))
+        top = int(request.GET.get('top', 10))
+        accumulators, distributors = top_brokers(company_id=company.id, window=window, n=top)
+        return JsonResponse({
+            'symbol': company.symbol,
+            'window': window,
+            'accumulators': accumulators,
+            'distributors': distributors,
+            'concentration': broker_concentration(company_id=company.id, window=window),
+        })
     except CompanyProfile.DoesNotExist:
         return JsonResponse({'error': 'Company not found.'}, status=404)
-    except Exception as e:
-        logger.exception("Error fetching floorsheet")
-        return JsonResponse({'error': str(e)}, status=500)
+    except ValueError:
+        return JsonResponse({'error': 'window and top must be integers.'}, status=400)
 
-def scrape_floorsheet_ss(request, id):
+def floorsheet_daily(request, id):
     """
-    Scrape the floorsheet for a specific company using the Sharesansar scraper.
+    Daily floorsheet summary (VWAP, volume, turnover, trades, OHLC from
+    contract rates) for charts, oldest first. ?days=N (default 120).
     """
     try:
         company = CompanyProfile.objects.get(id=id)
-        symbol = company.symbol
-
-        scraper = sharesansar_scraper.SharesansarFloorsheetScraper(symbol=symbol, headless=True)
-        floorsheet_data = scraper.fetch_floorsheet()
-        logger.info(f"Scraped {len(floorsheet_data)} floorsheet for {symbol} from Sharesansar")
-
-        # Save to DB
-        store_floorsheet_to_db_ss(symbol, floorsheet_data)
-
-        return JsonResponse({'message': f"Successfully scraped floorsheet for {company.name}."})
+        days = int(request.GET.get('days', 120))
+        rows = list(FloorSheetDaily.objects.filter(company=company).values('date', *DAILY_FIELDS)[:days])
+        rows.reverse()
+        return JsonResponse({'symbol': company.symbol, 'daily': rows})
     except CompanyProfile.DoesNotExist:
-        return JsonResponse({'message': 'Company not found.'}, status=404)
-    except Exception as e:
-        return JsonResponse({'message': f'Error occurred: {str(e)}'}, status=500)
-def scrape_floorsheet_ml(request, id):
+        return JsonResponse({'error': 'Company not found.'}, status=404)
+    except ValueError:
+        return JsonResponse({'error': 'days must be an integer.'}, status=400)
+
+@cached_view('floorsheet')
+def list_floorsheet(request, id):
     """
-    Scrape the floorsheet for a specific company using the Sharesansar scraper.
+    List the floorsheet for a specific company.
     """
     try:
         company = CompanyProfile.objects.get(id=id)
-        symbol = company.symbol
-
-        logger.info(f"Scraping floorsheet for {symbol} from Merolagani")
-        scraper = merolagani_scraper.MerolaganiFloorsheetScraper(headless=True)
-        floorsheet_data = scraper.run_scraper(symbol=symbol)
-        logger.info(f"Scraped {len(floorsheet_data)} floorsheet for {symbol} from Merolagani")
-        # Save to DB
-        store_floorsheet_to_db_ml(symbol, floorsheet_data)
-
-        return JsonResponse({'message': f"Successfully scraped floorsheet for {company.name}."})
+        floorsheet = FloorSheet.objects.filter(company=company).order_by('-date')
+        return render(request, 'stocks/floorsheet_list.html', {'company': company, 'floorsheet': floorsheet})
     except CompanyProfile.DoesNotExist:
-        return JsonResponse({'message': 'Company not found.'}, status=404)
+        return JsonResponse({'error': 'Company not found.'}, status=404)
     except Exception as e:
-        return JsonResponse({'message': f'Error occurred: {str(e)}'}, status=500)
-    
-def scrape_floorsheet_nepstock(request, id):
-    try:
-        company = CompanyProfile.objects.get(id=id)
-        symbol = company.symbol
+        logger.exception("Error fetching floorsheet")
+        return JsonResponse({'error': str(e)}, status=500)
 
-        # Step 1: Scrape
-        floorsheet_data = scrape_company_floorsheet_nepstock(symbol, headless=False)
-        logger.info(f"Scraped {len(floorsheet_data)} records for {symbol} from NepalStock")
+def scrape_floorsheet_ss(request, id):
+    return enqueue_company_scrape(id, 'floorsheet', 'sharesansar')
 
-        # Step 2: Save to DB using unified function
-        print(floorsheet_data)
-        return JsonResponse({
-            "message": f"Scraped and saved {len(floorsheet_data)} records for {symbol}",
-            'records_scraped': len(floorsheet_data)
-        })
-    except CompanyProfile.DoesNotExist:
-        return JsonResponse({"error": f"Company with ID {id} not found."}, status=404)
-    except Exception as e:
-        logger.exception("Error scraping from NepalStock")
-        return JsonResponse({'error': str(e)}, status=500)
+def scrape_floorsheet_ml(request, id):
+    return enqueue_company_scrape(id, 'floorsheet', 'merolagani')
+
+def scrape_floorsheet_nepstock(request, id):
+    return enqueue_company_scrape(id, 'floorsheet', 'nepstock')
 
 def scrape_news_ml(request):
-    scraper = None
-    try:
-        scraper = merolagani_scraper.MerolaganiNewsScraper(headless=False, max_records=8)
-        records = scraper.fetch_news()
-        record_with_body = scraper._extract_news_body(records=records)
-        store_news_to_db_ml(news_data=record_with_body)
-        messages.success(request, "News scraped and stored successfully.")
-    except Exception as e:
-        logger.exception("Error while scraping Merolagani news:")
-        messages.error(request, f"⚠️ An error occurred during scraping: {e}")
-    finally:
-        if scraper:
-            scraper.close()
-    return render(request, 'stocks/company_news_list.html', {'news': CompanyNews.objects.all()})
+    job_id, coalesced = enqueue(run_merolagani_news_scraper, {}, 'merolagani', 'news')
+    return JsonResponse({
+        'message': "Scraping news from Merolagani.",
+        'job_id': job_id,
+        'status_url': reverse('job_status', args=[job_id]),
+        'coalesced': coalesced,
+    }, status=202)
 
 def empty_floorsheet(request, id):
     """
@@ -311,6 +351,7 @@ def empty_floorsheet(request, id):
         company = CompanyProfile.objects.get(id=id)
         if request.method == 'POST':
             FloorSheet.objects.filter(company=company).delete()
+            invalidate('floorsheet', [company.id])
             return redirect('floorsheet_list', id=id)
         return render(request, 'stocks/delete_floorsheet.html', {'company': company})
     except CompanyProfile.DoesNotExist:
@@ -320,13 +361,55 @@ def empty_floorsheet(request, id):
         return JsonResponse({'error': str(e)}, status=500)
     
 def scrape_news_ss(request):
+    job_id, coalesced = enqueue(run_sharesansar_news_scraper, {}, 'sharesansar', 'news')
+    return JsonResponse({
+        'message': "Scraping news from Sharesansar.",
+        'job_id': job_id,
+        'status_url': reverse('job_status', args=[job_id]),
+        'coalesced': coalesced,
+    }, status=202)
+
+def source_status(request):
+    """
+    Circuit breaker state for each scraping source, and the scrape jobs
+    currently holding a single-flight lock.
+    """
     try:
-        news_scraper = sharesansar_scraper.SharesansarNewsScraper(headless=True, max_records=8)
-        news_records = news_scraper.fetch_news()
-        store_news_to_db_ss(news_records)
+        return JsonResponse({'sources': breaker_status(), 'in_flight': in_flight()})
     except Exception as e:
-        logger.exception("Error while scraping Sharesansar news:")
-        messages.error(request, f"⚠️ An error occurred during scraping: {e}")
-    finally:
-        news_scraper.close()
-    return render(request, 'stocks/company_news_list.html', {'news': CompanyNews.objects.all()})
\ No newline at end of file
+        logger.error(f"Could not read circuit breaker state: {e}")
+        return JsonResponse({'error': 'Circuit breaker state unavailable.'}, status=503)
+
+def stage_metrics(request):
+    """
+    Stage timing histograms in Prometheus text format (STAGE_METRICS_PROMETHEUS).
+    """
+    if not getattr(settings, 'STAGE_METRICS_PROMETHEUS', False):
+        raise Http404("Prometheus export is disabled.")
+    return HttpResponse(prometheus_text(), content_type='text/plain; version=0.0.4')
+
+def job_status(request, job_id):
+    """
+    Status of a queued scrape: queued/running/done/failed and rows scraped so far.
+    """
+    status = get_job_status(job_id)
+    if status is None:
+        return JsonResponse({'error': 'Unknown job.'}, status=404)
+    return JsonResponse(status)
+
+async def live_feed(request):
+    """
+    Server-Sent Events stream of newly ingested rows.
+    ?kinds=prices,floorsheet,news (default all) and ?symbols=NABIL,ADBL (default all).
+    Serve under ASGI (stockmarket.asgi) so each open stream doesn't hold a worker thread.
+    """
+    kinds = [kind for kind in request.GET.get('kinds', ','.join(KINDS)).split(',') if kind]
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        return JsonResponse({'error': f"Unknown kinds: {', '.join(sorted(unknown))}. Use {', '.join(KINDS)}."}, status=400)
+    symbols = [symbol.strip().upper() for symbol in request.GET.get('symbols', '').split(',') if symbol.strip()]
+
+    response = StreamingHttpResponse(stream(kinds, symbols), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response